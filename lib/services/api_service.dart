@@ -176,12 +176,16 @@ class ApiService {
 class TranscriptionResult {
   final String transcription;
   final String audioBase64;
+  final String audioId;
+  final String audioUrl;
   final String audioFormat;
   final AnalysisResult analysis;
   
   TranscriptionResult({
     required this.transcription,
     required this.audioBase64,
+    this.audioId = '',
+    this.audioUrl = '',
     required this.audioFormat,
     required this.analysis,
   });
@@ -190,6 +194,8 @@ class TranscriptionResult {
     return TranscriptionResult(
       transcription: json['transcription'] ?? '',
       audioBase64: json['audio_base64'] ?? '',
+      audioId: json['audio_id'] ?? '',
+      audioUrl: json['audio_url'] ?? '',
       audioFormat: json['audio_format'] ?? '',
       analysis: AnalysisResult.fromJson(json['analysis'] ?? {}),
     );
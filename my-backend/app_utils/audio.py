@@ -0,0 +1,110 @@
+# audio.py
+# In-memory decoding of uploaded audio to 16 kHz mono float32
+
+import io
+import subprocess
+
+import numpy as np
+
+TARGET_SAMPLE_RATE = 16000
+
+# Containers soundfile can read straight from a memory buffer
+_SOUNDFILE_SUFFIXES = (".wav", ".flac")
+
+
+def sniff_soundfile_format(audio_bytes: bytes, suffix: str = "") -> bool:
+    """True for WAV/FLAC uploads, judged by magic bytes first, then suffix."""
+    head = audio_bytes[:12]
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return True
+    if head[:4] == b"fLaC":
+        return True
+    return suffix.lower() in _SOUNDFILE_SUFFIXES
+
+
+def pcm16_to_float32(pcm: bytes) -> np.ndarray:
+    """Convert little-endian 16-bit PCM to float32 samples in [-1, 1]."""
+    return np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def decode_with_soundfile(audio_bytes: bytes = None, path: str = None):
+    """Decode WAV/FLAC from memory (or `path`); None if the rate is not 16 kHz or it fails."""
+    try:
+        import soundfile as sf
+    except ImportError:
+        return None
+    try:
+        audio, sample_rate = sf.read(path or io.BytesIO(audio_bytes), dtype="float32", always_2d=False)
+    except Exception:
+        return None
+    if sample_rate != TARGET_SAMPLE_RATE:
+        # Let ffmpeg resample rather than shipping a resampler here
+        return None
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1, dtype=np.float32)
+    return audio
+
+
+def decode_with_ffmpeg(audio_bytes: bytes = None, timeout: float = 120.0, path: str = None):
+    """
+    Pipe the upload through ffmpeg (stdin -> stdout) and read raw float32
+    samples back. The returned array is a view over ffmpeg's output buffer.
+    None if ffmpeg is missing or cannot decode from a pipe (e.g. MP4/M4A
+    files whose index sits at the end of the file). With `path` ffmpeg
+    reads the file itself, which can seek, so MP4/M4A work too.
+    """
+    command = [
+        "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+        "-i", path or "pipe:0",
+        "-f", "f32le", "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE),
+        "pipe:1",
+    ]
+    try:
+        result = subprocess.run(command, input=None if path else audio_bytes, capture_output=True,
+                                timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0 or not result.stdout:
+        return None
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+def decode_audio(audio_bytes: bytes, suffix: str = ".wav"):
+    """
+    Decode uploaded bytes to a 16 kHz mono float32 array without touching
+    disk. Returns None when neither in-memory path works; callers should
+    fall back to writing a temp file and passing its path to the model.
+    """
+    if sniff_soundfile_format(audio_bytes, suffix):
+        audio = decode_with_soundfile(audio_bytes)
+        if audio is not None:
+            return audio
+    return decode_with_ffmpeg(audio_bytes)
+
+
+def decode_audio_file(path: str, suffix: str = ".wav"):
+    """decode_audio() for an upload spooled to disk, without reading it into memory first."""
+    with open(path, "rb") as f:
+        head = f.read(12)
+    if sniff_soundfile_format(head, suffix):
+        audio = decode_with_soundfile(path=path)
+        if audio is not None:
+            return audio
+    return decode_with_ffmpeg(path=path)
+
+
+def load_warmup_clip(path: str, max_seconds: float = 5.0) -> np.ndarray:
+    """
+    Decode a bundled clip for warmup inference. Falls back to one second of
+    quiet noise if the file is missing or cannot be decoded, so warmup still
+    exercises the model.
+    """
+    audio = None
+    try:
+        with open(path, "rb") as f:
+            audio = decode_audio(f.read(), path[path.rfind("."):])
+    except OSError:
+        pass
+    if audio is None or len(audio) == 0:
+        audio = (np.random.default_rng(0).standard_normal(TARGET_SAMPLE_RATE) * 1e-3).astype(np.float32)
+    return audio[:int(max_seconds * TARGET_SAMPLE_RATE)]
@@ -1,7 +1,265 @@
 # auth.py
-# Authentication utilities
+# Authentication: parent tokens, signed (HS256 JWT) tokens, cached verification
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+from app_utils.logs import LOGGER_NAME
+from app_utils.ratelimit import RateLimitedError
+
+log = logging.getLogger(LOGGER_NAME)
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def parse_parent_tokens(value: str) -> Dict[str, str]:
+    """
+    PARENT_TOKENS (`{"parent1": "token1"}` or `parent1:token1,parent2:token2`)
+    as token hash -> parent ID, so plain tokens are not kept in memory.
+    """
+    value = (value or "").strip()
+    if not value:
+        return {}
+    if value.startswith("{"):
+        pairs = json.loads(value).items()
+    else:
+        pairs = [item.split(":", 1) for item in value.split(",") if ":" in item]
+    return {hash_token(token.strip()): parent.strip() for parent, token in pairs if token.strip()}
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64url_decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def sign_token(parent_id: str, secret: str, ttl_seconds: float = 30 * 86400, now: float = None) -> str:
+    """An HS256 JWT for `parent_id` (`sub`) expiring after `ttl_seconds`."""
+    now = time.time() if now is None else now
+    header = _b64url(json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":")).encode())
+    payload = _b64url(json.dumps({"sub": parent_id, "iat": int(now), "exp": int(now + ttl_seconds)},
+                                 separators=(",", ":")).encode())
+    signature = hmac.new(secret.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+    return f"{header}.{payload}.{_b64url(signature)}"
+
+
+def verify_jwt(token: str, secret: str, now: float = None) -> Tuple[str, float]:
+    """(parent ID, expiry) of a valid HS256 JWT; raises ValueError otherwise."""
+    now = time.time() if now is None else now
+    try:
+        header, payload, signature = token.split(".")
+        expected = hmac.new(secret.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64url_decode(signature)):
+            raise ValueError("bad signature")
+        if json.loads(_b64url_decode(header)).get("alg") != "HS256":
+            raise ValueError("unsupported alg")
+        claims = json.loads(_b64url_decode(payload))
+    except (ValueError, TypeError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid token: {e}")
+    exp = claims.get("exp")
+    if not claims.get("sub") or not isinstance(exp, (int, float)) or exp <= now:
+        raise ValueError("Invalid token: expired or missing claims")
+    return str(claims["sub"]), float(exp)
+
+
+class Authenticator:
+    """
+    Maps a bearer token to its parent ID: a token from PARENT_TOKENS
+    (looked up by hash) or an HS256 JWT signed with AUTH_JWT_SECRET whose
+    `sub` is the parent. Results, including rejections, are kept in an LRU
+    cache of `cache_size` tokens (by hash, JWTs until they expire), so a
+    request costs one hash and one dict lookup.
+
+    With neither configured the API runs in development mode: any
+    non-empty token is accepted, as before, and anonymous requests are
+    allowed.
+    """
+
+    def __init__(self, parent_tokens: Dict[str, str] = None, jwt_secret: str = None,
+                 allow_anonymous: bool = False, cache_size: int = 10000, negative_ttl: float = 60.0):
+        self.parent_tokens = parent_tokens or {}
+        self.jwt_secret = jwt_secret or None
+        self.configured = bool(self.parent_tokens or self.jwt_secret)
+        self.allow_anonymous = allow_anonymous or not self.configured
+        self.cache_size = cache_size
+        self.negative_ttl = negative_ttl
+
+        # token hash -> (parent ID or None, valid until)
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Stats
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "Authenticator":
+        authenticator = cls(
+            parent_tokens=parse_parent_tokens(os.environ.get("PARENT_TOKENS", "")),
+            jwt_secret=os.environ.get("AUTH_JWT_SECRET"),
+            allow_anonymous=os.environ.get("ALLOW_ANONYMOUS", "0") == "1",
+            cache_size=int(os.environ.get("AUTH_CACHE_SIZE", "10000")),
+        )
+        if not authenticator.configured:
+            log.warning("Neither PARENT_TOKENS nor AUTH_JWT_SECRET is set: any token is accepted")
+        return authenticator
+
+    def authenticate(self, token: str, now: float = None) -> Optional[str]:
+        """
+        The parent ID for `token`, "" for a token accepted in development
+        mode, or None if it is invalid.
+        """
+        if not token:
+            return None
+        if not self.configured:
+            return ""
+        now = time.time() if now is None else now
+        key = hash_token(token)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[1] > now:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                if cached[0] is None:
+                    self.rejected += 1
+                return cached[0]
+            self.cache_misses += 1
+
+        parent_id, valid_until = self.parent_tokens.get(key), float("inf")
+        if parent_id is None and self.jwt_secret and token.count(".") == 2:
+            try:
+                parent_id, valid_until = verify_jwt(token, self.jwt_secret, now)
+            except ValueError:
+                pass
+        if parent_id is None:
+            valid_until = now + self.negative_ttl
+
+        with self._lock:
+            self._cache[key] = (parent_id, valid_until)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            if parent_id is None:
+                self.rejected += 1
+        return parent_id
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "configured": self.configured,
+                "allow_anonymous": self.allow_anonymous,
+                "parent_tokens": len(self.parent_tokens),
+                "jwt": self.jwt_secret is not None,
+                "cache_size": len(self._cache),
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "rejected": self.rejected,
+            }
+
+
+_default = None
+
 
 def verify_token(token: str) -> bool:
-    # For demo: accept any non-empty token
-    # In production, validate against a DB or verify JWT signature
-    return bool(token)
+    global _default
+    if _default is None:
+        _default = Authenticator.from_env()
+    return _default.authenticate(token) is not None
+
+
+def request_token(scope) -> Optional[str]:
+    """Bearer token of an ASGI request: Authorization, X-Api-Key or `?token=`."""
+    headers = dict(scope["headers"])
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    if authorization:
+        return authorization[7:] if authorization[:7].lower() == "bearer " else authorization
+    api_key = headers.get(b"x-api-key")
+    if api_key:
+        return api_key.decode("latin-1")
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("token", [None])[0]
+
+
+class AuthMiddleware:
+    """
+    ASGI middleware authenticating every request outside `public_paths`
+    before the app sees it, and so before any upload is read. X-Parent-Id
+    is always removed and only set again to the authenticated parent, so
+    neither a token nor an anonymous client can act for another parent.
+    Requests on `limited_paths` (POSTs and WebSockets) then go through
+    `limiter`, per parent (or per client address without one), and hold a
+    concurrency slot until the response is done. Rejections are 401 and 429 with Retry-After (close
+    codes 1008 and 1013 on WebSockets).
+    """
+
+    def __init__(self, app, authenticator: Authenticator, limiter=None,
+                 public_paths=("/health", "/ready", "/metrics", "/docs", "/openapi.json"),
+                 limited_paths=()):
+        self.app = app
+        self.authenticator = authenticator
+        self.limiter = limiter
+        self.public_paths = tuple(public_paths)
+        self.limited_paths = tuple(limited_paths)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if (scope["type"] not in ("http", "websocket") or scope.get("method") == "OPTIONS"
+                or path == "/" or path.startswith(self.public_paths)):
+            await self.app(scope, receive, send)
+            return
+
+        token = request_token(scope)
+        parent_id = self.authenticator.authenticate(token) if token else None
+        if parent_id is None and (token or not self.authenticator.allow_anonymous):
+            await self._reject(scope, send, 401, "Invalid token" if token else "Missing token")
+            return
+
+        headers = [(k, v) for k, v in scope["headers"] if k != b"x-parent-id"]
+        if parent_id:
+            headers.append((b"x-parent-id", parent_id.encode()))
+        # In place: outer middleware reads what the router writes into this scope
+        scope["headers"] = headers
+
+        limited = (self.limiter is not None and path.startswith(self.limited_paths)
+                   and (scope["type"] == "websocket" or scope["method"] == "POST"))
+        if not limited:
+            await self.app(scope, receive, send)
+            return
+
+        key = parent_id or "client:" + (scope.get("client") or ("unknown",))[0]
+        try:
+            self.limiter.acquire(key)
+        except RateLimitedError as e:
+            await self._reject(scope, send, 429, str(e), e.retry_after)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release(key)
+
+    async def _reject(self, scope, send, status: int, detail: str, retry_after: int = None):
+        if scope["type"] == "websocket":
+            await send({"type": "websocket.close", "code": 1008 if status == 401 else 1013})
+            return
+        body = json.dumps({"detail": detail}).encode()
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        if status == 401:
+            headers.append((b"www-authenticate", b"Bearer"))
+        if retry_after is not None:
+            headers.append((b"retry-after", str(retry_after).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
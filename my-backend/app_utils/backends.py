@@ -0,0 +1,274 @@
+# backends.py
+# Device/precision selection and pluggable ASR / text-classification backends
+#
+# Heavy libraries are imported inside the backend constructors, so only the
+# backend that is actually selected has to be installed.
+
+import logging
+import os
+from typing import Dict, List
+
+from app_utils.logs import LOGGER_NAME
+
+log = logging.getLogger(LOGGER_NAME)
+
+SAMPLE_RATE = 16000
+
+# Language hints Whisper accepts from clients; `auto` lets it detect
+ASR_LANGUAGES = {"ar": "ar", "arabic": "ar", "en": "en", "english": "en", "auto": None}
+
+
+def asr_language(hint: str = None):
+    """
+    Whisper language code for a client hint, falling back to ASR_LANGUAGE
+    (default auto). With a language set Whisper skips its detection pass.
+    Raises ValueError for unsupported hints.
+    """
+    hint = (hint or os.environ.get("ASR_LANGUAGE") or "auto").lower()
+    if hint not in ASR_LANGUAGES:
+        raise ValueError(f"language must be one of {', '.join(ASR_LANGUAGES)}")
+    return ASR_LANGUAGES[hint]
+
+
+def inference_threads() -> int:
+    """CPU threads per model (INFERENCE_THREADS, default: all cores)."""
+    return int(os.environ.get("INFERENCE_THREADS", "0")) or (os.cpu_count() or 1)
+
+
+def detect_device() -> str:
+    """INFERENCE_DEVICE (cuda/cpu), or whatever is available when `auto`."""
+    device = os.environ.get("INFERENCE_DEVICE", "auto").lower()
+    if device != "auto":
+        return device
+    try:
+        import torch
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    except ImportError:
+        pass
+    try:
+        import ctranslate2
+        return "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    except ImportError:
+        return "cpu"
+
+
+class TransformersWhisperBackend:
+    """Hugging Face Whisper pipeline; fp16 on CUDA, fp32 on CPU."""
+
+    name = "transformers"
+
+    def __init__(self, model_name: str, device: str, threads: int):
+        import torch
+        from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
+
+        dtype = torch.float16 if device == "cuda" else torch.float32
+        if device == "cpu":
+            torch.set_num_threads(threads)
+        processor = AutoProcessor.from_pretrained(model_name)
+        model = AutoModelForSpeechSeq2Seq.from_pretrained(
+            model_name,
+            torch_dtype=dtype,
+            low_cpu_mem_usage=True,
+            use_safetensors=True,
+        ).to(device)
+
+        self.pipe = pipeline(
+            "automatic-speech-recognition",
+            model=model,
+            tokenizer=processor.tokenizer,
+            feature_extractor=processor.feature_extractor,
+            torch_dtype=dtype,
+            device=device,
+        )
+        self.info = {"backend": self.name, "model": model_name, "device": device,
+                     "precision": str(dtype).replace("torch.", ""), "threads": threads}
+
+    @staticmethod
+    def _input(audio):
+        # File paths go through as-is; arrays need their sampling rate
+        return audio if isinstance(audio, str) else {"raw": audio, "sampling_rate": SAMPLE_RATE}
+
+    @staticmethod
+    def _generate_kwargs(language):
+        # A fixed language and task replace Whisper's detection step
+        return {"generate_kwargs": {"language": language, "task": "transcribe"}} if language else {}
+
+    def transcribe(self, audio, language: str = None) -> str:
+        """`audio` is a file path or a 16 kHz mono float32 array."""
+        return self.pipe(self._input(audio), **self._generate_kwargs(language))["text"]
+
+    def transcribe_batch(self, arrays: List, batch_size: int = 8, language: str = None) -> List[str]:
+        results = self.pipe([self._input(a) for a in arrays], batch_size=min(len(arrays), batch_size),
+                            **self._generate_kwargs(language))
+        return [r["text"] for r in results]
+
+
+class FasterWhisperBackend:
+    """CTranslate2 Whisper (faster-whisper); float16 on CUDA, int8 on CPU by default."""
+
+    name = "faster-whisper"
+
+    def __init__(self, model_size: str, device: str, compute_type: str, threads: int):
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(
+            model_size,
+            device=device,
+            compute_type=compute_type,
+            cpu_threads=threads if device == "cpu" else 0,
+        )
+        self.info = {"backend": self.name, "model": model_size, "device": device,
+                     "precision": compute_type, "threads": threads}
+
+    def transcribe(self, audio, language: str = None, **options) -> str:
+        """`audio` is a file path or a 16 kHz mono float32 array."""
+        segments, _ = self.model.transcribe(audio, beam_size=5, language=language, task="transcribe", **options)
+        return " ".join(seg.text for seg in segments)
+
+    def transcribe_batch(self, arrays: List, batch_size: int = 8, language: str = None) -> List[str]:
+        # CTranslate2 decodes one input at a time here; spans are short, and
+        # without a language each one would get its own detection pass
+        return [self.transcribe(a, language=language) for a in arrays]
+
+
+class TransformersClassifierBackend:
+    """Hugging Face text-classification pipeline (PyTorch)."""
+
+    name = "transformers"
+
+    def __init__(self, model_name: str, device: str, threads: int):
+        from transformers import pipeline
+
+        if device == "cpu":
+            import torch
+            torch.set_num_threads(threads)
+        self.pipe = pipeline("text-classification", model=model_name, device=device)
+        self.info = {"backend": self.name, "model": model_name, "device": device,
+                     "precision": "float32", "threads": threads}
+
+    def classify(self, texts: List[str]) -> List[Dict]:
+        """One padded batch; returns [{"label": ..., "score": ...}] per text."""
+        return self.pipe(texts, batch_size=len(texts), truncation=True)
+
+
+class OnnxClassifierBackend:
+    """
+    The classifier exported to ONNX and dynamically quantized to int8, run
+    by ONNX Runtime on CPU. The export is done once and kept in `cache_dir`.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_name: str, threads: int, cache_dir: str):
+        import onnxruntime as ort
+        from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer, pipeline
+
+        export_dir = os.path.join(cache_dir, model_name.replace("/", "--"))
+        quantized_dir = export_dir + "-int8"
+        quantized_file = "model_quantized.onnx"
+        if not os.path.exists(os.path.join(quantized_dir, quantized_file)):
+            log.info("Exporting %s to ONNX (int8)...", model_name)
+            exported = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+            exported.save_pretrained(export_dir)
+            quantizer = ORTQuantizer.from_pretrained(export_dir)
+            quantizer.quantize(
+                save_dir=quantized_dir,
+                quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False),
+            )
+            exported.config.save_pretrained(quantized_dir)
+            AutoTokenizer.from_pretrained(model_name).save_pretrained(quantized_dir)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        model = ORTModelForSequenceClassification.from_pretrained(
+            quantized_dir,
+            file_name=quantized_file,
+            session_options=options,
+            provider="CPUExecutionProvider",
+        )
+        tokenizer = AutoTokenizer.from_pretrained(quantized_dir)
+        self.pipe = pipeline("text-classification", model=model, tokenizer=tokenizer)
+        self.info = {"backend": self.name, "model": model_name, "device": "cpu",
+                     "precision": "int8", "threads": threads}
+
+    def classify(self, texts: List[str]) -> List[Dict]:
+        """One padded batch; returns [{"label": ..., "score": ...}] per text."""
+        return self.pipe(texts, batch_size=len(texts), truncation=True)
+
+
+def asr_backend_choice(cuda_backend: str = "transformers") -> str:
+    """ASR_BACKEND, else `cuda_backend` on GPU and faster-whisper on CPU."""
+    return os.environ.get("ASR_BACKEND") or (cuda_backend if detect_device() == "cuda" else "faster-whisper")
+
+
+def asr_backend_profile(cuda_backend: str = "transformers") -> Dict[str, str]:
+    """
+    The backend, device and precision create_asr_backend picks (the same
+    fields as its `info`), worked out without loading anything.
+    """
+    device = detect_device()
+    backend = asr_backend_choice(cuda_backend)
+    if backend == "faster-whisper":
+        precision = os.environ.get("ASR_COMPUTE_TYPE") or ("float16" if device == "cuda" else "int8")
+    else:
+        precision = "float16" if device == "cuda" else "float32"
+    return {"backend": backend, "device": device, "precision": precision}
+
+
+def create_asr_backend(transformers_model: str, faster_whisper_model: str,
+                       cuda_backend: str = "transformers"):
+    """
+    Pick the ASR backend at startup. ASR_BACKEND (transformers or
+    faster-whisper) overrides; otherwise `cuda_backend` is used on GPU and
+    int8 faster-whisper on CPU. ASR_COMPUTE_TYPE overrides the
+    faster-whisper precision (default float16 on CUDA, int8 on CPU).
+    """
+    profile = asr_backend_profile(cuda_backend)
+    threads = inference_threads()
+    if profile["backend"] == "transformers":
+        return TransformersWhisperBackend(transformers_model, profile["device"], threads)
+    if profile["backend"] == "faster-whisper":
+        return FasterWhisperBackend(faster_whisper_model, profile["device"], profile["precision"], threads)
+    raise ValueError(f"Unknown ASR_BACKEND: {profile['backend']}")
+
+
+def classifier_backend_choice() -> str:
+    """CLASSIFIER_BACKEND, else transformers on GPU and onnx on CPU."""
+    return os.environ.get("CLASSIFIER_BACKEND") or ("transformers" if detect_device() == "cuda" else "onnx")
+
+
+def classifier_backend_profile() -> Dict[str, str]:
+    """The backend, device and precision create_classifier_backend picks, without loading anything."""
+    device = detect_device()
+    backend = classifier_backend_choice()
+    if backend == "onnx":
+        return {"backend": backend, "device": "cpu", "precision": "int8"}
+    return {"backend": backend, "device": device, "precision": "float32"}
+
+
+def backend_cache_tag(info: Dict) -> str:
+    """
+    The part of a backend's `info` that changes its output (name and
+    precision), for result cache keys: int8, fp16 and fp32 results differ.
+    """
+    return f"{info.get('backend', '?')}/{info.get('precision', '?')}"
+
+
+def create_classifier_backend(model_name: str):
+    """
+    Pick the text-classification backend at startup. CLASSIFIER_BACKEND
+    (transformers or onnx) overrides; otherwise PyTorch on GPU and the
+    quantized ONNX export on CPU (stored under ONNX_CACHE_DIR).
+    """
+    device = detect_device()
+    threads = inference_threads()
+    backend = classifier_backend_choice()
+    if backend == "transformers":
+        return TransformersClassifierBackend(model_name, device, threads)
+    if backend == "onnx":
+        cache_dir = os.environ.get("ONNX_CACHE_DIR", os.path.expanduser("~/.cache/eveguard-onnx"))
+        return OnnxClassifierBackend(model_name, threads, cache_dir)
+    raise ValueError(f"Unknown CLASSIFIER_BACKEND: {backend}")
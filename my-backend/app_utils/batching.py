@@ -0,0 +1,154 @@
+# batching.py
+# Dynamic micro-batching in front of a batched model call
+
+import logging
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+from app_utils.executor import OverloadedError, percentiles
+from app_utils.logs import LOGGER_NAME
+
+log = logging.getLogger(LOGGER_NAME)
+
+
+class MicroBatcher:
+    """
+    Collects items submitted from any thread (or event loop) and hands them
+    to `process_batch` together. A batch is closed once it holds
+    `max_batch_size` items or the oldest item has waited `max_wait_ms`.
+
+    `process_batch(items)` must return one result per item, in order.
+    Each caller gets a concurrent.futures.Future for its own result; async
+    callers can `await asyncio.wrap_future(future)`. Items whose Future was
+    cancelled before their batch started (e.g. the awaiting request went
+    away) are dropped from it. With `max_queue` set, submissions beyond
+    that many waiting items raise OverloadedError.
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 16, max_wait_ms: float = 10.0,
+                 max_queue: int = 0, name: str = "batcher"):
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.max_queue = max(0, int(max_queue))
+        self.name = name
+        self._process_batch = process_batch
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+        # Stats
+        self.batch_sizes: Counter = Counter()
+        self.items_processed = 0
+        self.batches_processed = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self._queue_waits_ms: deque = deque(maxlen=2048)
+        self._batch_times_ms: deque = deque(maxlen=2048)
+
+    def submit(self, item: Any) -> Future:
+        """Queue one item and return a Future for its result."""
+        self._ensure_started()
+        if self.max_queue and self._queue.qsize() >= self.max_queue:
+            with self._lock:
+                self.rejected += 1
+            raise OverloadedError(f"{self.name} queue is full ({self.max_queue} waiting)")
+        future: Future = Future()
+        self._queue.put((item, future, time.monotonic()))
+        return future
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> List:
+        first = self._queue.get()
+        batch = [first]
+        deadline = first[2] + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Window closed: still take whatever is already waiting
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            collected = self._collect()
+            # A running Future can no longer be cancelled, so its result can always be set
+            batch = [entry for entry in collected if entry[1].set_running_or_notify_cancel()]
+            if len(batch) < len(collected):
+                with self._lock:
+                    self.cancelled += len(collected) - len(batch)
+            if not batch:
+                continue
+            started = time.monotonic()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self._process_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"{self.name}: got {len(results)} results for {len(items)} items")
+            except Exception as e:
+                self._deliver(batch, [e] * len(batch), failed=True)
+            else:
+                self._deliver(batch, results)
+            finished = time.monotonic()
+
+            with self._lock:
+                self.batch_sizes[len(batch)] += 1
+                self.batches_processed += 1
+                self.items_processed += len(batch)
+                self._batch_times_ms.append((finished - started) * 1000)
+                for _, _, enqueued in batch:
+                    self._queue_waits_ms.append((started - enqueued) * 1000)
+
+    def _deliver(self, batch: List, results: List, failed: bool = False):
+        """Resolve each Future; nothing raised here may stop the batching thread."""
+        for (_, future, _), result in zip(batch, results):
+            try:
+                if failed:
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            except Exception:
+                log.exception("%s: could not deliver a result", self.name)
+
+    def stats(self) -> Dict:
+        """Batch-size distribution plus queue-wait and batch-time percentiles."""
+        with self._lock:
+            waits = sorted(self._queue_waits_ms)
+            times = sorted(self._batch_times_ms)
+            histogram = dict(sorted(self.batch_sizes.items()))
+            batches = self.batches_processed
+            items = self.items_processed
+            rejected = self.rejected
+            cancelled = self.cancelled
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "max_queue": self.max_queue,
+            "queue_depth": self._queue.qsize(),
+            "batches": batches,
+            "items": items,
+            "rejected": rejected,
+            "cancelled": cancelled,
+            "mean_batch_size": round(items / batches, 3) if batches else 0.0,
+            "batch_size_histogram": histogram,
+            "queue_wait_ms": percentiles(waits),
+            "batch_time_ms": percentiles(times),
+        }
@@ -0,0 +1,167 @@
+# cache.py
+# Two-tier (memory LRU + optional SQLite) cache for model results
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def cache_key(*parts: str) -> str:
+    """Stable key from e.g. a namespace, model name/version and content hash."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """Whitespace-insensitive form of a text used for cache keys."""
+    return " ".join(text.split())
+
+
+class ResultCache:
+    """
+    LRU cache bounded by `max_entries` with a per-entry TTL. When `disk_path`
+    is set, entries are also written to a SQLite table so they survive
+    restarts; disk hits are promoted back into memory. Values must be
+    JSON-serializable.
+    """
+
+    def __init__(self, name: str, max_entries: int = 1024, ttl_seconds: float = 86400,
+                 disk_path: Optional[str] = None):
+        self.name = name
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._table = re.sub(r"\W", "_", name)
+        self._db = None
+        self._writes = 0
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+        # Stats
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Any:
+        """Cached value for `key`, or None. Blocks on SQLite; use aget() on the event loop."""
+        value = self._get_memory(key)
+        if value is None:
+            value = self._get_disk(key)
+        return value
+
+    def set(self, key: str, value: Any):
+        """Blocks on SQLite; use aset() on the event loop."""
+        expires_at = self._set_memory(key, value)
+        self._set_disk(key, value, expires_at)
+
+    async def aget(self, key: str) -> Any:
+        """get() with the SQLite lookup on a worker thread; memory hits stay on the loop."""
+        value = self._get_memory(key)
+        if value is None:
+            value = await asyncio.to_thread(self._get_disk, key) if self._db is not None else self._get_disk(key)
+        return value
+
+    async def aset(self, key: str, value: Any):
+        """set() with the SQLite write and commit on a worker thread."""
+        expires_at = self._set_memory(key, value)
+        if self._db is not None:
+            await asyncio.to_thread(self._set_disk, key, value, expires_at)
+
+    def _get_memory(self, key: str) -> Any:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+        return None
+
+    def _get_disk(self, key: str) -> Any:
+        """Counts the miss when there is no disk tier or the key is not on it."""
+        with self._lock:
+            if self._db is not None:
+                row = self._db.execute(
+                    f"SELECT value, expires_at FROM {self._table} WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > time.time():
+                    value = json.loads(row[0])
+                    self._remember_locked(key, value, row[1])
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def _set_memory(self, key: str, value: Any) -> float:
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember_locked(key, value, expires_at)
+        return expires_at
+
+    def _set_disk(self, key: str, value: Any, expires_at: float):
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {self._table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at),
+            )
+            self._writes += 1
+            if self._writes % 256 == 0:
+                self._db.execute(f"DELETE FROM {self._table} WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+
+    def _remember_locked(self, key: str, value: Any, expires_at: float):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "disk_tier": self._db is not None,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def cache_from_env(name: str) -> ResultCache:
+    """
+    Build a ResultCache configured by RESULT_CACHE_SIZE,
+    RESULT_CACHE_TTL_SECONDS and RESULT_CACHE_DB (SQLite path; unset means
+    memory only).
+    """
+    return ResultCache(
+        name,
+        max_entries=int(os.environ.get("RESULT_CACHE_SIZE", "1024")),
+        ttl_seconds=float(os.environ.get("RESULT_CACHE_TTL_SECONDS", "86400")),
+        disk_path=os.environ.get("RESULT_CACHE_DB") or None,
+    )
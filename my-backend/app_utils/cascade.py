@@ -0,0 +1,68 @@
+# cascade.py
+# Early-exit policy for the keyword -> MARBERT analysis cascade
+
+import os
+from typing import Optional
+
+
+class CascadePolicy:
+    """
+    Decides when the cheap keyword stage is decisive enough that MARBERT
+    can be skipped.
+
+    - `high_threshold`: keyword danger scores at or above this are already
+      decisive. MARBERT can only raise the score, so with the default 0.7
+      (the "danger" cut-off) the risk level can never change.
+    - `benign_max_words` / `low_threshold`: texts with at most this many
+      words and a keyword score at or below `low_threshold` are treated as
+      benign. Disabled by default (0 words) because short insults missing
+      from the lexicon are exactly what MARBERT catches; measure the trade-off
+      with cascade_eval.py before turning it on.
+    - `arabic_only`: MARBERT is an Egyptian-Arabic model, so texts without
+      Arabic letters (script `latin` or `none`) skip it.
+    """
+
+    def __init__(self, enabled: bool = True, high_threshold: float = 0.7,
+                 low_threshold: float = 0.0, benign_max_words: int = 0, arabic_only: bool = True):
+        self.enabled = enabled
+        self.high_threshold = high_threshold
+        self.low_threshold = low_threshold
+        self.benign_max_words = benign_max_words
+        self.arabic_only = arabic_only
+
+    @classmethod
+    def from_env(cls) -> "CascadePolicy":
+        return cls(
+            enabled=os.environ.get("CASCADE_ENABLED", "1") == "1",
+            high_threshold=float(os.environ.get("CASCADE_HIGH_THRESHOLD", "0.7")),
+            low_threshold=float(os.environ.get("CASCADE_LOW_THRESHOLD", "0.0")),
+            benign_max_words=int(os.environ.get("CASCADE_BENIGN_MAX_WORDS", "0")),
+            arabic_only=os.environ.get("CASCADE_ARABIC_ONLY", "1") == "1",
+        )
+
+    def exit_reason(self, text: str, keyword_danger_score: float, script: str = None) -> Optional[str]:
+        """
+        Why MARBERT can be skipped for this text, or None to run it.
+        `script` is app_utils.lexicon.detect_script(text), when known.
+        """
+        if not text.strip():
+            return "empty"
+        if not self.enabled:
+            return None
+        if keyword_danger_score >= self.high_threshold:
+            return "keyword_decisive"
+        if self.arabic_only and script in ("latin", "none"):
+            return "not_arabic"
+        if (keyword_danger_score <= self.low_threshold
+                and len(text.split()) <= self.benign_max_words):
+            return "benign"
+        return None
+
+    def describe(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "high_threshold": self.high_threshold,
+            "low_threshold": self.low_threshold,
+            "benign_max_words": self.benign_max_words,
+            "arabic_only": self.arabic_only,
+        }
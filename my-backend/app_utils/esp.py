@@ -0,0 +1,137 @@
+# esp.py
+# Fire-and-forget camera triggers for the ESP32-CAM devices
+
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, Optional
+
+from app_utils.logs import LOGGER_NAME
+
+log = logging.getLogger(LOGGER_NAME)
+
+# The sketch parses /command into a 200-byte JSON document, so the payload
+# stays exactly what it expects
+OPEN_CAMERA = {"action": "open_camera"}
+
+
+class CameraDispatcher:
+    """
+    Sends `open_camera` commands to ESP32-CAM devices without holding up the
+    request that triggered them.
+
+    One pooled httpx.AsyncClient (keep-alive) is shared by all devices. A
+    device gets at most `max_per_device` requests in flight; failed attempts
+    (connection errors, 429 and 5xx) are retried up to `retries` times with
+    full-jitter exponential backoff. Triggers for a device within
+    `coalesce_seconds` of the last dispatched one are coalesced, so a burst
+    of dangerous chunks opens the camera once. If every attempt fails the
+    window is reset, so the next trigger tries again.
+    """
+
+    def __init__(self, api_key: str = "", coalesce_seconds: float = 30.0, max_per_device: int = 1,
+                 retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 timeout: float = 5.0, max_connections: int = 100):
+        self.api_key = api_key
+        self.coalesce_seconds = coalesce_seconds
+        self.max_per_device = max_per_device
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.max_connections = max_connections
+
+        self._client = None
+        self._last_trigger: Dict[str, float] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._tasks = set()
+
+        # Stats
+        self.triggered = 0
+        self.coalesced = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                headers={"x-api-key": self.api_key} if self.api_key else None,
+            )
+        return self._client
+
+    def trigger(self, url: str, reason: Optional[Dict] = None) -> bool:
+        """
+        Schedule an `open_camera` command for the device at `url` on the
+        running event loop and return immediately. False if it was coalesced
+        into an earlier trigger.
+        """
+        now = time.monotonic()
+        last = self._last_trigger.get(url)
+        if last is not None and now - last < self.coalesce_seconds:
+            self.coalesced += 1
+            return False
+        self._last_trigger[url] = now
+        self.triggered += 1
+
+        task = asyncio.get_running_loop().create_task(self._dispatch(url, reason or {}))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _dispatch(self, url: str, reason: Dict):
+        import httpx
+
+        semaphore = self._semaphores.setdefault(url, asyncio.Semaphore(self.max_per_device))
+        async with semaphore:
+            for attempt in range(self.retries + 1):
+                error = None
+                try:
+                    response = await self._get_client().post(url, json=OPEN_CAMERA)
+                    if response.status_code < 500 and response.status_code != 429:
+                        if response.is_success:
+                            self.sent += 1
+                            log.info("Camera opened on %s (%s)", url, reason)
+                        else:
+                            # 4xx (bad key, unknown action) will not improve on retry
+                            self.failed += 1
+                            self._last_trigger.pop(url, None)
+                            log.warning("ESP at %s refused open_camera: %s", url, response.status_code)
+                        return
+                    error = f"HTTP {response.status_code}"
+                except httpx.HTTPError as e:
+                    error = repr(e)
+
+                if attempt < self.retries:
+                    self.retried += 1
+                    cap = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                    await asyncio.sleep(random.uniform(0, cap))
+
+            self.failed += 1
+            self._last_trigger.pop(url, None)
+            log.warning("Could not reach ESP at %s after %d attempts: %s", url, self.retries + 1, error)
+
+    async def aclose(self):
+        """Wait briefly for in-flight dispatches, then close the pooled client."""
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=self.timeout)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict:
+        return {
+            "triggered": self.triggered,
+            "coalesced": self.coalesced,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "in_flight": len(self._tasks),
+            "coalesce_seconds": self.coalesce_seconds,
+        }
@@ -0,0 +1,122 @@
+# executor.py
+# Size-bounded worker pool with admission control for blocking inference
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class OverloadedError(RuntimeError):
+    """Raised when work cannot be admitted; carries a Retry-After hint in seconds."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    Runs blocking model calls on `max_workers` threads so they never stall
+    the event loop. At most `max_queue` calls may wait for a free worker;
+    anything beyond that is rejected immediately with OverloadedError
+    instead of piling up behind a slow transcription.
+    """
+
+    def __init__(self, max_workers: int = 1, max_queue: int = 8, name: str = "inference"):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.name = name
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+
+        # Stats
+        self.admitted = 0
+        self.rejected = 0
+        self.failed = 0
+        self._waits_ms: deque = deque(maxlen=2048)
+        self._durations_ms: deque = deque(maxlen=2048)
+
+    def ensure_capacity(self):
+        """
+        Cheap pre-check so handlers can reject before reading an upload.
+        Admission itself still happens in submit().
+        """
+        with self._lock:
+            self._check_capacity_locked()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Admit `fn(*args, **kwargs)` or raise OverloadedError right away."""
+        with self._lock:
+            self._check_capacity_locked()
+            self._queued += 1
+            self.admitted += 1
+        return self._pool.submit(self._call, time.monotonic(), fn, args, kwargs)
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Await `fn(*args, **kwargs)` on the pool from async code."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def _call(self, enqueued: float, fn: Callable, args, kwargs):
+        started = time.monotonic()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._waits_ms.append((started - enqueued) * 1000)
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._durations_ms.append((time.monotonic() - started) * 1000)
+
+    def _check_capacity_locked(self):
+        if self._queued + self._running >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise OverloadedError(
+                f"{self.name} is at capacity ({self._running} running, {self._queued} queued)",
+                retry_after=self._retry_after_locked(),
+            )
+
+    def _retry_after_locked(self) -> int:
+        # Rough time until a slot frees up: queued work spread over the workers
+        mean_s = (sum(self._durations_ms) / len(self._durations_ms) / 1000) if self._durations_ms else 1.0
+        backlog = (self._queued + self._running) / self.max_workers
+        return max(1, math.ceil(mean_s * backlog))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            waits = sorted(self._waits_ms)
+            durations = sorted(self._durations_ms)
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queue_depth": self._queued,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "failed": self.failed,
+                "queue_wait_ms": percentiles(waits),
+                "run_time_ms": percentiles(durations),
+            }
+
+
+def percentiles(sorted_values) -> Dict:
+    """p50/p95/p99 of an already sorted list of numbers."""
+    if not sorted_values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+
+    def pick(q):
+        index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+        return round(sorted_values[index], 3)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
@@ -0,0 +1,340 @@
+# heartrate.py
+# Heart-rate ingestion for the ESP32 wearables: per-device ring buffers,
+# alert dedupe, batched SQLite writes and per-minute rollups
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+from app_utils.executor import OverloadedError
+from app_utils.logs import LOGGER_NAME
+
+log = logging.getLogger(LOGGER_NAME)
+
+MAX_BPM = 300
+
+# Rollup resolution; summary buckets are multiples of this
+ROLLUP_SECONDS = 60
+
+# How far a device timestamp may be from the server clock and still be
+# taken as wall-clock time (the sketch sends millis() since boot instead)
+_CLOCK_TOLERANCE = 86400
+
+
+def _as_number(value) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+def parse_reading(item, parent_id: Optional[str] = None) -> Dict:
+    """
+    Validate one reading as sent by esp32_cam.ino: {"heart_rate",
+    "device_id", "alert_type", "parent_id", "timestamp"}. Raises ValueError.
+    The reading belongs to `parent_id`, the authenticated parent: a
+    different "parent_id" in the body is rejected, and ignored when the
+    request has no parent.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("expected an object")
+    device_id = item.get("device_id")
+    if not isinstance(device_id, str) or not device_id.strip():
+        raise ValueError("device_id is required")
+    heart_rate = _as_number(item.get("heart_rate"))
+    if heart_rate is None or not 0 <= heart_rate <= MAX_BPM:
+        raise ValueError(f"heart_rate must be a number between 0 and {MAX_BPM}")
+    alert_type = item.get("alert_type")
+    if alert_type is not None and not isinstance(alert_type, str):
+        raise ValueError("alert_type must be a string")
+    claimed = item.get("parent_id")
+    if parent_id and claimed not in (None, "") and str(claimed) != parent_id:
+        raise ValueError("parent_id does not match the authenticated parent")
+
+    return {
+        "device_id": device_id.strip()[:64],
+        "parent_id": parent_id or None,
+        "heart_rate": heart_rate,
+        "alert_type": alert_type or None,
+        "device_ts": _as_number(item.get("timestamp")),
+    }
+
+
+def resolve_timestamps(readings: List[Dict], now: float):
+    """
+    Set `ts` (epoch seconds) on each reading. Timestamps close to the server
+    clock, in seconds or milliseconds, are kept. Anything else is taken as
+    device uptime in milliseconds and placed relative to the newest reading
+    of the same device in the batch, which counts as received `now`.
+    """
+    def wall_clock(ts):
+        if abs(ts - now) < _CLOCK_TOLERANCE:
+            return ts
+        if abs(ts / 1000 - now) < _CLOCK_TOLERANCE:
+            return ts / 1000
+        return None
+
+    newest = {}
+    for r in readings:
+        ts = r["device_ts"]
+        if ts is not None and wall_clock(ts) is None:
+            newest[r["device_id"]] = max(newest.get(r["device_id"], ts), ts)
+
+    for r in readings:
+        ts = r["device_ts"]
+        if ts is None:
+            r["ts"] = now
+        elif wall_clock(ts) is not None:
+            r["ts"] = min(wall_clock(ts), now)
+        else:
+            r["ts"] = now - (newest[r["device_id"]] - ts) / 1000
+
+
+class DeviceBuffers:
+    """
+    The last `size` readings of each device, in memory, kept apart per
+    parent. Devices that have not reported for the longest are dropped
+    beyond `max_devices`.
+    """
+
+    def __init__(self, size: int = 256, max_devices: int = 20000):
+        self.size = size
+        self.max_devices = max_devices
+        self._buffers: "OrderedDict[tuple, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, reading: Dict):
+        sample = (reading["ts"], reading["heart_rate"], reading["alert_type"])
+        key = (reading["parent_id"], reading["device_id"])
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                buffer = self._buffers[key] = deque(maxlen=self.size)
+            self._buffers.move_to_end(key)
+            buffer.append(sample)
+            while len(self._buffers) > self.max_devices:
+                self._buffers.popitem(last=False)
+
+    def recent(self, device_id: str, limit: int = 60, parent_id: Optional[str] = None) -> List[Dict]:
+        """The device's last `limit` readings sent for `parent_id`."""
+        with self._lock:
+            samples = list(self._buffers.get((parent_id or None, device_id), ()))[-limit:]
+        return [{"ts": ts, "heart_rate": hr, "alert_type": alert} for ts, hr, alert in samples]
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+
+class AlertDeduper:
+    """
+    One alert per parent, device and alert type per `cooldown_seconds`, matching the
+    sketch's ALERT_COOLDOWN; repeats inside the window are duplicates, even
+    when they come from retries or several gateways.
+    """
+
+    def __init__(self, cooldown_seconds: float = 10.0, max_entries: int = 100000):
+        self.cooldown_seconds = cooldown_seconds
+        self.max_entries = max_entries
+        self._last: "OrderedDict[tuple, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def accept(self, device_id: str, alert_type: str, ts: float, parent_id: Optional[str] = None) -> bool:
+        key = (parent_id or None, device_id, alert_type)
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and abs(ts - last) < self.cooldown_seconds:
+                return False
+            self._last[key] = ts
+            self._last.move_to_end(key)
+            while len(self._last) > self.max_entries:
+                self._last.popitem(last=False)
+            return True
+
+
+class HeartRateStore:
+    """
+    SQLite time series of readings. `add` only queues; a writer thread
+    commits everything queued in one transaction every `flush_interval`
+    seconds (sooner once `flush_rows` are waiting) and updates per-minute
+    rollups in the same transaction, so windowed queries read one row per
+    device-minute instead of the raw history. Raw samples older than
+    `retention_days` are purged; rollups are kept.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.5, flush_rows: int = 1000,
+                 max_queue: int = 50000, retention_days: float = 30):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.max_queue = max_queue
+        self.retention_seconds = retention_days * 86400
+
+        self._pending: List[Dict] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._read_lock = threading.Lock()
+
+        db = self._connect()
+        db.executescript(
+            "CREATE TABLE IF NOT EXISTS heart_samples ("
+            " device_id TEXT NOT NULL, ts REAL NOT NULL, heart_rate REAL NOT NULL,"
+            " alert_type TEXT, parent_id TEXT);"
+            "CREATE INDEX IF NOT EXISTS heart_samples_device_ts ON heart_samples (device_id, ts);"
+            # parent_id is '' for readings sent without a parent
+            "CREATE TABLE IF NOT EXISTS heart_rollups ("
+            " parent_id TEXT NOT NULL, device_id TEXT NOT NULL, bucket INTEGER NOT NULL, count INTEGER NOT NULL,"
+            " total REAL NOT NULL, min_bpm REAL NOT NULL, max_bpm REAL NOT NULL, alerts INTEGER NOT NULL,"
+            " PRIMARY KEY (parent_id, device_id, bucket));"
+        )
+        db.commit()
+        self._reader = db
+
+        # Stats
+        self.written = 0
+        self.flushes = 0
+        self.rejected = 0
+        self.failed_writes = 0
+        self.last_flush_ms = 0.0
+
+        self._writer = threading.Thread(target=self._run, name="heart-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def ensure_capacity(self, rows: int):
+        """Raise OverloadedError if `rows` more readings would not fit in the write queue."""
+        with self._cond:
+            if len(self._pending) + rows > self.max_queue:
+                self.rejected += rows
+                raise OverloadedError("Heart-rate write queue is full, retry shortly", self.flush_interval + 1)
+
+    def add(self, readings: List[Dict]):
+        """Queue readings (with `ts` set) for the next batched write."""
+        self.ensure_capacity(len(readings))
+        with self._cond:
+            self._pending.extend(readings)
+            if len(self._pending) >= self.flush_rows:
+                self._cond.notify()
+
+    def _run(self):
+        db = self._connect()
+        last_purge = 0.0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._pending) >= self.flush_rows,
+                                    timeout=self.flush_interval)
+                batch, self._pending = self._pending, []
+                closed = self._closed
+            # Nothing may end this thread: without it the queue fills and every reading gets a 503
+            if batch:
+                try:
+                    self._write(db, batch)
+                except Exception:
+                    self.failed_writes += 1
+                    log.exception("Heart-rate write of %d readings failed", len(batch))
+            if time.time() - last_purge > 3600:
+                last_purge = time.time()
+                try:
+                    with db:
+                        db.execute("DELETE FROM heart_samples WHERE ts < ?",
+                                   (last_purge - self.retention_seconds,))
+                except Exception:
+                    log.exception("Heart-rate purge failed")
+            if closed:
+                db.close()
+                return
+
+    def _write(self, db: sqlite3.Connection, batch: List[Dict]):
+        started = time.perf_counter()
+        rollups: Dict[tuple, list] = {}
+        for r in batch:
+            key = (r.get("parent_id") or "", r["device_id"], int(r["ts"] // ROLLUP_SECONDS) * ROLLUP_SECONDS)
+            alert = 1 if r.get("alert_type") and not r.get("duplicate") else 0
+            agg = rollups.get(key)
+            if agg is None:
+                rollups[key] = [1, r["heart_rate"], r["heart_rate"], r["heart_rate"], alert]
+            else:
+                agg[0] += 1
+                agg[1] += r["heart_rate"]
+                agg[2] = min(agg[2], r["heart_rate"])
+                agg[3] = max(agg[3], r["heart_rate"])
+                agg[4] += alert
+
+        with db:
+            db.executemany(
+                "INSERT INTO heart_samples (device_id, ts, heart_rate, alert_type, parent_id) VALUES (?, ?, ?, ?, ?)",
+                [(r["device_id"], r["ts"], r["heart_rate"], r.get("alert_type"), r.get("parent_id")) for r in batch],
+            )
+            db.executemany(
+                "INSERT INTO heart_rollups (parent_id, device_id, bucket, count, total, min_bpm, max_bpm, alerts)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (parent_id, device_id, bucket) DO UPDATE SET"
+                " count = count + excluded.count, total = total + excluded.total,"
+                " min_bpm = MIN(min_bpm, excluded.min_bpm), max_bpm = MAX(max_bpm, excluded.max_bpm),"
+                " alerts = alerts + excluded.alerts",
+                [(*key, *agg) for key, agg in rollups.items()],
+            )
+        self.written += len(batch)
+        self.flushes += 1
+        self.last_flush_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    def summary(self, device_id: str, since: float, until: float, bucket_seconds: int,
+                parent_id: Optional[str] = None) -> List[Dict]:
+        """
+        Count/mean/min/max/alerts per `bucket_seconds` bucket (a multiple of
+        ROLLUP_SECONDS) of the readings the device sent for `parent_id`.
+        """
+        with self._read_lock:
+            rows = self._reader.execute(
+                "SELECT (bucket / ?) * ? AS b, SUM(count), SUM(total), MIN(min_bpm), MAX(max_bpm), SUM(alerts)"
+                " FROM heart_rollups WHERE parent_id = ? AND device_id = ? AND bucket >= ? AND bucket < ?"
+                " GROUP BY b ORDER BY b",
+                (bucket_seconds, bucket_seconds, parent_id or "", device_id,
+                 int(since // ROLLUP_SECONDS) * ROLLUP_SECONDS, until),
+            ).fetchall()
+        return [
+            {
+                "start": b,
+                "end": b + bucket_seconds,
+                "count": count,
+                "mean_bpm": round(total / count, 1),
+                "min_bpm": low,
+                "max_bpm": high,
+                "alerts": alerts,
+            }
+            for b, count, total, low, high, alerts in rows
+        ]
+
+    def close(self):
+        """Write whatever is still queued and stop the writer."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._writer.join()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            queue_depth = len(self._pending)
+        return {
+            "queue_depth": queue_depth,
+            "max_queue": self.max_queue,
+            "written": self.written,
+            "flushes": self.flushes,
+            "rejected": self.rejected,
+            "failed_writes": self.failed_writes,
+            "mean_batch_size": round(self.written / self.flushes, 2) if self.flushes else 0.0,
+            "last_flush_ms": self.last_flush_ms,
+        }
@@ -0,0 +1,158 @@
+# jobs.py
+# Durable, prioritized job queue for uploads processed in the background
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+from app_utils.executor import OverloadedError
+
+# Higher runs first; SOS recordings jump ahead of routine analysis
+PRIORITIES = {"sos": 100, "high": 50, "normal": 0, "low": -50}
+
+TERMINAL = ("done", "failed")
+
+
+class JobQueue:
+    """
+    Jobs kept in SQLite, so queued work, progress and results survive a
+    restart. Workers `claim` the queued job with the highest priority
+    (oldest first within a priority). Jobs still `running` when the
+    process died are queued again on startup, up to `max_attempts` times.
+    Finished jobs are purged after `retention_days`.
+    """
+
+    def __init__(self, path: str, max_queued: int = 1000, max_attempts: int = 3,
+                 retention_days: float = 7):
+        self.path = path
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self.retention_seconds = retention_days * 86400
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, priority INTEGER NOT NULL,"
+            " params TEXT NOT NULL, stage TEXT, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+            " created REAL NOT NULL, started REAL, finished REAL);"
+            "CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (status, priority DESC, created);"
+        )
+        self._last_purge = 0.0
+
+        # Stats
+        self.submitted = 0
+        self.rejected = 0
+        self.recovered = self._recover()
+
+    def _recover(self) -> int:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Interrupted too many times', finished = ?"
+                " WHERE status = 'running' AND attempts >= ?", (time.time(), self.max_attempts))
+            return self._db.execute(
+                "UPDATE jobs SET status = 'queued', stage = NULL WHERE status = 'running'").rowcount
+
+    def submit(self, kind: str, params: Dict, priority: int = 0) -> Dict:
+        """Queue a job and return it; raises OverloadedError when the queue is full."""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            queued = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_queued:
+                self.rejected += 1
+                raise OverloadedError("Job queue is full, retry later", 30)
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, status, priority, params, created) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, priority, json.dumps(params), time.time()))
+            self.submitted += 1
+        return self.get(job_id)
+
+    def claim(self) -> Optional[Dict]:
+        """Mark the next queued job as running and return it with its params."""
+        with self._lock:
+            self._purge()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY priority DESC, created LIMIT 1").fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', stage = 'started', attempts = attempts + 1,"
+                        " started = ? WHERE id = ?", (time.time(), row[0]))
+            finally:
+                self._db.execute("COMMIT")
+        return self.get(row[0], with_params=True) if row is not None else None
+
+    def progress(self, job_id: str, stage: str):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET stage = ? WHERE id = ? AND status = 'running'", (stage, job_id))
+
+    def complete(self, job_id: str, result: Dict):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'done', stage = NULL, result = ?, finished = ? WHERE id = ?",
+                (json.dumps(result), time.time(), job_id))
+
+    def fail(self, job_id: str, error: str):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'failed', stage = NULL, error = ?, finished = ? WHERE id = ?",
+                (error, time.time(), job_id))
+
+    def release(self, job_id: str):
+        """Put a claimed job back in the queue without counting the attempt."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'queued', stage = NULL, attempts = attempts - 1 WHERE id = ?", (job_id,))
+
+    def get(self, job_id: str, with_params: bool = False) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, kind, status, priority, stage, result, error, attempts, created, started, finished, params"
+                " FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {
+            "job_id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "priority": row[3],
+            "stage": row[4],
+            "result": json.loads(row[5]) if row[5] else None,
+            "error": row[6],
+            "attempts": row[7],
+            "created_at": row[8],
+            "started_at": row[9],
+            "finished_at": row[10],
+        }
+        if with_params:
+            job["params"] = json.loads(row[11])
+        return job
+
+    def _purge(self):
+        now = time.time()
+        if now - self._last_purge > 3600:
+            self._last_purge = now
+            self._db.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished < ?",
+                             (now - self.retention_seconds,))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            oldest = self._db.execute("SELECT MIN(created) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        return {
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "oldest_queued_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+            "max_queued": self.max_queued,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "recovered": self.recovered,
+        }
@@ -0,0 +1,468 @@
+# lexicon.py
+# Precompiled single-pass matcher for the threat keyword lexicon, loaded from a file and hot-reloaded
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app_utils.logs import LOGGER_NAME
+
+log = logging.getLogger(LOGGER_NAME)
+
+
+# Arabic, Arabic Supplement, Arabic Extended-A and the presentation forms
+_ARABIC_RE = re.compile("[\u0600-\u06ff\u0750-\u077f\u08a0-\u08ff\ufb50-\ufdff\ufe70-\ufeff]")
+# Basic Latin and Latin-1/Extended letters (English, Franco-Arabic)
+_LATIN_RE = re.compile("[A-Za-z\u00c0-\u024f]")
+
+SCRIPTS = ("arabic", "latin")
+
+
+def detect_script(text: str) -> str:
+    """`arabic`, `latin`, `mixed` (both) or `none` (neither), from the letters in `text`."""
+    arabic = _ARABIC_RE.search(text) is not None
+    latin = _LATIN_RE.search(text) is not None
+    if arabic and latin:
+        return "mixed"
+    if arabic:
+        return "arabic"
+    return "latin" if latin else "none"
+
+
+# Arabic spelling variants folded to one form, in lexicon terms and texts alike
+_NORMALIZE_TABLE = {ord(ch): "\u0627" for ch in "\u0623\u0625\u0622\u0671"}  # أ إ آ ٱ -> ا
+_NORMALIZE_TABLE.update({
+    ord("\u0629"): "\u0647",  # ة -> ه
+    ord("\u0649"): "\u064a",  # ى -> ي
+    ord("\u0624"): "\u0648",  # ؤ -> و
+    ord("\u0626"): "\u064a",  # ئ -> ي
+    ord("\u06a9"): "\u0643",  # Persian keheh -> ك
+    ord("\u06cc"): "\u064a",  # Farsi yeh -> ي
+    ord("\u0640"): None,       # tatweel
+    0x0670: None,              # superscript alef
+})
+# Tashkeel: tanween, harakat, shadda, sukun and the marks after them
+_NORMALIZE_TABLE.update({code: None for code in range(0x064B, 0x0660)})
+# Elongation: an Arabic letter written four or more times in a row, folded
+# to three. Single, doubled ("مهدد" is not "مهد") and elongated letters
+# stay apart; term patterns (see _token_pattern) accept the elongated form
+_ELONGATION_RE = re.compile("([\u0621-\u064a])\\1{3,}")
+# In terms, any run of a repeated Arabic letter is a doubled letter
+_DOUBLED_RE = re.compile("([\u0621-\u064a])\\1{2,}")
+_RUN_RE = re.compile("([\u0621-\u064a])\\1+")
+_TOKEN_RE = re.compile("([\u0621-\u064a])\\1|.", re.DOTALL)
+
+
+# str.translate with a dict table is slow on non-Latin-1 text; a few
+# replace() calls, skipped for characters that are absent, are not
+_FOLDS = tuple((chr(code), to or "") for code, to in _NORMALIZE_TABLE.items())
+
+
+def _fold(text_lower: str) -> str:
+    for variant, folded in _FOLDS:
+        if variant in text_lower:
+            text_lower = text_lower.replace(variant, folded)
+    return _ELONGATION_RE.sub(r"\1\1\1", text_lower)
+
+
+def normalize_for_matching(text: str) -> str:
+    """
+    The form texts are matched in: lowercased, alef and hamza forms, ta
+    marbuta and alef maqsura folded, tashkeel and tatweel dropped, and
+    elongated letters ("هقتلكككك") cut to three.
+    """
+    return _fold(text.lower())
+
+
+def _term_key(word: str) -> str:
+    """A lexicon term in normalize_for_matching() form with every repeated Arabic letter doubled."""
+    return _DOUBLED_RE.sub(r"\1\1", normalize_for_matching(word))
+
+
+def _skeleton(term: str) -> str:
+    """`term` with every run of a repeated Arabic letter cut to one, as the trie sees it."""
+    return _RUN_RE.sub(r"\1", term)
+
+
+def _token_pattern(token: str) -> str:
+    """
+    Regex for one token of a term key: a doubled Arabic letter matches two
+    or (elongated) three, a single one matches one or three, anything else
+    matches itself.
+    """
+    if not "\u0621" <= token[0] <= "\u064a":
+        return re.escape(token)
+    if len(token) == 2:
+        return token + "+"
+    return token + "(?:" + token * 2 + ")?"
+
+
+def _term_pattern(term: str) -> str:
+    return "".join(_token_pattern(m.group()) for m in _TOKEN_RE.finditer(term))
+
+
+def _normalized_offsets(text_lower: str) -> List[int]:
+    """Index in `text_lower` of each character of _fold(text_lower), plus its length at the end."""
+    chars, offsets = [], []
+    for i, ch in enumerate(text_lower):
+        mapped = _NORMALIZE_TABLE.get(ord(ch), ch)
+        if mapped is not None:
+            chars.append(mapped)
+            offsets.append(i)
+    kept = []
+    start = 0
+    while start < len(chars):
+        end = start + 1
+        while end < len(chars) and chars[end] == chars[start]:
+            end += 1
+        if end - start >= 4 and "\u0621" <= chars[start] <= "\u064a":
+            kept.extend(offsets[start:start + 3])
+        else:
+            kept.extend(offsets[start:end])
+        start = end
+    kept.append(len(text_lower))
+    return kept
+
+
+def _is_word_char(ch: str) -> bool:
+    # Same definition as the Unicode \w class used by `re`
+    return ch.isalnum() or ch == "_"
+
+
+def _is_boundary(text: str, pos: int) -> bool:
+    """Equivalent of a regex \\b assertion at `pos`."""
+    before = pos > 0 and _is_word_char(text[pos - 1])
+    after = pos < len(text) and _is_word_char(text[pos])
+    return before != after
+
+
+def _trie_pattern(terms: List[str]) -> str:
+    """
+    Build a regex alternation shaped like a trie so the engine walks the
+    shared prefixes once instead of trying every term at every position.
+    The trie is built over _TOKEN_RE tokens, so a doubled Arabic letter is
+    one step matched by _token_pattern(). Optional suffixes are greedy and
+    a doubled letter is tried before the single one, so the longest term
+    is tried first.
+    """
+    trie: Dict = {}
+    for term in terms:
+        node = trie
+        for m in _TOKEN_RE.finditer(term):
+            node = node.setdefault(m.group(), {})
+        node[""] = {}
+
+    def node_pattern(node: Dict) -> str:
+        branches = [_token_pattern(token) + node_pattern(child)
+                    for token, child in sorted(node.items(), key=lambda item: (item[0][:1], -len(item[0])))
+                    if token]
+        if not branches:
+            return ""
+        if "" in node:
+            return "(?:" + "|".join(branches) + ")?"
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    return node_pattern(trie)
+
+
+class LexiconMatcher:
+    """
+    Matches every term of a leveled lexicon in one pass over the text.
+
+    `sections` is a list of `(levels, language, word_boundaries)` tuples where
+    `levels` maps a severity level to its list of terms. Terms in sections with
+    `word_boundaries=True` only match between \\b boundaries (like
+    `r'\\b' + re.escape(word) + r'\\b'`); the others match as plain substrings.
+    Terms and texts are both matched in their normalize_for_matching() form,
+    so one spelling of a term covers its variants; a doubled Arabic letter
+    in a term only matches a doubled or elongated one in the text.
+    Everything is compiled once, when the matcher is built.
+    """
+
+    def __init__(self, sections: List[Tuple[Dict[str, List[str]], str, bool]],
+                 weights: Dict[str, float]):
+        self._sections = sections
+        self._weights = weights
+        # Canonical entries in declaration order; detect() reports in this order
+        self.entries: List[Dict] = []
+        self._first_entry: Dict[Tuple[bool, str], int] = {}
+        for levels, language, bounded in sections:
+            for level, words in levels.items():
+                for word in words:
+                    term = _term_key(word)
+                    if not term:
+                        continue
+                    self._first_entry.setdefault((bounded, term), len(self.entries))
+                    self.entries.append({
+                        "word": word,
+                        "level": level,
+                        "weight": weights[level],
+                        "language": language,
+                    })
+
+        # Folding only touches Arabic characters, which a text routed to a
+        # partition without Arabic terms (see partition()) does not contain
+        self._fold = any(_ARABIC_RE.search(w) for _, w in self._first_entry)
+
+        bounded_terms = sorted({w for b, w in self._first_entry if b})
+        plain_terms = sorted({w for b, w in self._first_entry if not b})
+
+        # The trie match only gives the letters (its skeleton); every term
+        # with that skeleton, and the shorter ones a longest match would hide,
+        # is then checked on its own pattern
+        self._term_res = {key: re.compile(_term_pattern(key[1])) for key in self._first_entry}
+        self._candidates: Dict[Tuple[bool, str], List[str]] = {}
+        for bounded, terms in ((True, bounded_terms), (False, plain_terms)):
+            skeletons = {term: _skeleton(term) for term in terms}
+            for skeleton in set(skeletons.values()):
+                same = sorted((t for t in terms if skeletons[t] == skeleton), key=lambda t: -len(t))
+                shorter = [t for t in terms
+                           if len(skeletons[t]) < len(skeleton) and skeleton.startswith(skeletons[t])]
+                self._candidates[(bounded, skeleton)] = same + shorter
+
+        bounded_alt = _trie_pattern(bounded_terms)
+        plain_alt = _trie_pattern(plain_terms)
+        alternatives = []
+        if bounded_terms:
+            self._bounded_re = re.compile(r"\b(?:" + bounded_alt + r")\b")
+            alternatives.append(r"\b(?:" + bounded_alt + r")\b")
+        else:
+            self._bounded_re = None
+        if plain_terms:
+            self._plain_re = re.compile(plain_alt)
+            alternatives.append(plain_alt)
+        else:
+            self._plain_re = None
+        # Zero-width scan: reports every start position where some term
+        # matches without consuming it, so overlapping terms are not skipped
+        self._scan_re = re.compile("(?=" + "|".join(alternatives) + ")") if alternatives else None
+
+    def partition(self, script: str) -> "LexiconMatcher":
+        """
+        A matcher for only the terms a text written in `script` can contain:
+        terms in that script plus those with letters of neither. For a text
+        whose detect_script() is `script` it finds exactly what the full
+        matcher finds, in the same order, with a fraction of the terms.
+        """
+        sections = [
+            ({level: [w for w in words if detect_script(w) in (script, "none")]
+              for level, words in levels.items()}, language, bounded)
+            for levels, language, bounded in self._sections
+        ]
+        return LexiconMatcher(sections, self._weights)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def find_matches(self, text: str) -> List[Dict]:
+        """
+        Return every occurrence of a lexicon term in `text` with its offsets,
+        ordered by position. Matching is done on the normalized text; offsets
+        refer to the lowercased text and `word` is the term as declared.
+        """
+        if self._scan_re is None:
+            return []
+        text_lower = text.lower()
+        normalized = _fold(text_lower) if self._fold else text_lower
+        # Folding only ever drops characters, so equal lengths mean equal offsets
+        offsets = _normalized_offsets(text_lower) if len(normalized) != len(text_lower) else None
+        matches = []
+        for candidate in self._scan_re.finditer(normalized):
+            pos = candidate.start()
+            for bounded, regex in ((True, self._bounded_re), (False, self._plain_re)):
+                if regex is None:
+                    continue
+                m = regex.match(normalized, pos)
+                if not m:
+                    continue
+                for word in self._candidates[(bounded, _skeleton(m.group()))]:
+                    term = self._term_res[(bounded, word)].match(normalized, pos)
+                    if term is None or (bounded and not _is_boundary(normalized, term.end())):
+                        continue
+                    index = self._first_entry[(bounded, word)]
+                    entry = self.entries[index]
+                    end = term.end()
+                    matches.append({
+                        "word": entry["word"],
+                        "level": entry["level"],
+                        "language": entry["language"],
+                        "start": offsets[pos] if offsets else pos,
+                        # Up to the next kept character, so dropped marks after the term are inside
+                        "end": offsets[end] if offsets else end,
+                        "entry": index,
+                    })
+        return matches
+
+    def detect(self, text: str) -> List[Dict]:
+        """
+        Return the distinct lexicon entries found in `text`, one per word, in
+        lexicon declaration order (first declared level wins for duplicates).
+        """
+        indices = sorted({m["entry"] for m in self.find_matches(text)})
+        seen = set()
+        detected = []
+        for index in indices:
+            entry = self.entries[index]
+            if entry["word"] not in seen:
+                seen.add(entry["word"])
+                detected.append(dict(entry))
+        return detected
+
+
+class LexiconSnapshot:
+    """
+    One compiled version of the lexicon: the full matcher plus a partition
+    per script. It is never modified after it is built, so a request can
+    keep using the snapshot it started with while a newer one is published.
+    """
+
+    def __init__(self, sections: List[Tuple[Dict[str, List[str]], str, bool]], weights: Dict[str, float],
+                 version: str, sha256: str = "", source: str = ""):
+        self.version = version
+        self.sha256 = sha256
+        self.source = source
+        self.loaded_at = time.time()
+        self.matcher = LexiconMatcher(sections, weights)
+        self.partitions = {script: self.matcher.partition(script) for script in SCRIPTS}
+
+    @classmethod
+    def from_document(cls, document: Dict, weights: Dict[str, float], sha256: str = "",
+                      source: str = "") -> "LexiconSnapshot":
+        """
+        Build a snapshot from a lexicon document:
+        `{"version": ..., "sections": [{"name", "language", "word_boundaries",
+        "levels": {level: [terms]}}]}`. Raises ValueError if it is malformed.
+        """
+        if not isinstance(document, dict) or not isinstance(document.get("sections"), list):
+            raise ValueError("Lexicon must be an object with a list of sections")
+        sections = []
+        for i, section in enumerate(document["sections"]):
+            levels = section.get("levels") if isinstance(section, dict) else None
+            if not isinstance(levels, dict):
+                raise ValueError(f"Lexicon section {i} has no levels")
+            for level, words in levels.items():
+                if level not in weights:
+                    raise ValueError(f"Lexicon section {i}: unknown level {level!r}")
+                if not isinstance(words, list) or not all(isinstance(w, str) for w in words):
+                    raise ValueError(f"Lexicon section {i}: {level} must be a list of strings")
+            sections.append((levels, section.get("language", "mixed"), bool(section.get("word_boundaries", True))))
+        if not any(words for levels, _, _ in sections for words in levels.values()):
+            raise ValueError("Lexicon has no terms")
+
+        # The declared version names the release; the hash tells apart edits that forgot to bump it
+        declared = str(document.get("version") or "").strip()
+        version = f"{declared}+{sha256[:8]}" if declared and sha256 else declared or sha256[:12] or "unversioned"
+        return cls(sections, weights, version, sha256, source)
+
+    def for_script(self, script: str) -> Tuple[str, LexiconMatcher]:
+        """(partition name, matcher) for a text whose detect_script() is `script`."""
+        if script in self.partitions:
+            return script, self.partitions[script]
+        return "full", self.matcher
+
+    def detect(self, text: str, script: str = None) -> List[Dict]:
+        return self.for_script(script or detect_script(text))[1].detect(text)
+
+    def info(self) -> Dict:
+        return {
+            "version": self.version,
+            "sha256": self.sha256,
+            "source": self.source,
+            "loaded_at": self.loaded_at,
+            "terms": len(self.matcher),
+            "partitions": {name: len(matcher) for name, matcher in self.partitions.items()},
+        }
+
+
+def load_lexicon(path: str, weights: Dict[str, float]) -> LexiconSnapshot:
+    """Read, validate and compile a lexicon JSON file. Raises OSError or ValueError."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return LexiconSnapshot.from_document(json.loads(data), weights, hashlib.sha256(data).hexdigest(), path)
+
+
+class LexiconStore:
+    """
+    The current LexiconSnapshot of a lexicon file. `reload()` compiles a
+    new snapshot when the file has changed and publishes it with a single
+    reference assignment: readers never lock, and requests in flight finish
+    on the snapshot they started with. A file that fails to load keeps the
+    current snapshot in place. `refresh`, if given, runs before each check
+    (e.g. reloading the Modal Volume the file lives on).
+    """
+
+    def __init__(self, path: str, weights: Dict[str, float], refresh: Callable[[], None] = None):
+        self.path = path
+        self.weights = weights
+        self.refresh = refresh
+        self._lock = threading.Lock()
+
+        # Stats
+        self.reloads = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.last_check: Optional[float] = None
+
+        # Without a lexicon there is nothing to serve, so the first load raises
+        self._stamp: Optional[Tuple[int, int]] = self._stat()
+        self._current = load_lexicon(path, weights)
+
+    @property
+    def current(self) -> LexiconSnapshot:
+        return self._current
+
+    def _stat(self) -> Tuple[int, int]:
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def watch(self, path: str, refresh: Callable[[], None] = None) -> bool:
+        """Switch to another file, keeping the current snapshot until it loads."""
+        with self._lock:
+            self.path, self.refresh, self._stamp = path, refresh, None
+        return self.reload()
+
+    def reload(self, force: bool = False) -> bool:
+        """Load the file again if it changed (or `force`); True when a new snapshot was published."""
+        with self._lock:
+            self.last_check = time.time()
+            if self.refresh is not None:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    log.debug("Lexicon refresh failed: %s", e)
+            try:
+                stamp = self._stat()
+                if stamp == self._stamp and not force:
+                    return False
+                snapshot = load_lexicon(self.path, self.weights)
+            except (OSError, ValueError) as e:
+                self.failures += 1
+                if str(e) != self.last_error:
+                    log.error("Lexicon %s not loaded, keeping %s: %s", self.path, self._current.version, e)
+                self.last_error = str(e)
+                return False
+            self._stamp = stamp
+            self.last_error = None
+            if snapshot.sha256 == self._current.sha256:
+                return False
+            previous, self._current = self._current.version, snapshot
+            self.reloads += 1
+        log.info("Lexicon %s -> %s (%d terms)", previous, snapshot.version, len(snapshot.matcher))
+        return True
+
+    def stats(self) -> Dict:
+        return {
+            **self._current.info(),
+            "path": self.path,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_check": self.last_check,
+        }
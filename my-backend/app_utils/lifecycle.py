@@ -0,0 +1,77 @@
+# lifecycle.py
+# Model load/warmup tracking behind the /health and /ready probes
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+from app_utils.logs import LOGGER_NAME
+
+log = logging.getLogger(LOGGER_NAME)
+
+
+class ModelLifecycle:
+    """
+    Records how long each model load and warmup step took and whether the
+    service is ready to take traffic.
+
+    Without preloading the service is ready immediately (models load on the
+    first request). With `start_preload` it only becomes ready once every
+    step has finished without error.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.preload_enabled = False
+        self._ready = threading.Event()
+        self._ready.set()
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def timed(self, name: str, fn: Callable, *args, **kwargs):
+        """Run `fn`, recording its duration (or its error) under `name`."""
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            with self._lock:
+                self.errors[name] = repr(e)
+            raise
+        with self._lock:
+            self.timings[name] = round(time.perf_counter() - started, 3)
+            self.errors.pop(name, None)
+        return result
+
+    def start_preload(self, steps: List[Tuple[str, Callable]]):
+        """Run the steps in order on a background thread, then mark ready."""
+        self.preload_enabled = True
+        self._ready.clear()
+
+        def run():
+            for name, step in steps:
+                try:
+                    self.timed(name, step)
+                except Exception:
+                    log.exception("Preload step %s failed", name)
+                    return
+            self._ready.set()
+            log.info("Preload finished: %s", self.timings)
+
+        threading.Thread(target=run, name="model-preload", daemon=True).start()
+
+    def health(self) -> Dict:
+        with self._lock:
+            return {
+                "status": "ok" if not self.errors else "degraded",
+                "ready": self.ready,
+                "preload_enabled": self.preload_enabled,
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+                "timings_seconds": dict(self.timings),
+                "errors": dict(self.errors),
+            }
@@ -0,0 +1,87 @@
+# logs.py
+# Non-blocking, sampled logging for the request path
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+LOGGER_NAME = "eveguard"
+
+_queue_handler = None
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps every WARNING and above, and a `rate` share of the rest."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the writer thread; drops them when the queue is full instead of blocking."""
+
+    def __init__(self, record_queue: queue.Queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging() -> logging.Logger:
+    """
+    The service logger. Records are queued and written to stdout by a
+    background thread, so a slow log sink never stalls a request.
+    LOG_LEVEL sets the level (default INFO), LOG_SAMPLE_RATE the share of
+    records below WARNING that are kept (default 1) and LOG_QUEUE_SIZE how
+    many records may wait before new ones are dropped (default 10000).
+    """
+    global _queue_handler
+    logger = logging.getLogger(LOGGER_NAME)
+    if _queue_handler is not None:
+        return logger
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=int(os.environ.get("LOG_QUEUE_SIZE", "10000"))))
+    _queue_handler.addFilter(SamplingFilter(float(os.environ.get("LOG_SAMPLE_RATE", "1"))))
+    listener = logging.handlers.QueueListener(_queue_handler.queue, stream)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger.addHandler(_queue_handler)
+    logger.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
+    return logger
+
+
+def _reset_after_fork():
+    """
+    A forked child has the parent's handler but not its writer thread, so
+    records would pile up in a queue nobody drains; drop the handler and let
+    the child's own setup_logging() start a fresh one.
+    """
+    global _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger(LOGGER_NAME).removeHandler(_queue_handler)
+        _queue_handler = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def dropped_log_records() -> int:
+    """Records dropped because the log queue was full."""
+    return _queue_handler.dropped if _queue_handler is not None else 0
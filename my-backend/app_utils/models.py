@@ -0,0 +1,197 @@
+# models.py
+# Memory-budgeted model manager: lazy loading, LRU/idle eviction, refcounted use
+
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from app_utils.logs import LOGGER_NAME
+
+log = logging.getLogger(LOGGER_NAME)
+
+# Backends loaded by serve.py before it forks its workers, as name ->
+# (backend, size_mb). Workers find them here and share their pages.
+SHARED: Dict[str, tuple] = {}
+
+_PAGE_MB = os.sysconf("SC_PAGE_SIZE") / 2 ** 20 if hasattr(os, "sysconf") else 0.0
+
+
+def memory_mb() -> float:
+    """Resident memory of this process plus CUDA memory held by PyTorch, in MiB."""
+    used = 0.0
+    try:
+        with open("/proc/self/statm") as f:
+            used = int(f.read().split()[1]) * _PAGE_MB
+    except (OSError, ValueError, IndexError):
+        pass
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        used += torch.cuda.memory_allocated() / 2 ** 20
+    return used
+
+
+def _release_memory():
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+class _Entry:
+    def __init__(self, name: str, loader: Callable, size_mb: Optional[float]):
+        self.name = name
+        self.loader = loader
+        self.declared_mb = size_mb
+        self.size_mb = size_mb or 0.0
+        self.backend = None
+        self.shared = False
+        self.refs = 0
+        self.last_used = 0.0
+        self.loads = 0
+        self.evictions = 0
+        self.load_lock = threading.Lock()
+
+
+class ModelManager:
+    """
+    Loads registered models on first use and unloads them again to stay
+    within `budget_mb` (least recently used first) and after `idle_seconds`
+    without use (0 disables either limit).
+
+    Models are used through `with manager.use(name) as backend:`; a model
+    in use is never evicted, so a long transcription cannot lose its model
+    halfway. A model's size is what the process grew by while loading it,
+    unless given at registration. Models found in SHARED were loaded before
+    the worker was forked and are never evicted: unloading them in one
+    worker would return no memory.
+    """
+
+    def __init__(self, budget_mb: float = 0, idle_seconds: float = 0):
+        self.budget_mb = budget_mb
+        self.idle_seconds = idle_seconds
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+
+        if idle_seconds > 0:
+            self._stop = threading.Event()
+            threading.Thread(target=self._reap, name="model-reaper", daemon=True).start()
+
+    def register(self, name: str, loader: Callable, size_mb: Optional[float] = None):
+        entry = self._entries[name] = _Entry(name, loader, size_mb)
+        if name in SHARED:
+            entry.backend, shared_mb = SHARED[name]
+            entry.size_mb = size_mb or shared_mb
+            entry.shared = True
+            entry.last_used = time.monotonic()
+
+    @contextmanager
+    def use(self, name: str):
+        """The loaded backend `name`, held so it is not evicted while the block runs."""
+        entry = self._entries[name]
+        with self._lock:
+            entry.refs += 1
+        try:
+            yield self._ensure_loaded(entry)
+        finally:
+            with self._lock:
+                entry.refs -= 1
+                entry.last_used = time.monotonic()
+            # Models held while another loaded may have left us over budget
+            self._make_room(0)
+
+    def load(self, name: str):
+        """Load `name` now (preload); it stays evictable."""
+        with self.use(name) as backend:
+            return backend
+
+    def loaded(self, name: str):
+        """The backend if it is resident, else None; never loads."""
+        return self._entries[name].backend
+
+    def _ensure_loaded(self, entry: _Entry):
+        backend = entry.backend
+        if backend is not None:
+            return backend
+        with entry.load_lock:
+            if entry.backend is None:
+                self._make_room(entry.size_mb)
+                before = memory_mb()
+                backend = entry.loader()
+                grown = max(memory_mb() - before, 0.0)
+                with self._lock:
+                    entry.backend = backend
+                    entry.size_mb = entry.declared_mb or round(grown, 1)
+                    entry.loads += 1
+                # The real size is only known now
+                self._make_room(0)
+            return entry.backend
+
+    def _resident_mb(self) -> float:
+        return sum(e.size_mb for e in self._entries.values() if e.backend is not None)
+
+    def _make_room(self, needed_mb: float):
+        if self.budget_mb <= 0:
+            return
+        evicted = []
+        with self._lock:
+            while self._resident_mb() + needed_mb > self.budget_mb:
+                idle = [e for e in self._entries.values() if e.backend is not None and e.refs == 0 and not e.shared]
+                if not idle:
+                    log.warning("Models need %.0f MiB, over the %.0f MiB budget, and none can be unloaded",
+                                self._resident_mb() + needed_mb, self.budget_mb)
+                    break
+                evicted.append(self._evict(min(idle, key=lambda e: e.last_used)))
+        if evicted:
+            log.info("Unloaded %s to stay within %.0f MiB", ", ".join(evicted), self.budget_mb)
+            _release_memory()
+
+    def _evict(self, entry: _Entry) -> str:
+        entry.backend = None
+        entry.evictions += 1
+        return entry.name
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Unload models unused for `idle_seconds`; returns how many."""
+        now = time.monotonic() if now is None else now
+        evicted = []
+        with self._lock:
+            for entry in self._entries.values():
+                if (entry.backend is not None and entry.refs == 0 and not entry.shared
+                        and now - entry.last_used >= self.idle_seconds):
+                    evicted.append(self._evict(entry))
+        if evicted:
+            log.info("Unloaded idle models: %s", ", ".join(evicted))
+            _release_memory()
+        return len(evicted)
+
+    def _reap(self):
+        while not self._stop.wait(max(min(self.idle_seconds / 2, 60.0), 1.0)):
+            self.evict_idle()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            models = {
+                name: {
+                    "loaded": e.backend is not None,
+                    "shared": e.shared,
+                    "size_mb": e.size_mb,
+                    "in_use": e.refs,
+                    "idle_seconds": round(time.monotonic() - e.last_used, 1) if e.backend is not None else None,
+                    "loads": e.loads,
+                    "evictions": e.evictions,
+                }
+                for name, e in self._entries.items()
+            }
+            resident = self._resident_mb()
+        return {
+            "budget_mb": self.budget_mb,
+            "resident_mb": round(resident, 1),
+            "idle_seconds": self.idle_seconds,
+            "process_mb": round(memory_mb(), 1),
+            "models": models,
+        }
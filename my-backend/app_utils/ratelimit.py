@@ -0,0 +1,97 @@
+# ratelimit.py
+# Per-parent token-bucket rate limits and concurrency quotas, in memory
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict
+
+from app_utils.executor import OverloadedError
+
+
+class RateLimitedError(OverloadedError):
+    """One client is over its own limits (429), as opposed to the whole service being full (503)."""
+
+
+class RateLimiter:
+    """
+    A token bucket per key (parent ID): `rate_per_minute` requests a
+    minute with bursts of up to `burst`, plus at most `max_concurrent`
+    requests in flight per key. Either limit is off at 0. `acquire` raises
+    RateLimitedError with the seconds until a token is available; every
+    successful `acquire` must be paired with a `release`.
+
+    Once more than `max_keys` are tracked, the least recently used keys
+    without requests in flight are dropped (their bucket starts full again).
+    """
+
+    def __init__(self, rate_per_minute: float = 60, burst: int = 20, max_concurrent: int = 4,
+                 max_keys: int = 100000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_concurrent = max_concurrent
+        self.max_keys = max_keys
+
+        # key -> [tokens, updated, in_flight]
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Stats
+        self.allowed = 0
+        self.rate_limited = 0
+        self.concurrency_limited = 0
+
+    def acquire(self, key: str, now: float = None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now, 0]
+                self._evict()
+            self._buckets.move_to_end(key)
+            if self.rate > 0:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+            if self.max_concurrent and bucket[2] >= self.max_concurrent:
+                self.concurrency_limited += 1
+                raise RateLimitedError(f"At most {self.max_concurrent} requests at a time per parent", 1)
+            if self.rate > 0:
+                if bucket[0] < 1:
+                    self.rate_limited += 1
+                    raise RateLimitedError("Rate limit exceeded, retry later",
+                                           max(1, math.ceil((1 - bucket[0]) / self.rate)))
+                bucket[0] -= 1
+            bucket[2] += 1
+            self.allowed += 1
+
+    def release(self, key: str):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None and bucket[2] > 0:
+                bucket[2] -= 1
+
+    def _evict(self):
+        # Oldest first; a key with requests in flight is skipped over, not dropped
+        excess = len(self._buckets) - self.max_keys
+        for key in list(self._buckets):
+            if excess <= 0:
+                break
+            if self._buckets[key][2] == 0:
+                del self._buckets[key]
+                excess -= 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            in_flight = sum(bucket[2] for bucket in self._buckets.values())
+            return {
+                "rate_per_minute": round(self.rate * 60, 3),
+                "burst": self.burst,
+                "max_concurrent": self.max_concurrent,
+                "tracked_keys": len(self._buckets),
+                "in_flight": in_flight,
+                "allowed": self.allowed,
+                "rate_limited": self.rate_limited,
+                "concurrency_limited": self.concurrency_limited,
+            }
@@ -0,0 +1,129 @@
+# sessions.py
+# Per-conversation threat escalation across requests
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+LEVELS = ("critical", "warning", "suspicious")
+
+# Share of one escalation step a decayed count may fall short by and still
+# escalate: with the default half-life, five words within about a minute
+ESCALATION_TOLERANCE = 0.05
+
+
+class SessionTracker:
+    """
+    Escalation state per session, updated in O(1) per message. Sessions
+    are keyed by parent and session ID, so one parent cannot reach another's
+    session by guessing its ID. Each session keeps exponentially decayed
+    counts of detected words per severity level plus decayed message,
+    flagged-message and word counts, so old messages fade with
+    `half_life_seconds`.
+
+    The session score is `score(critical, warning, suspicious,
+    density_ratio)` - the same weighting as a single message - where the
+    density is the share of recent words that were flagged and every
+    whole `escalation_ratio` suspicious (or warning) words in the session
+    also count as one word of the next level up. Repeated low-level
+    messages therefore escalate, which they never do when each is scored
+    alone; a session of one message never scores above that message.
+
+    Sessions idle for `idle_seconds` are evicted, and at most
+    `max_sessions` are kept (least recently updated go first).
+    """
+
+    def __init__(self, score: Callable[[float, float, float, float], float],
+                 half_life_seconds: float = 900.0, idle_seconds: float = 3600.0,
+                 max_sessions: int = 100000, escalation_ratio: float = 5.0):
+        self.score = score
+        self.half_life_seconds = half_life_seconds
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self.escalation_ratio = escalation_ratio
+
+        # (parent, session) -> [updated, messages, flagged, words, critical, warning, suspicious]
+        self._sessions: "OrderedDict[tuple, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Stats
+        self.updates = 0
+        self.evicted = 0
+
+    def _escalated(self, critical: float, warning: float, suspicious: float):
+        # Only whole steps escalate; the tolerance lets a count that decayed
+        # slightly below a multiple of the ratio still make its step
+        warning += math.floor(suspicious / self.escalation_ratio + ESCALATION_TOLERANCE)
+        critical += math.floor(warning / self.escalation_ratio + ESCALATION_TOLERANCE)
+        return critical, warning, suspicious
+
+    def update(self, session_id: str, detected_words: List[Dict], now: Optional[float] = None,
+               parent_id: Optional[str] = None, word_count: Optional[int] = None,
+               message_score: Optional[float] = None) -> Dict:
+        """
+        Fold one analyzed message of `parent_id`'s session into it and return
+        the session's state. `word_count` is the message's length in words
+        (default: its detected words) and `message_score` its own danger
+        score, the ceiling for a session of one message.
+        """
+        now = time.time() if now is None else now
+        added = {level: 0 for level in LEVELS}
+        for word in detected_words:
+            if word["level"] in added:
+                added[word["level"]] += 1
+        words = max(word_count if word_count is not None else len(detected_words), 1)
+
+        key = (parent_id or None, session_id)
+        with self._lock:
+            state = self._sessions.get(key)
+            if state is None:
+                state = self._sessions[key] = [now, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+            decay = 0.5 ** (max(now - state[0], 0.0) / self.half_life_seconds)
+            state[0] = now
+            state[1] = state[1] * decay + 1
+            state[2] = state[2] * decay + (1 if detected_words else 0)
+            state[3] = state[3] * decay + words
+            for i, level in enumerate(LEVELS, start=4):
+                state[i] = state[i] * decay + added[level]
+            self._sessions.move_to_end(key)
+            self.updates += 1
+            self._evict(now)
+            _, messages, flagged, total_words, critical, warning, suspicious = state
+
+        flagged_words = critical + warning + suspicious
+        danger_score = self.score(*self._escalated(critical, warning, suspicious),
+                                  min(flagged_words / total_words, 1.0))
+        if messages == 1 and message_score is not None:
+            danger_score = min(danger_score, message_score)
+        return {
+            "session_id": session_id,
+            "danger_score": danger_score,
+            "messages": round(messages, 3),
+            "flagged_messages": round(flagged, 3),
+            "counts": {"critical": round(critical, 3), "warning": round(warning, 3),
+                       "suspicious": round(suspicious, 3)},
+        }
+
+    def _evict(self, now: float):
+        # Oldest first, so this stops at the first session still in use
+        while self._sessions:
+            state = next(iter(self._sessions.values()))
+            if now - state[0] < self.idle_seconds and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "updates": self.updates,
+            "evicted": self.evicted,
+            "half_life_seconds": self.half_life_seconds,
+            "idle_seconds": self.idle_seconds,
+        }
@@ -1,5 +1,9 @@
-import tempfile
+import hashlib
+import io
 import os
+import re
+import shutil
+import tempfile
 
 def save_audio_file(audio_bytes: bytes, suffix: str = ".wav") -> str:
     """Save audio bytes to a temp file and return path."""
@@ -11,3 +15,107 @@ def cleanup_temp_file(path: str):
     """Delete temp file."""
     if os.path.exists(path):
         os.remove(path)
+
+
+AUDIO_MEDIA_TYPES = {
+    ".wav": "audio/wav",
+    ".mp3": "audio/mpeg",
+    ".ogg": "audio/ogg",
+    ".m4a": "audio/mp4",
+    ".flac": "audio/flac",
+    ".webm": "audio/webm",
+    ".amr": "audio/amr",
+}
+
+_AUDIO_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def content_id(audio_bytes: bytes) -> str:
+    """SHA-256 hex digest used as the ID of stored audio."""
+    return hashlib.sha256(audio_bytes).hexdigest()
+
+
+class AudioStore:
+    """
+    Content-addressed audio store on local disk. Each recording is saved
+    once under the SHA-256 of its bytes, so re-uploads cost nothing and the
+    ID doubles as a strong ETag.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def put(self, audio_bytes: bytes, suffix: str = ".wav", audio_id: str = None) -> str:
+        """Store the bytes (if not already present) and return their ID."""
+        return self.put_stream(io.BytesIO(audio_bytes), suffix, audio_id or content_id(audio_bytes))
+
+    def put_stream(self, stream, suffix: str, audio_id: str) -> str:
+        """Store a binary file object, copied in chunks, under `audio_id` (its SHA-256)."""
+        suffix = suffix.lower() if suffix.lower() in AUDIO_MEDIA_TYPES else ".bin"
+        if self.find(audio_id):
+            return audio_id
+
+        directory = os.path.join(self.root, audio_id[:2])
+        os.makedirs(directory, exist_ok=True)
+        # Write under a temp name and rename so readers never see partial files
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False, suffix=".part") as f:
+            shutil.copyfileobj(stream, f, 1024 * 1024)
+            temp_path = f.name
+        os.replace(temp_path, os.path.join(directory, audio_id + suffix))
+        return audio_id
+
+    def find(self, audio_id: str):
+        """Path of a stored recording, or None."""
+        if not _AUDIO_ID_RE.match(audio_id or ""):
+            return None
+        directory = os.path.join(self.root, audio_id[:2])
+        if not os.path.isdir(directory):
+            return None
+        for name in os.listdir(directory):
+            if name.startswith(audio_id) and not name.endswith(".part"):
+                return os.path.join(directory, name)
+        return None
+
+
+def media_type_for(path: str) -> str:
+    return AUDIO_MEDIA_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+
+
+def parse_range(header: str, size: int):
+    """
+    Parse a single `bytes=start-end` Range header against a file of `size`
+    bytes. Returns an inclusive (start, end) tuple, or None when the header
+    should be ignored (missing, multi-range, other units). Raises ValueError
+    when the range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text == "":
+            # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0:
+                raise ValueError("Empty suffix range")
+            return max(0, size - length), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        raise ValueError(f"Invalid range: {header}")
+    if start >= size or start > end:
+        raise ValueError(f"Range not satisfiable: {header}")
+    return start, min(end, size - 1)
+
+
+def iter_file_range(path: str, start: int, end: int, chunk_size: int = 64 * 1024):
+    """Yield bytes start..end (inclusive) of a file in chunks."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,109 @@
+# streaming.py
+# Sliding-window buffering and transcript stitching for live audio
+
+import re
+from typing import List, Optional, Tuple
+
+
+class AudioWindower:
+    """
+    Buffers raw PCM frames (mono, little-endian) as they arrive and cuts
+    overlapping windows for incremental transcription.
+
+    A window of up to `window_seconds` is emitted every time `step_seconds`
+    of new audio has been received, so consecutive windows overlap by
+    `window_seconds - step_seconds`. Only the last window's worth of audio
+    is kept in memory.
+    """
+
+    def __init__(self, sample_rate: int = 16000, window_seconds: float = 8.0,
+                 step_seconds: float = 3.0, sample_width: int = 2):
+        if step_seconds <= 0 or window_seconds < step_seconds:
+            raise ValueError("Need 0 < step_seconds <= window_seconds")
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.window_bytes = int(window_seconds * sample_rate) * sample_width
+        self.step_bytes = int(step_seconds * sample_rate) * sample_width
+        self._buffer = bytearray()
+        self._buffer_start = 0      # byte offset of _buffer[0] in the stream
+        self._received = 0          # total bytes received
+        self._last_emit = 0         # stream byte offset of the last window end
+
+    @property
+    def seconds_received(self) -> float:
+        return self._received / self.sample_width / self.sample_rate
+
+    def feed(self, data: bytes) -> List[Tuple[float, float, bytes]]:
+        """
+        Add a frame; return the windows that became ready as
+        (start_seconds, end_seconds, pcm_bytes) tuples.
+        """
+        self._buffer.extend(data)
+        self._received += len(data)
+        windows = []
+        while self._received - self._last_emit >= self.step_bytes:
+            windows.append(self._window_ending_at(self._last_emit + self.step_bytes))
+        return windows
+
+    def flush(self) -> Optional[Tuple[float, float, bytes]]:
+        """Window for any audio received since the last emitted window."""
+        # Drop a trailing partial sample so the PCM stays aligned
+        end = self._received - (self._received % self.sample_width)
+        if end <= self._last_emit:
+            return None
+        return self._window_ending_at(end)
+
+    def _window_ending_at(self, end: int) -> Tuple[float, float, bytes]:
+        start = max(self._buffer_start, end - self.window_bytes)
+        pcm = bytes(self._buffer[start - self._buffer_start:end - self._buffer_start])
+        self._last_emit = end
+
+        # Keep just enough audio for the next window's overlap
+        keep_from = max(self._buffer_start, end + self.step_bytes - self.window_bytes)
+        if keep_from > self._buffer_start:
+            del self._buffer[:keep_from - self._buffer_start]
+            self._buffer_start = keep_from
+
+        bytes_per_second = self.sample_rate * self.sample_width
+        return start / bytes_per_second, end / bytes_per_second, pcm
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _norm(word: str) -> str:
+    return "".join(_WORD_RE.findall(word.lower()))
+
+
+class TranscriptStitcher:
+    """
+    Merges transcripts of overlapping windows into one running transcript by
+    dropping the leading words of each new window that repeat the end of
+    what has already been committed.
+    """
+
+    def __init__(self, max_overlap_words: int = 40):
+        self.max_overlap_words = max_overlap_words
+        self.words: List[str] = []
+
+    @property
+    def text(self) -> str:
+        return " ".join(self.words)
+
+    def add(self, window_text: str) -> str:
+        """Merge a window transcript; return only the newly appended text."""
+        new_words = window_text.split()
+        if not new_words:
+            return ""
+        tail = [_norm(w) for w in self.words[-self.max_overlap_words:]]
+        head = [_norm(w) for w in new_words[:self.max_overlap_words]]
+
+        # Longest run of words that ends the transcript and starts the window
+        overlap = 0
+        for k in range(min(len(tail), len(head)), 0, -1):
+            if tail[-k:] == head[:k]:
+                overlap = k
+                break
+        appended = new_words[overlap:]
+        self.words.extend(appended)
+        return " ".join(appended)
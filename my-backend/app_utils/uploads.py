@@ -0,0 +1,369 @@
+# uploads.py
+# Streamed upload spooling: size limits, hashing and format sniffing as bytes arrive
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+import tempfile
+from typing import BinaryIO, Callable, Optional
+
+from starlette.requests import ClientDisconnect
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.multipart import parse_options_header
+
+CHUNK_SIZE = 1024 * 1024
+
+# Bytes needed to recognise every format below
+SNIFF_BYTES = 12
+
+
+class UploadError(Exception):
+    """A rejected upload; `status_code` is the HTTP status to answer with."""
+
+    status_code = 400
+
+
+class UploadTooLargeError(UploadError):
+    status_code = 413
+
+
+class UnsupportedFormatError(UploadError):
+    status_code = 415
+
+
+def sniff_audio_format(head: bytes) -> Optional[str]:
+    """File suffix of the audio container starting with `head`, or None if it is not audio."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return ".wav"
+    if head[:4] == b"fLaC":
+        return ".flac"
+    if head[:4] == b"OggS":
+        return ".ogg"
+    if head[4:8] == b"ftyp":
+        return ".m4a"
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return ".webm"
+    if head[:5] == b"#!AMR":
+        return ".amr"
+    # ID3 tag, or a bare MPEG audio frame (sync bits plus a layer other than 0)
+    if head[:3] == b"ID3" or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0 and head[1] & 0x06):
+        return ".mp3"
+    return None
+
+
+def sniff_video_format(head: bytes) -> Optional[str]:
+    """File suffix of the video container starting with `head`, or None."""
+    if head[4:8] == b"ftyp":
+        return ".mp4"
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return ".mkv"
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return ".avi"
+    if head[:3] == b"FLV":
+        return ".flv"
+    return None
+
+
+class SpooledUpload:
+    """
+    An upload received in chunks. Each chunk is hashed as it is written, the
+    container format is sniffed from the first bytes by `sniff` (anything
+    it does not recognise is rejected before the rest is read) and the body
+    is kept in memory up to `spool_bytes`, then moved to a temp file in
+    `spool_dir`.
+    Uploads over `max_bytes` (0 for no limit) are rejected as soon as they
+    cross it, so memory per upload stays bounded whatever the file size.
+    """
+
+    def __init__(self, max_bytes: int = 0, spool_bytes: int = 4 * 1024 * 1024, spool_dir: str = None,
+                 sniff: Callable[[bytes], Optional[str]] = sniff_audio_format):
+        self.max_bytes = max_bytes
+        self.spool_bytes = spool_bytes
+        self.spool_dir = spool_dir
+        self.sniff = sniff
+        self.size = 0
+        self.suffix: Optional[str] = None
+        self.audio_id: Optional[str] = None
+        self.path: Optional[str] = None
+        self.filename = ""
+        self.content_type = ""
+
+        self._hash = hashlib.sha256()
+        self._head = b""
+        self._buffer = io.BytesIO()
+        self._file = None
+        self._owned = True
+
+    @classmethod
+    def from_file(cls, path: str, audio_id: str = None) -> "SpooledUpload":
+        """Wrap a file already on disk (e.g. in the audio store); close() leaves it in place."""
+        upload = cls()
+        upload.path = path
+        upload.size = os.path.getsize(path)
+        upload._owned = False
+        with open(path, "rb") as f:
+            upload.suffix = sniff_audio_format(f.read(SNIFF_BYTES)) or os.path.splitext(path)[1].lower()
+            if audio_id is None:
+                f.seek(0)
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    upload._hash.update(chunk)
+        upload.audio_id = audio_id or upload._hash.hexdigest()
+        return upload
+
+    def write(self, chunk: bytes):
+        if self.max_bytes and self.size + len(chunk) > self.max_bytes:
+            raise UploadTooLargeError(f"Upload exceeds the {self.max_bytes} byte limit")
+        if self.suffix is None:
+            self._head += chunk[:SNIFF_BYTES - len(self._head)]
+            if len(self._head) >= SNIFF_BYTES:
+                self._sniff()
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+        if self._file is None and self.size > self.spool_bytes:
+            self._file = tempfile.NamedTemporaryFile(dir=self.spool_dir, suffix=".upload", delete=False)
+            self.path = self._file.name
+            self._file.write(self._buffer.getbuffer())
+            self._buffer = io.BytesIO()
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._buffer.write(chunk)
+
+    def _sniff(self):
+        self.suffix = self.sniff(self._head)
+        if self.suffix is None:
+            kind = "video" if self.sniff is sniff_video_format else "audio"
+            raise UnsupportedFormatError(f"File must be {kind} (unrecognised format)")
+
+    def finish(self) -> "SpooledUpload":
+        """Call once the last chunk is written."""
+        if self.size == 0:
+            raise UploadError("Empty upload")
+        if self.suffix is None:
+            self._sniff()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.audio_id = self._hash.hexdigest()
+        return self
+
+    @property
+    def in_memory(self) -> bool:
+        return self.path is None
+
+    def getvalue(self) -> bytes:
+        """The whole body; only cheap while it is still in memory."""
+        if self.path is None:
+            return self._buffer.getvalue()
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def open(self) -> BinaryIO:
+        """A binary file object over the body, from the start."""
+        if self.path is None:
+            return io.BytesIO(self._buffer.getvalue())
+        return open(self.path, "rb")
+
+    def ensure_file(self) -> str:
+        """Path of the body on disk, writing it out first if it is still in memory."""
+        if self.path is None:
+            with tempfile.NamedTemporaryFile(dir=self.spool_dir, suffix=self.suffix or ".upload",
+                                             delete=False) as f:
+                f.write(self._buffer.getbuffer())
+            self.path = f.name
+            self._buffer = io.BytesIO()
+        return self.path
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._owned and self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+        self._buffer = io.BytesIO()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def audio_part_check(allowed_extensions=(".ogg", ".mp3", ".wav", ".m4a", ".flac")):
+    """A `check` for spool_upload: the part must say it is audio, by content type or file name."""
+    def check(filename: str, content_type: str):
+        if not content_type.startswith("audio/") and not filename.lower().endswith(allowed_extensions):
+            raise UploadError(f"File must be audio (received {content_type or 'no content type'})")
+    return check
+
+
+class _MultipartFileReader:
+    """
+    Push-parser callbacks that write the body of the first part named
+    `field` into `upload` and skip every other part.
+    """
+
+    def __init__(self, upload: SpooledUpload, field: str, check: Callable[[str, str], None] = None):
+        self.upload = upload
+        self.field = field.encode()
+        self.check = check
+        self.found = False
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._writing = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field_data,
+            "on_header_value": self._header_value_data,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        }
+
+    def _part_begin(self):
+        self._headers = {}
+
+    def _header_field_data(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _header_value_data(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def _headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if self.found or options.get(b"name") != self.field:
+            return
+        self.found = self._writing = True
+        self.upload.filename = options.get(b"filename", b"").decode("utf-8", "replace")
+        self.upload.content_type = self._headers.get(b"content-type", b"").decode("latin-1")
+        if self.check is not None:
+            self.check(self.upload.filename, self.upload.content_type)
+
+    def _part_data(self, data: bytes, start: int, end: int):
+        if self._writing:
+            self.upload.write(data[start:end])
+
+    def _part_end(self):
+        self._writing = False
+
+
+async def spool_upload(request, field: str = "file", max_bytes: int = 0, spool_bytes: int = 4 * 1024 * 1024,
+                       spool_dir: str = None, sniff=sniff_audio_format,
+                       check: Callable[[str, str], None] = None) -> SpooledUpload:
+    """
+    Spool the `field` part of a multipart/form-data request straight from
+    the request stream. The parser runs on a worker thread, one received
+    chunk at a time, so `check` (given the part's file name and content
+    type), the format sniff, the size limit and the hash all see the bytes
+    as they arrive. A rejected upload raises UploadError without the rest
+    of the body being read.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadError(f"Expected a multipart/form-data body with a `{field}` field")
+
+    upload = SpooledUpload(max_bytes, spool_bytes, spool_dir, sniff)
+    reader = _MultipartFileReader(upload, field, check)
+    parser = multipart.MultipartParser(boundary, reader.callbacks())
+    try:
+        try:
+            async for chunk in request.stream():
+                if chunk:
+                    await asyncio.to_thread(parser.write, chunk)
+        except ClientDisconnect:
+            raise UploadError("Client disconnected before the upload finished")
+        parser.finalize()
+        if not reader.found:
+            raise UploadError(f"No `{field}` field in the upload")
+        return await asyncio.to_thread(upload.finish)
+    except BaseException:
+        upload.close()
+        raise
+
+
+# Request body for routes that read their upload with spool_upload, so the
+# OpenAPI schema still shows the file field FastAPI no longer parses
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    },
+}
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware rejecting request bodies over `max_bytes` on the given
+    path prefixes with 413 before they are received in full: at once when
+    Content-Length is too large, else as soon as the streamed body crosses
+    the limit (the app then sees a client disconnect).
+    """
+
+    def __init__(self, app, max_bytes: int, paths=("/",)):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or not self.max_bytes or scope["method"] not in ("POST", "PUT")
+                or not scope["path"].startswith(self.paths)):
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            await self._reject(send)
+            return
+
+        state = {"received": 0, "rejected": False, "started": False}
+
+        async def limited_receive():
+            if state["rejected"]:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                state["received"] += len(message.get("body", b""))
+                if state["received"] > self.max_bytes:
+                    state["rejected"] = True
+                    if not state["started"]:
+                        await self._reject(send)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            if state["rejected"]:
+                return
+            if message["type"] == "http.response.start":
+                state["started"] = True
+            await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": f"Request body exceeds the {self.max_bytes} byte limit"}).encode()
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode()),
+                                (b"connection", b"close")]})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,127 @@
+# vad.py
+# Lightweight energy-based voice activity detection run before ASR
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+def detect_speech(audio: np.ndarray, sample_rate: int = 16000, frame_ms: int = 30,
+                  floor_db: float = -45.0, margin_db: float = 10.0, ceiling_db: float = -30.0,
+                  min_speech_ms: int = 250, min_silence_ms: int = 400,
+                  pad_ms: int = 200) -> List[Tuple[int, int]]:
+    """
+    Return speech spans as (start_sample, end_sample) pairs.
+
+    A frame counts as speech when its RMS level is above both `floor_db`
+    (dBFS) and the estimated noise floor (20th percentile of frame levels)
+    plus `margin_db`. Frames louder than `ceiling_db` always count, so a
+    recording that is speech from start to end is never dropped. Gaps
+    shorter than `min_silence_ms` are bridged, spans shorter than
+    `min_speech_ms` are dropped and the rest are padded by `pad_ms` on both
+    sides so word onsets are not clipped.
+    """
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return []
+
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    level_db = 20 * np.log10(np.maximum(rms, 1e-10))
+    noise_floor = float(np.percentile(level_db, 20))
+    threshold = max(floor_db, min(noise_floor + margin_db, ceiling_db))
+    voiced = level_db > threshold
+
+    spans = []
+    start = None
+    for i, is_voiced in enumerate(voiced):
+        if is_voiced and start is None:
+            start = i
+        elif not is_voiced and start is not None:
+            spans.append([start, i])
+            start = None
+    if start is not None:
+        spans.append([start, n_frames])
+
+    # Bridge short pauses, drop blips, then pad
+    max_gap = min_silence_ms / frame_ms
+    merged = []
+    for span in spans:
+        if merged and span[0] - merged[-1][1] < max_gap:
+            merged[-1][1] = span[1]
+        else:
+            merged.append(span)
+    min_frames = min_speech_ms / frame_ms
+    pad = int(sample_rate * pad_ms / 1000)
+
+    result = []
+    for s, e in merged:
+        if e - s < min_frames:
+            continue
+        begin = max(0, s * frame - pad)
+        end = min(len(audio), e * frame + pad)
+        if result and begin <= result[-1][1]:
+            result[-1] = (result[-1][0], end)
+        else:
+            result.append((begin, end))
+    return result
+
+
+def vad_report(spans: List[Tuple[int, int]], total_samples: int, sample_rate: int = 16000) -> Dict:
+    """Audio seconds in vs. speech seconds passed on to ASR."""
+    audio_seconds = total_samples / sample_rate
+    speech_seconds = sum(e - s for s, e in spans) / sample_rate
+    return {
+        "audio_seconds": round(audio_seconds, 3),
+        "speech_seconds": round(speech_seconds, 3),
+        "skipped_seconds": round(audio_seconds - speech_seconds, 3),
+        "reduction": round(1 - speech_seconds / audio_seconds, 4) if audio_seconds else 0.0,
+        "speech_spans": len(spans),
+    }
+
+
+def _quietest_cut(audio: np.ndarray, lo: int, hi: int, frame: int) -> int:
+    """Sample index in the middle of the quietest frame of audio[lo:hi]."""
+    n_frames = (hi - lo) // frame
+    if n_frames == 0:
+        return hi
+    frames = audio[lo:lo + n_frames * frame].reshape(n_frames, frame)
+    energy = np.mean(np.square(frames, dtype=np.float32), axis=1)
+    return lo + int(np.argmin(energy)) * frame + frame // 2
+
+
+def plan_chunks(audio: np.ndarray, spans: List[Tuple[int, int]], sample_rate: int = 16000,
+                max_seconds: float = 30.0, max_gap_seconds: float = 2.0, search_seconds: float = 5.0,
+                frame_ms: int = 30) -> List[Tuple[int, int]]:
+    """
+    Turn speech spans into ASR chunks of at most `max_seconds` (Whisper's
+    window) for long recordings.
+
+    A span longer than that is cut at the quietest frame of the last
+    `search_seconds` before the limit, so words are rarely split. Neighbouring
+    pieces separated by at most `max_gap_seconds` of silence are then packed
+    into one chunk while it stays under the limit, which keeps the batch
+    count low without feeding Whisper long silences. Every chunk is one
+    contiguous slice of `audio`, so its timestamps are exact.
+    """
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    max_len = int(max_seconds * sample_rate)
+    max_gap = int(max_gap_seconds * sample_rate)
+    search = min(int(search_seconds * sample_rate), max_len // 2)
+
+    pieces = []
+    for start, end in spans:
+        while end - start > max_len:
+            cut = _quietest_cut(audio, start + max_len - search, start + max_len, frame)
+            pieces.append((start, cut))
+            start = cut
+        pieces.append((start, end))
+
+    chunks = []
+    for start, end in pieces:
+        if chunks and start - chunks[-1][1] <= max_gap and end - chunks[-1][0] <= max_len:
+            chunks[-1] = (chunks[-1][0], end)
+        else:
+            chunks.append((start, end))
+    return chunks
@@ -0,0 +1,243 @@
+# video.py
+# Video analysis: ffmpeg demux of the audio track and of sampled frames, pluggable frame analyzers
+
+import importlib
+import os
+import queue
+import re
+import subprocess
+import threading
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from app_utils.audio import TARGET_SAMPLE_RATE
+from app_utils.vad import _quietest_cut
+
+_PTS_TIME_RE = re.compile(rb"pts_time:\s*(-?[0-9.]+)")
+_NO_STREAM = b"does not contain any stream"
+
+
+class VideoDecodeError(RuntimeError):
+    """ffmpeg is missing or could not read the upload."""
+
+
+class MotionFrameAnalyzer:
+    """
+    CPU stand-in for a real frame model (tests, development, nodes without
+    a GPU): flags frames that differ sharply from the previous sampled frame
+    and frames that are nearly black (a covered lens). It detects no
+    threats, so its danger_score is always 0.
+
+    A frame analyzer has an `info` dict and `analyze(frame, timestamp,
+    previous)`, taking RGB uint8 arrays of shape (height, width, 3) - the
+    frame and the sampled frame before it (None for the first) - and
+    returning {"danger_score": 0..1, "labels": [...]}. One instance serves
+    concurrent videos, so it must not keep per-video state.
+    """
+
+    def __init__(self, motion_threshold: float = 0.15, dark_threshold: float = 0.05):
+        self.motion_threshold = motion_threshold
+        self.dark_threshold = dark_threshold
+        self.info = {"backend": "motion", "device": "cpu"}
+
+    def analyze(self, frame: np.ndarray, timestamp: float, previous: np.ndarray = None) -> Dict:
+        gray = frame.mean(axis=2, dtype=np.float32) / 255.0
+        labels = []
+        if previous is not None:
+            before = previous.mean(axis=2, dtype=np.float32) / 255.0
+            if np.abs(gray - before).mean() >= self.motion_threshold:
+                labels.append("sudden_motion")
+        if gray.mean() <= self.dark_threshold:
+            labels.append("dark")
+        return {"danger_score": 0.0, "labels": labels}
+
+
+FRAME_ANALYZERS = {"motion": MotionFrameAnalyzer}
+
+
+def create_frame_analyzer(name: str = None):
+    """
+    Frame analyzer by name (VIDEO_ANALYZER, default `motion`): a key of
+    FRAME_ANALYZERS, or `package.module:Class` for one shipped elsewhere.
+    """
+    name = name or os.environ.get("VIDEO_ANALYZER", "motion")
+    if name in FRAME_ANALYZERS:
+        return FRAME_ANALYZERS[name]()
+    module_name, _, class_name = name.partition(":")
+    if not class_name:
+        raise ValueError(f"Unknown frame analyzer {name!r} (use one of {', '.join(FRAME_ANALYZERS)} "
+                         "or package.module:Class)")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def _start_ffmpeg(arguments: List[str], loglevel: str = "error") -> subprocess.Popen:
+    command = ["ffmpeg", "-nostdin", "-hide_banner", "-nostats", "-loglevel", loglevel] + arguments
+    try:
+        return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise VideoDecodeError(f"ffmpeg is not available: {e}")
+
+
+def _finish(process: subprocess.Popen, stderr: bytes, produced: bool) -> None:
+    """Reap ffmpeg; raise unless it succeeded, produced output or the stream is simply absent."""
+    returncode = process.wait()
+    if returncode != 0 and not produced and _NO_STREAM not in stderr:
+        detail = stderr.decode("utf-8", "replace").strip().splitlines()
+        raise VideoDecodeError(detail[-1] if detail else f"ffmpeg exited with {returncode}")
+
+
+def iter_audio_windows(path: str, window_seconds: float = 120.0, search_seconds: float = 5.0,
+                       sample_rate: int = TARGET_SAMPLE_RATE) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Yield (offset in samples, 16 kHz mono float32 window) over the audio
+    track of a media file, read from ffmpeg as it decodes. Each window ends
+    at the quietest frame of its last `search_seconds`, so words are rarely
+    cut; the rest carries over to the next window. At most one window (plus
+    the carry) is held at a time, whatever the file's length. Yields nothing
+    for a file without an audio track.
+    """
+    window = int(window_seconds * sample_rate)
+    search = min(int(search_seconds * sample_rate), window // 2)
+    frame = sample_rate * 30 // 1000
+    process = _start_ffmpeg(["-i", path, "-map", "0:a:0?", "-vn", "-sn",
+                             "-f", "f32le", "-ac", "1", "-ar", str(sample_rate), "pipe:1"])
+    offset = 0
+    carry = np.zeros(0, dtype=np.float32)
+    try:
+        while True:
+            data = process.stdout.read((window - len(carry)) * 4)
+            audio = np.concatenate([carry, np.frombuffer(data[:len(data) // 4 * 4], dtype=np.float32)])
+            if len(audio) < window:
+                if len(audio):
+                    yield offset, audio
+                    offset += len(audio)
+                break
+            cut = _quietest_cut(audio, window - search, window, frame)
+            yield offset, audio[:cut]
+            offset += cut
+            carry = audio[cut:]
+        _finish(process, process.stderr.read(), offset > 0)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def iter_frames(path: str, fps: float = 1.0, keyframes: bool = False,
+                width: int = 320, height: int = 240) -> Iterator[Tuple[float, np.ndarray]]:
+    """
+    Yield (timestamp in seconds, RGB uint8 frame of height x width x 3) for
+    sampled frames only: `fps` frames per second, or only keyframes (which
+    ffmpeg does not even decode the others for). Frames are letterboxed to
+    a fixed size so a frame is always the same number of bytes.
+    """
+    filters = [] if keyframes else [f"fps={fps}"]
+    filters += [f"scale={width}:{height}:force_original_aspect_ratio=decrease",
+                f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2", "showinfo"]
+    arguments = (["-skip_frame", "nokey"] if keyframes else []) + ["-i", path, "-map", "0:v:0?", "-an", "-sn",
+                                                                   "-vf", ",".join(filters)]
+    if keyframes:
+        arguments += ["-fps_mode", "passthrough"]
+    arguments += ["-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"]
+    # showinfo logs each frame's timestamp at info level, before the frame is written
+    process = _start_ffmpeg(arguments, loglevel="info")
+
+    timestamps = queue.Queue()
+    stderr_tail = []
+
+    def read_stderr():
+        for line in process.stderr:
+            match = _PTS_TIME_RE.search(line)
+            if match:
+                timestamps.put(float(match.group(1)))
+            else:
+                stderr_tail[:] = (stderr_tail + [line])[-20:]
+
+    reader = threading.Thread(target=read_stderr, name="ffmpeg-stderr", daemon=True)
+    reader.start()
+    frame_bytes = width * height * 3
+    count = 0
+    try:
+        while True:
+            data = process.stdout.read(frame_bytes)
+            if len(data) < frame_bytes:
+                break
+            try:
+                timestamp = timestamps.get(timeout=5)
+            except queue.Empty:
+                timestamp = count / fps
+            count += 1
+            yield round(timestamp, 3), np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+        reader.join(timeout=5)
+        _finish(process, b"".join(stderr_tail), count > 0)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def analyze_frames(path: str, analyzer, fps: float = 1.0, keyframes: bool = False,
+                   width: int = 320, height: int = 240, queue_size: int = 8) -> Dict:
+    """
+    Decode sampled frames on a reader thread into a queue of at most
+    `queue_size` frames and run `analyzer` on them here. A slow analyzer
+    stalls the reader, and through the pipe ffmpeg, so memory stays
+    constant. Only frames with labels or a danger score are kept as events.
+    """
+    frames: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+    stop = threading.Event()
+    failure = []
+
+    def read():
+        try:
+            for item in iter_frames(path, fps, keyframes, width, height):
+                while not stop.is_set():
+                    try:
+                        frames.put(item, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except Exception as e:
+            failure.append(e)
+        finally:
+            while not stop.is_set():
+                try:
+                    frames.put(None, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+
+    reader = threading.Thread(target=read, name="frame-reader", daemon=True)
+    reader.start()
+    events = []
+    analyzed = 0
+    peak = None
+    previous = None
+    try:
+        while True:
+            item = frames.get()
+            if item is None:
+                break
+            timestamp, frame = item
+            result = analyzer.analyze(frame, timestamp, previous)
+            previous = frame
+            analyzed += 1
+            if result["labels"] or result["danger_score"] > 0:
+                events.append({"time": timestamp, **result})
+            if peak is None or result["danger_score"] > peak["danger_score"]:
+                peak = {"time": timestamp, **result}
+    finally:
+        stop.set()
+        reader.join(timeout=5)
+    if failure:
+        raise failure[0]
+    return {
+        "frames_analyzed": analyzed,
+        "sampling": {"keyframes": True} if keyframes else {"fps": fps},
+        "frame_size": [width, height],
+        "events": events,
+        "peak": peak,
+    }
@@ -0,0 +1,13 @@
+"""
+Benchmarks for the analysis and transcription hot paths.
+
+    python -m benchmarks --out results.json
+    python -m benchmarks --only micro --compare results.json
+
+`micro` times the keyword pipeline functions on a synthetic multilingual
+corpus (see `benchmarks.corpus`); `endpoints` drives `/analyze-text` and
+`/transcribe` in-process with stub models (or tiny/real ones, `--models`).
+Each benchmark reports throughput, p50/p95/p99 latency and the process peak
+RSS after it ran; the JSON output can be compared between commits with
+`--compare`.
+"""
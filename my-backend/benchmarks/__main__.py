@@ -0,0 +1,69 @@
+import argparse
+import json
+import platform
+import subprocess
+import time
+
+from . import __doc__ as usage
+from .corpus import generate_corpus
+from .measure import compare, peak_rss_mb
+
+
+def git_commit() -> str:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=usage,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", choices=["micro", "endpoints"], help="run one group only")
+    parser.add_argument("--out", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    parser.add_argument("--corpus-size", type=int, default=720)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the corpus for micro-benchmarks")
+    parser.add_argument("--models", choices=["stub", "tiny", "real"], default="stub")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint benchmark")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.corpus_size, args.seed)
+    results = []
+    if args.only in (None, "micro"):
+        from .micro import run_micro
+        results += run_micro(corpus, args.repeat)
+    if args.only in (None, "endpoints"):
+        from .endpoints import run_endpoints
+        results += run_endpoints(corpus, args.models, args.requests, args.concurrency)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+            "peak_rss_mb": peak_rss_mb(),
+        },
+        "results": results,
+    }
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            report["comparison"] = {"against": args.compare, "changes": compare(json.load(f), report)}
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"[LOG] Results written to {args.out}")
+    if args.compare or not args.out:
+        print(json.dumps(report.get("comparison", report), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Synthetic multilingual corpus for the benchmarks.
+
+Texts are English, Egyptian Arabic or mixed, at several lengths and threat
+densities (the share of words drawn from the lexicon). Generation is
+seeded, so the same arguments always give the same corpus.
+
+    python -m benchmarks.corpus corpus.jsonl --size 2000
+"""
+
+import argparse
+import itertools
+import json
+import random
+from typing import Dict, List
+
+from modal_app import lexicon_store
+
+LANGUAGES = ("english", "arabic", "mixed")
+
+# Words per text
+LENGTHS = {"short": (5, 12), "medium": (30, 60), "long": (200, 400)}
+
+# Share of lexicon terms among the words of a text
+DENSITIES = (0.0, 0.02, 0.1, 0.3)
+
+ENGLISH_FILLER = (
+    "the", "a", "and", "to", "of", "in", "is", "it", "you", "that", "we", "for", "on", "with",
+    "school", "today", "home", "mom", "teacher", "friend", "bus", "class", "lunch", "game",
+    "phone", "tomorrow", "please", "call", "come", "go", "play", "sit", "read", "after",
+    "weekend", "homework", "park", "dinner", "okay", "yes", "no", "maybe", "later", "now",
+)
+
+ARABIC_FILLER = (
+    "انا", "انت", "احنا", "هو", "هي", "في", "على", "من", "مع", "ده", "دي", "كده", "ليه",
+    "امتى", "فين", "النهارده", "بكرة", "المدرسة", "البيت", "ماما", "بابا", "صاحبي", "الفصل",
+    "الاتوبيس", "الاكل", "اللعب", "تعالى", "روح", "استنى", "يلا", "ماشي", "اه", "لا", "شوية",
+    "الواجب", "التليفون", "النادي", "العشا", "الحمد لله", "ان شاء الله", "بعدين", "دلوقتي",
+)
+
+
+def _is_arabic(term: str) -> bool:
+    return any("؀" <= ch <= "ۿ" for ch in term)
+
+
+def _lexicon_terms() -> Dict[str, List[str]]:
+    english, arabic = [], []
+    for entry in lexicon_store.current.matcher.entries:
+        word = entry["word"]
+        (arabic if _is_arabic(word) else english).append(word)
+    return {"english": english, "arabic": arabic, "mixed": english + arabic}
+
+
+def _filler(language: str):
+    if language == "english":
+        return ENGLISH_FILLER
+    if language == "arabic":
+        return ARABIC_FILLER
+    return ENGLISH_FILLER + ARABIC_FILLER
+
+
+def generate_corpus(size: int = 1000, seed: int = 0) -> List[Dict]:
+    """
+    `size` texts cycling through every language x length x density
+    combination. Each item: {"text", "language", "length", "density"}.
+    """
+    rng = random.Random(seed)
+    terms = _lexicon_terms()
+    combos = list(itertools.product(LANGUAGES, LENGTHS, DENSITIES))
+
+    corpus = []
+    for i in range(size):
+        language, length, density = combos[i % len(combos)]
+        low, high = LENGTHS[length]
+        n_words = rng.randint(low, high)
+        filler = _filler(language)
+        words = [
+            rng.choice(terms[language]) if rng.random() < density else rng.choice(filler)
+            for _ in range(n_words)
+        ]
+        corpus.append({"text": " ".join(words), "language": language, "length": length, "density": density})
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out", help="JSONL file to write")
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        for item in generate_corpus(args.size, args.seed):
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
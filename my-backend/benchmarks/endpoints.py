@@ -0,0 +1,154 @@
+# endpoints.py
+# End-to-end benchmarks of /analyze-text and /transcribe, run in-process
+
+import io
+import json
+import os
+import tempfile
+import warnings
+import wave
+import zlib
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import modal_app
+from app_utils import backends
+
+from .measure import run_benchmark
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+BENCH_TOKEN = "bench-token"
+
+
+class StubASR:
+    """Returns a fixed corpus text per input, so scoring still has work to do."""
+
+    name = "stub"
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.info = {"backend": "stub"}
+
+    def transcribe(self, audio, **options) -> str:
+        key = len(audio) if not isinstance(audio, str) else zlib.crc32(audio.encode())
+        return self.texts[key % len(self.texts)]
+
+    def transcribe_batch(self, arrays: List, batch_size: int = 8, language: str = None) -> List[str]:
+        return [self.transcribe(a) for a in arrays]
+
+
+class StubClassifier:
+    """Deterministic hate/not-hate labels from a hash of the text."""
+
+    info = {"backend": "stub"}
+
+    def classify(self, texts: List[str]) -> List[Dict]:
+        return [
+            {"label": "LABEL_1" if zlib.crc32(t.encode()) % 4 == 0 else "LABEL_0", "score": 0.9}
+            for t in texts
+        ]
+
+
+def use_models(models: str, texts: List[str]):
+    """
+    `stub`: canned ASR/classifier output (measures everything but the models).
+    `tiny`: whisper-tiny on the selected ASR backend plus the real classifier.
+    `real`: the models configured for the deployment.
+    """
+    if models == "stub":
+        modal_app.create_asr_backend = lambda *args, **kwargs: StubASR(texts)
+        modal_app.create_classifier_backend = lambda *args, **kwargs: StubClassifier()
+    elif models == "tiny":
+        modal_app.create_asr_backend = (
+            lambda *args, **kwargs: backends.create_asr_backend("openai/whisper-tiny", "tiny", **kwargs)
+        )
+    elif models != "real":
+        raise ValueError(f"Unknown models: {models}")
+
+
+def synthetic_wav(seconds: float = 5.0, sample_rate: int = 16000) -> bytes:
+    """Tone bursts separated by quiet noise, as 16-bit mono WAV."""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    audio = rng.standard_normal(len(t)) * 1e-3
+    voiced = (t % 1.0) < 0.6
+    audio[voiced] += 0.3 * np.sin(2 * np.pi * 180 * t[voiced]) * np.sin(2 * np.pi * 3 * t[voiced])
+    pcm = (np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes()
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def audio_clips() -> List[Tuple[str, bytes]]:
+    """The bundled test clips (when not empty) plus a synthetic WAV."""
+    clips = []
+    for name in ("test.wav", "test.ogg"):
+        path = BACKEND_DIR / name
+        if path.exists() and path.stat().st_size > 0:
+            clips.append((name, path.read_bytes()))
+        else:
+            print(f"[LOG] Skipping empty or missing {name}")
+    clips.append(("synthetic.wav", synthetic_wav()))
+    return clips
+
+
+def build_client(models: str, texts: List[str]):
+    from fastapi.testclient import TestClient
+
+    os.environ.setdefault("AUDIO_STORE_DIR", tempfile.mkdtemp(prefix="eveguard-bench-"))
+    os.environ["PRELOAD_MODELS"] = "0"
+    # Authenticated like production, with limits the load cannot reach
+    os.environ["PARENT_TOKENS"] = json.dumps({"bench": BENCH_TOKEN})
+    for name in ("RATE_LIMIT_PER_MINUTE", "RATE_LIMIT_BURST", "RATE_LIMIT_CONCURRENCY"):
+        os.environ[name] = "1000000"
+    use_models(models, texts)
+    with warnings.catch_warnings():
+        # Running the Modal function locally warns about volumes it does not use
+        warnings.simplefilter("ignore")
+        api = modal_app.fastapi_app.local()
+    return TestClient(api, headers={"Authorization": f"Bearer {BENCH_TOKEN}"})
+
+
+def run_endpoints(corpus: List[Dict], models: str = "stub", requests: int = 200,
+                  concurrency: int = 4) -> List[Dict]:
+    """
+    `cold` runs send a distinct text or upload per request (result cache
+    misses); `warm` runs repeat one input, so they measure cache hits.
+    """
+    texts = [item["text"] for item in corpus]
+    results = []
+    with build_client(models, texts) as client:
+
+        def post_text(text):
+            response = client.post("/analyze-text", json={"text": text})
+            response.raise_for_status()
+
+        cold_texts = [f"{texts[i % len(texts)]} {i}" for i in range(requests)]
+        results.append(run_benchmark("analyze_text[cold]", post_text, cold_texts,
+                                     concurrency=concurrency, group="endpoints", models=models))
+        results.append(run_benchmark("analyze_text[warm]", post_text, [texts[0]] * requests,
+                                     concurrency=concurrency, group="endpoints", models=models))
+
+        for name, clip in audio_clips():
+            suffix = name[name.rfind("."):]
+
+            def post_audio(data, name=name):
+                response = client.post("/transcribe", files={"file": (name, data, "application/octet-stream")})
+                response.raise_for_status()
+
+            # Trailing bytes change the content hash without changing the decoded audio
+            cold = [clip + i.to_bytes(8, "little") for i in range(requests)]
+            results.append(run_benchmark(f"transcribe[{name}][cold]", post_audio, cold, warmup=1,
+                                         concurrency=concurrency, group="endpoints", models=models,
+                                         audio_bytes=len(clip), audio_format=suffix.lstrip(".")))
+            results.append(run_benchmark(f"transcribe[{name}][warm]", post_audio, [clip] * requests,
+                                         concurrency=concurrency, group="endpoints", models=models,
+                                         audio_bytes=len(clip), audio_format=suffix.lstrip(".")))
+    return results
@@ -0,0 +1,87 @@
+# measure.py
+# Timing, latency percentiles, peak RSS and result comparison
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+from app_utils.executor import percentiles
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """High-water mark of this process's resident memory, in MiB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_benchmark(name: str, fn: Callable, inputs: Sequence, warmup: int = 5,
+                  concurrency: int = 1, group: str = "", **extra) -> Dict:
+    """
+    Call `fn(item)` for every item in `inputs` (after `warmup` untimed calls)
+    and summarize latency in milliseconds plus throughput in calls/second.
+    With `concurrency` > 1 the calls are spread over that many threads.
+    """
+    for item in list(inputs)[:warmup]:
+        fn(item)
+
+    def timed(item) -> float:
+        started = time.perf_counter()
+        fn(item)
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies: List[float] = list(pool.map(timed, inputs))
+    else:
+        latencies = [timed(item) for item in inputs]
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        "name": name,
+        "group": group,
+        "calls": len(latencies),
+        "concurrency": concurrency,
+        "wall_seconds": round(wall, 4),
+        "throughput_per_second": round(len(latencies) / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 4) if latencies else 0.0,
+            **percentiles(latencies),
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    result.update(extra)
+    print(f"[LOG] {name}: {result['throughput_per_second']}/s, p50 {result['latency_ms']['p50']} ms, "
+          f"p99 {result['latency_ms']['p99']} ms")
+    return result
+
+
+def compare(previous: Dict, current: Dict) -> List[Dict]:
+    """Per-benchmark change of throughput and p50/p99 latency vs. a previous run."""
+    before = {r["name"]: r for r in previous.get("results", [])}
+    rows = []
+    for r in current.get("results", []):
+        old = before.get(r["name"])
+        if old is None:
+            continue
+
+        def change(new_value, old_value):
+            return round((new_value - old_value) / old_value * 100, 1) if old_value else None
+
+        rows.append({
+            "name": r["name"],
+            "throughput_change_pct": change(r["throughput_per_second"], old["throughput_per_second"]),
+            "p50_change_pct": change(r["latency_ms"]["p50"], old["latency_ms"]["p50"]),
+            "p99_change_pct": change(r["latency_ms"]["p99"], old["latency_ms"]["p99"]),
+        })
+    return rows
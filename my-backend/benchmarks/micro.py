@@ -0,0 +1,70 @@
+# micro.py
+# Micro-benchmarks for the keyword analysis functions
+
+from typing import Dict, List
+
+from app_utils.auth import Authenticator, hash_token, sign_token
+from app_utils.lexicon import load_lexicon, normalize_for_matching
+from app_utils.ratelimit import RateLimiter
+from modal_app import (
+    LEXICON_FILE, SEVERITY_WEIGHTS, calculate_danger_score, detect_bad_words, get_risk_level, get_risk_message,
+    lexicon_store,
+)
+
+from .measure import run_benchmark
+
+
+def run_micro(corpus: List[Dict], repeat: int = 1) -> List[Dict]:
+    """Time each stage on every corpus text, overall and per text length."""
+    items = corpus * repeat
+    detected = [(item["text"], detect_bad_words(item["text"])) for item in items]
+    scored = []
+    for text, words in detected:
+        score = calculate_danger_score(words, text)
+        scored.append((get_risk_level(score), words, score))
+
+    results = [
+        run_benchmark("detect_bad_words", lambda item: detect_bad_words(item["text"]), items, group="micro"),
+        # Without script routing, for comparison
+        run_benchmark("detect_bad_words[full_lexicon]",
+                      lambda item: lexicon_store.current.matcher.detect(item["text"]), items, group="micro"),
+        run_benchmark("normalize_for_matching", lambda item: normalize_for_matching(item["text"]), items,
+                      group="micro"),
+        # What a hot reload costs, off the request path
+        run_benchmark("load_lexicon", lambda path: load_lexicon(path, SEVERITY_WEIGHTS), [str(LEXICON_FILE)] * 20,
+                      warmup=1, group="micro"),
+        run_benchmark("calculate_danger_score", lambda pair: calculate_danger_score(pair[1], pair[0]),
+                      detected, group="micro"),
+        run_benchmark("get_risk_message", lambda args: get_risk_message(*args), scored, group="micro"),
+    ]
+
+    results += run_auth(len(items))
+
+    for length in sorted({item["length"] for item in items}):
+        subset = [item for item in items if item["length"] == length]
+        results.append(run_benchmark(
+            f"detect_bad_words[{length}]", lambda item: detect_bad_words(item["text"]), subset,
+            group="micro", mean_words=round(sum(len(i["text"].split()) for i in subset) / len(subset), 1),
+        ))
+    return results
+
+
+def run_auth(count: int) -> List[Dict]:
+    """Per-request cost of authentication and rate limiting."""
+    secret = "bench-secret"
+    tokens = [f"token-{i}" for i in range(100)]
+    authenticator = Authenticator({hash_token(t): f"parent-{i}" for i, t in enumerate(tokens)}, secret)
+    jwts = [sign_token(f"parent-{i}", secret) for i in range(count)]
+    limiter = RateLimiter(rate_per_minute=1e9, burst=10 ** 9, max_concurrent=0)
+
+    def acquire_release(key):
+        limiter.acquire(key)
+        limiter.release(key)
+
+    return [
+        run_benchmark("authenticate[cached]", authenticator.authenticate, tokens * (count // 100 + 1),
+                      group="micro"),
+        # Every JWT is new, so each one is verified
+        run_benchmark("authenticate[jwt]", authenticator.authenticate, jwts, group="micro"),
+        run_benchmark("rate_limit", acquire_release, [f"parent-{i % 100}" for i in range(count)], group="micro"),
+    ]
@@ -0,0 +1,122 @@
+"""
+Check analysis-cascade thresholds against a labeled corpus.
+
+Runs keyword detection and MARBERT once over every text, then replays the
+cascade for each threshold combination (with and without skipping texts
+that contain no Arabic) and reports how many MARBERT calls it would skip,
+the estimated classifier time saved, and how often its risk level agrees
+with the full pipeline (and with the labels, when given).
+
+Corpus: JSONL, one {"text": ..., "label": ...} per line. `label` is
+optional and may be a risk level (safe/suspicious/warning/danger) or a
+boolean "is threat".
+
+    python cascade_eval.py corpus.jsonl --high 0.7 0.85 1.0 --benign-words 0 3 5
+"""
+
+import argparse
+import json
+import time
+
+from app_utils.cascade import CascadePolicy
+from app_utils.lexicon import detect_script
+from modal_app import (
+    MARBERT_MODEL, calculate_danger_score, combine_scores, detect_bad_words, get_risk_level,
+)
+
+HATE_LABELS = ["HATE", "OFFENSIVE", "ABUSIVE", "1", "LABEL_1"]
+
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_marbert(texts, device, batch_size):
+    from transformers import pipeline
+
+    classifier = pipeline("text-classification", model=MARBERT_MODEL, device=device)
+    started = time.perf_counter()
+    raw = classifier(texts, batch_size=batch_size, truncation=True)
+    seconds_per_text = (time.perf_counter() - started) / max(len(texts), 1)
+
+    results = []
+    for r in raw:
+        is_hate = r["label"].upper() in HATE_LABELS
+        results.append({"is_hate": is_hate, "confidence": r["score"] if is_hate else 1 - r["score"]})
+    return results, seconds_per_text
+
+
+def label_is_threat(label):
+    if isinstance(label, bool):
+        return label
+    return str(label).lower() in ("danger", "warning", "threat", "hate", "1", "true")
+
+
+def evaluate(records, policy, seconds_per_text):
+    skipped = agree_full = agree_label = labeled = 0
+    for r in records:
+        exit_reason = policy.exit_reason(r["text"], r["keyword_score"], r["script"])
+        if exit_reason:
+            skipped += 1
+            risk = get_risk_level(r["keyword_score"])
+        else:
+            risk = r["full_risk"]
+        agree_full += risk == r["full_risk"]
+        if r.get("label") is not None:
+            labeled += 1
+            agree_label += (risk in ("danger", "warning")) == label_is_threat(r["label"])
+
+    total = max(len(records), 1)
+    return {
+        **policy.describe(),
+        "marbert_skipped": skipped,
+        "skip_rate": round(skipped / total, 4),
+        "saved_marbert_seconds": round(skipped * seconds_per_text, 3),
+        "agreement_with_full_pipeline": round(agree_full / total, 4),
+        "label_accuracy": round(agree_label / labeled, 4) if labeled else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus")
+    parser.add_argument("--high", type=float, nargs="+", default=[0.7, 0.85, 1.0])
+    parser.add_argument("--low", type=float, default=0.0)
+    parser.add_argument("--benign-words", type=int, nargs="+", default=[0, 3, 5])
+    parser.add_argument("--device", default=-1, help="-1 for CPU, 0/cuda for GPU",
+                        type=lambda v: int(v) if v.lstrip("-").isdigit() else v)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    texts = [item["text"] for item in corpus]
+    sentiments, seconds_per_text = run_marbert(texts, args.device, args.batch_size)
+
+    records = []
+    for item, sentiment in zip(corpus, sentiments):
+        keyword_score = calculate_danger_score(detect_bad_words(item["text"]), item["text"])
+        full_score = combine_scores(keyword_score, sentiment)
+        records.append({
+            "text": item["text"],
+            "label": item.get("label"),
+            "script": detect_script(item["text"]),
+            "keyword_score": keyword_score,
+            "full_risk": get_risk_level(full_score),
+        })
+
+    report = {
+        "texts": len(records),
+        "marbert_seconds_per_text": round(seconds_per_text, 5),
+        "runs": [
+            evaluate(records, CascadePolicy(True, high, args.low, words, arabic_only), seconds_per_text)
+            for arabic_only in (False, True)
+            for high in args.high
+            for words in args.benign_words
+        ],
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,211 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Header
-from whisper_transcribe import transcribe_audio_file
-from app_utils.storage import save_audio_file, cleanup_temp_file
-from app_utils.auth import verify_token
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from whisper_transcribe import MODEL_SIZE, get_whisper_model, transcribe_audio_file, whisper_cache_tag
+from app_utils.audio import TARGET_SAMPLE_RATE, decode_audio, decode_audio_file, load_warmup_clip
+from app_utils.lifecycle import ModelLifecycle
+from app_utils.logs import dropped_log_records, setup_logging
+from app_utils.metrics import CONTENT_TYPE, SIZE_BUCKETS, MetricsRegistry, RequestMetricsMiddleware
+from app_utils.vad import detect_speech, vad_report
+from app_utils.auth import AuthMiddleware, Authenticator
+from app_utils.executor import InferenceExecutor, OverloadedError
+from app_utils.cache import cache_from_env, cache_key
+from app_utils.ratelimit import RateLimiter
+from app_utils.uploads import (
+    UPLOAD_OPENAPI, SpooledUpload, UploadError, UploadLimitMiddleware, audio_part_check, spool_upload,
+)
 import os
+from contextlib import asynccontextmanager
 
-app = FastAPI(title="Whisper Medium API", version="1.0")
-
-@app.post("/transcribe")
-async def transcribe(
-    file: UploadFile = File(...),
-    authorization: str = Header(None)
-):
-    print(f"[LOG] Received file: {file.filename} (content_type={file.content_type})")
-    # Optional auth
-    if authorization and not verify_token(authorization.replace("Bearer ", "")):
-        print("[LOG] Invalid token")
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    # Only accept audio files
-    allowed_extensions = ('.ogg', '.mp3', '.wav', '.m4a', '.flac')
-    if not file.content_type.startswith("audio/") and not file.filename.lower().endswith(allowed_extensions):
-        print(f"[LOG] Rejected non-audio file upload: {file.content_type} {file.filename}")
-        raise HTTPException(status_code=400, detail=f"File must be audio (received {file.content_type})")
-
-    # Save uploaded file
-    audio_bytes = await file.read()
-    temp_path = save_audio_file(audio_bytes, suffix=os.path.splitext(file.filename)[1] or ".wav")
-    print(f"[LOG] Saved file to: {temp_path}")
-
-    try:
-        # Run transcription
-        print(f"[LOG] Starting transcription for: {temp_path}")
-        text = transcribe_audio_file(temp_path)
-        print(f"[LOG] Transcription result: {text}")
-        return {"transcription": text}
-    finally:
-        cleanup_temp_file(temp_path)
-        print(f"[LOG] Cleaned up temp file: {temp_path}")
\ No newline at end of file
+log = setup_logging()
+lifecycle = ModelLifecycle()
+
+# Per-stage timings, payload sizes and queue depths for GET /metrics
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram("eveguard_stage_seconds", "Time spent in each pipeline stage", ["stage"])
+upload_bytes = metrics.histogram("eveguard_upload_bytes", "Size of uploaded audio files", buckets=SIZE_BUCKETS)
+
+def warmup_model():
+    """One real transcription so the first request skips model init."""
+    clip = load_warmup_clip(os.environ.get("WARMUP_AUDIO", os.path.join(os.path.dirname(__file__), "test.ogg")))
+    transcribe_audio_file(clip)
+
+@asynccontextmanager
+async def lifespan(app):
+    # Optional background preload + warmup; /ready stays 503 until done
+    if os.environ.get("PRELOAD_MODELS", "0") == "1":
+        lifecycle.start_preload([
+            ("asr_load", get_whisper_model),
+            ("warmup", warmup_model),
+        ])
+    yield
+
+app = FastAPI(title="Whisper Medium API", version="1.0", lifespan=lifespan)
+
+# Uploads are read in chunks: held in memory up to UPLOAD_SPOOL_BYTES, then
+# spooled to disk, and refused past MAX_UPLOAD_BYTES (0 = no limit)
+max_upload_bytes = int(os.environ.get("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+upload_spool_bytes = int(os.environ.get("UPLOAD_SPOOL_BYTES", str(4 * 1024 * 1024)))
+upload_spool_dir = os.environ.get("UPLOAD_SPOOL_DIR") or None
+
+# Oversized bodies get a 413 before they are received (slack for the multipart framing)
+app.add_middleware(
+    UploadLimitMiddleware,
+    max_bytes=max_upload_bytes + 64 * 1024 if max_upload_bytes else 0,
+    paths=("/transcribe",),
+)
+
+# Tokens are checked, and each parent held to its own rate and concurrency
+# limits, before a request reaches its handler - so before its upload is read
+authenticator = Authenticator.from_env()
+rate_limiter = RateLimiter(
+    rate_per_minute=float(os.environ.get("RATE_LIMIT_PER_MINUTE", "60")),
+    burst=int(os.environ.get("RATE_LIMIT_BURST", "20")),
+    max_concurrent=int(os.environ.get("RATE_LIMIT_CONCURRENCY", "4")),
+)
+app.add_middleware(AuthMiddleware, authenticator=authenticator, limiter=rate_limiter, limited_paths=("/transcribe",))
+app.add_middleware(
+    RequestMetricsMiddleware,
+    latency=metrics.histogram(
+        "eveguard_request_seconds", "HTTP request latency by route", ["method", "route", "status"]),
+    response_bytes=metrics.histogram(
+        "eveguard_response_bytes", "HTTP response body size by route", ["route"], buckets=SIZE_BUCKETS),
+)
+
+# Whisper runs here, off the event loop; excess requests get a fast 503
+inference_pool = InferenceExecutor(
+    max_workers=int(os.environ.get("INFERENCE_WORKERS", "1")),
+    max_queue=int(os.environ.get("INFERENCE_QUEUE_SIZE", "8")),
+    name="whisper",
+)
+
+# Transcriptions keyed by audio hash + model, so client retries skip Whisper
+result_cache_version = os.environ.get("RESULT_CACHE_VERSION", "1")
+transcription_cache = cache_from_env("transcriptions")
+
+# Energy VAD in front of Whisper: silence never reaches the model
+vad_enabled = os.environ.get("VAD_ENABLED", "1") == "1"
+
+def transcribe_upload(upload: SpooledUpload) -> dict:
+    """
+    Decode the upload (in memory, or from its spool file) and transcribe
+    only its speech spans; only formats that cannot be decoded that way are
+    handed to the model as a file.
+    """
+    with stage_seconds.time(stage="decode"):
+        if upload.in_memory:
+            audio = decode_audio(upload.getvalue(), upload.suffix)
+        else:
+            audio = decode_audio_file(upload.path, upload.suffix)
+    if audio is not None:
+        if not vad_enabled:
+            with stage_seconds.time(stage="asr"):
+                return {"text": transcribe_audio_file(audio), "vad": None}
+        with stage_seconds.time(stage="vad"):
+            spans = detect_speech(audio, TARGET_SAMPLE_RATE)
+        vad = vad_report(spans, len(audio), TARGET_SAMPLE_RATE)
+        if not spans:
+            return {"text": "", "vad": vad}
+        with stage_seconds.time(stage="asr"):
+            return {"text": transcribe_audio_file(audio, speech_spans=spans), "vad": vad}
+
+    path = upload.ensure_file()
+    log.info("Decode failed, passing the file to the model: %s", path)
+    with stage_seconds.time(stage="asr"):
+        return {"text": transcribe_audio_file(path), "vad": None}
+
+@app.exception_handler(OverloadedError)
+async def overloaded_handler(request: Request, exc: OverloadedError):
+    log.warning("Rejected request: %s", exc)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(UploadError)
+async def upload_error_handler(request: Request, exc: UploadError):
+    log.warning("Rejected upload: %s", exc)
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
+
+@app.get("/health")
+async def health():
+    """Liveness plus model load/warmup timings."""
+    return lifecycle.health()
+
+@app.get("/ready")
+async def ready():
+    """503 until preload and warmup have finished (when PRELOAD_MODELS=1)."""
+    if not lifecycle.ready:
+        return JSONResponse(status_code=503, content={"ready": False, "errors": lifecycle.errors})
+    return {"ready": True}
+
+@app.get("/stats/cache")
+async def cache_stats():
+    """Hit/miss counters of the transcription result cache."""
+    return {"transcriptions": transcription_cache.stats()}
+
+@app.get("/stats/auth")
+async def auth_stats():
+    """Token verification cache and per-parent rate/concurrency limit counters."""
+    return {"auth": authenticator.stats(), "rate_limit": rate_limiter.stats()}
+
+@app.get("/stats/inference")
+async def inference_stats():
+    """Queue depth, rejections and wait times of the Whisper worker pool."""
+    return inference_pool.stats()
+
+# Read from the components' own stats at scrape time
+metrics.gauge("eveguard_model_load_seconds", "Duration of each model load and warmup step", ["step"],
+              callback=lambda: dict(lifecycle.timings))
+metrics.gauge("eveguard_queue_depth", "Work waiting for a worker", ["queue"],
+              callback=lambda: {"whisper": inference_pool.stats()["queue_depth"]})
+metrics.gauge("eveguard_inference_running", "Transcriptions running on the worker pool",
+              callback=lambda: inference_pool.stats()["running"])
+metrics.counter("eveguard_rejected_total", "Requests rejected by admission control", ["queue"],
+                callback=lambda: {"whisper": inference_pool.stats()["rejected"]})
+metrics.counter("eveguard_cache_lookups_total", "Result cache lookups", ["cache", "result"],
+                callback=lambda: {
+                    (transcription_cache.name, result): transcription_cache.stats()[result]
+                    for result in ("memory_hits", "disk_hits", "misses")
+                })
+metrics.counter("eveguard_auth_rejected_total", "Requests rejected for an invalid token",
+                callback=lambda: authenticator.stats()["rejected"])
+metrics.counter("eveguard_rate_limited_total", "Requests rejected by per-parent limits", ["limit"],
+                callback=lambda: {"rate": rate_limiter.stats()["rate_limited"],
+                                  "concurrency": rate_limiter.stats()["concurrency_limited"]})
+metrics.counter("eveguard_log_records_dropped_total", "Log records dropped because the log queue was full",
+                callback=dropped_log_records)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Stage latencies, request latencies, payload sizes and queue depths (Prometheus format)."""
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
+@app.post("/transcribe", openapi_extra=UPLOAD_OPENAPI)
+async def transcribe(request: Request):
+    # AuthMiddleware has already checked the token and the parent's limits
+
+    # Reject before spooling the upload if the pool is already full
+    inference_pool.ensure_capacity()
+
+    # Read from the request stream: only audio parts are accepted, and the
+    # body is hashed and format-sniffed as it arrives
+    with stage_seconds.time(stage="upload_read"):
+        upload = await spool_upload(request, "file", max_upload_bytes, upload_spool_bytes, upload_spool_dir,
+                                    check=audio_part_check())
+    upload_bytes.observe(upload.size)
+    log.debug("Received file: %s (content_type=%s)", upload.filename, upload.content_type)
+
+    with upload:
+        asr_key = cache_key("asr", "whisper-" + MODEL_SIZE, whisper_cache_tag(), result_cache_version,
+                            f"vad={vad_enabled}", upload.audio_id)
+        result = await transcription_cache.aget(asr_key)
+        if result is None:
+            # Run transcription (decoded on the worker pool)
+            result = await inference_pool.run(transcribe_upload, upload)
+            await transcription_cache.aset(asr_key, result)
+    # Transcripts only at DEBUG: they are private and can be long
+    log.info("Transcribed %s: %d bytes -> %d chars", upload.filename, upload.size, len(result["text"]))
+    log.debug("Transcription result: %s", result["text"])
+    with stage_seconds.time(stage="serialize"):
+        return JSONResponse({"transcription": result["text"], "vad": result["vad"]})
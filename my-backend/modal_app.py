@@ -1,7 +1,35 @@
 import modal
-import re
+from pathlib import Path
 from typing import List, Dict
 
+from app_utils.backends import (
+    asr_backend_profile, asr_language, backend_cache_tag, classifier_backend_profile, create_asr_backend,
+    create_classifier_backend,
+)
+from app_utils.auth import Authenticator, AuthMiddleware
+from app_utils.batching import MicroBatcher
+from app_utils.cache import cache_from_env, cache_key, normalize_text
+from app_utils.cascade import CascadePolicy
+from app_utils.esp import CameraDispatcher
+from app_utils.executor import InferenceExecutor, OverloadedError
+from app_utils.heartrate import (
+    ROLLUP_SECONDS, AlertDeduper, DeviceBuffers, HeartRateStore, parse_reading, resolve_timestamps,
+)
+from app_utils.jobs import PRIORITIES, TERMINAL, JobQueue
+from app_utils.lexicon import LexiconSnapshot, LexiconStore, detect_script
+from app_utils.lifecycle import ModelLifecycle
+from app_utils.logs import dropped_log_records, setup_logging
+from app_utils.metrics import CONTENT_TYPE, SIZE_BUCKETS, MetricsRegistry, RequestMetricsMiddleware
+from app_utils.models import ModelManager
+from app_utils.ratelimit import RateLimiter
+from app_utils.sessions import SessionTracker
+from app_utils.storage import AudioStore, iter_file_range, media_type_for, parse_range
+from app_utils.streaming import AudioWindower, TranscriptStitcher
+from app_utils.uploads import (
+    UPLOAD_OPENAPI, SpooledUpload, UploadError, UploadLimitMiddleware, audio_part_check, sniff_audio_format,
+    sniff_video_format, spool_upload,
+)
+
 # Create the app
 app = modal.App("eveguard-backend")
 
@@ -9,85 +37,9 @@ MODEL_DIR = "/model"
 MODEL_NAME = "openai/whisper-medium"
 MARBERT_MODEL = "IbrahimAmin/marbertv2-finetuned-egyptian-hate-speech-detection"
 
-# Define bad words database with severity levels
+# Threat lexicon: terms per severity level, in lexicon.json (see LEXICON_PATH).
 # Level 1: Suspicious (0.3-0.5), Level 2: Warning (0.5-0.7), Level 3: Critical (0.7-1.0)
-BAD_WORDS_DATABASE = {
-    # Critical (Level 3) - Direct threats, violence, sexual assault
-    "critical": [
-        # English - Violence & Threats
-        "kill", "murder", "die", "death", "shoot", "stab", "attack",
-        "bomb", "weapon", "gun", "knife", "blood", "destroy", "rape",
-        "assault", "strangle", "suffocate", "torture", "hurt you",
-        "end your life", "finish you", "eliminate", "execute", "slaughter",
-        "butcher", "massacre", "decapitate", "dismember", "mutilate",
-        "molest", "abuse", "violate", "kidnap", "abduct",
-        # Arabic - Violence & Threats (عنف وتهديدات)
-        "اقتلك", "قتل", "موت", "اذبحك", "اطعنك", "اضربك", "هجوم",
-        "سلاح", "مسدس", "سكين", "دم", "تدمير", "اغتصاب", "اعتداء",
-        "خنق", "تعذيب", "اأذيك", "انهي حياتك", "اقضي عليك", "ذبح",
-        "مجزرة", "تحرش", "اختطاف", "اغتصبك", "اعدام", "سم", "حرق",
-        "اشعل فيك", "ادفنك", "انتقام بالدم"
-    ],
-    # Warning (Level 2) - Harassment, intimidation
-    "warning": [
-        # English - Harassment & Intimidation
-        "threat", "harm", "danger", "watch out", "careful", "regret",
-        "sorry", "pay for", "consequences", "revenge", "punish", "suffer",
-        "stalking", "following", "watching you", "find you", "know where",
-        "coming for", "wait for you", "get you", "teach you a lesson",
-        "hate", "ugly", "stupid", "idiot", "loser", "worthless", "useless",
-        "slap", "beat", "hit", "punch", "kick", "curse you", "damn you",
-        "whore", "bitch", "slut", "pig", "trash", "scum", "disgust",
-        # Arabic - Harassment & Intimidation (تحرش وتخويف)
-        "تهديد", "اذى", "خطر", "انتبه", "حذر", "ندم", "عواقب",
-        "انتقام", "عقاب", "معاناة", "مطاردة", "اتبعك", "اراقبك",
-        "اعرف مكانك", "جاي لك", "مستنيك", "هعلمك درس", "كره",
-        "قبيح", "غبي", "احمق", "فاشل", "تافه", "عديم القيمة",
-        "اضربك", "الطمك", "العنك", "شرموطة", "قحبة", "عاهرة",
-        "كلب", "حيوان", "زبالة", "قذر", "مقرف", "وسخ"
-    ],
-    # Suspicious (Level 1) - Concerning language
-    "suspicious": [
-        # English - Concerning Language
-        "angry", "mad", "upset", "furious", "annoyed", "frustrated",
-        "scared", "afraid", "worried", "anxious", "nervous", "uncomfortable",
-        "creepy", "weird", "strange", "stop", "leave me alone", "go away",
-        "don't touch", "back off", "personal space", "boundaries",
-        "following me", "watching me", "stalker", "harasser", "pervert",
-        "inappropriate", "uncomfortable", "threatening", "intimidating",
-        "aggressive", "violent", "scary", "frightening", "disturbing",
-        # Arabic - Concerning Language (لغة مقلقة)
-        "غضبان", "زعلان", "متضايق", "مجنون", "قلقان", "خايف",
-        "متوتر", "غير مرتاح", "مخيف", "غريب", "عجيب", "سيبني",
-        "ابعد عني", "متلمسنيش", "حدودك", "بيتبعني", "بيراقبني",
-        "متحرش", "منحرف", "غير لائق", "مهدد", "عدواني", "عنيف",
-        "مرعب", "مزعج", "مقلق", "بيضايقني", "مش طبيعي", "خطير"
-    ]
-}
-
-# Arabic-specific bad words database for better Arabic detection
-ARABIC_BAD_WORDS = {
-    "critical": [
-        "هقتلك", "هموتك", "هذبحك", "هغتصبك", "هحرقك", "هدمرك",
-        "يلعن ابوك", "يلعن امك", "ابن الشرموطة", "ابن القحبة",
-        "هنيكك", "هخرمك", "كسمك", "كس امك", "طيزك", "هفشخك",
-        "هشرمطك", "هعذبك", "هقطعك", "هكسرك", "ولد الزنا", "ابن الحرام",
-        "منيوك", "معرص", "ديوث", "قواد", "متناك", "خول"
-    ],
-    "warning": [
-        "يا حمار", "يا كلب", "يا حيوان", "يا زبالة", "يا قذر",
-        "يا واطي", "يا سافل", "يا حقير", "انت عار", "انت فضيحة",
-        "هفضحك", "هشوهك", "هخربلك", "هوريك", "مستنيك برا",
-        "عارف بيتك", "عارف شغلك", "هجيلك", "مش هسيبك", "هخليك تندم",
-        "يا جبان", "يا ضعيف", "يا مسخ", "يا عبيط", "يا هبلة"
-    ],
-    "suspicious": [
-        "بتعملي كده ليه", "بتبصلي ليه", "ايه نظراتك دي", "سيب ايدي",
-        "متقربش", "ابعد بقى", "كفاية بقى", "وقف عند حدك", "احترم نفسك",
-        "انا مش مرتاح", "حاسس بخطر", "في حاجة غلط", "مش طبيعي",
-        "خايفة منه", "بيخوفني", "بيهددني", "مش امان", "محتاج مساعدة"
-    ]
-}
+LEXICON_FILE = Path(__file__).parent / "lexicon.json"
 
 # Severity weights
 SEVERITY_WEIGHTS = {
@@ -96,50 +48,26 @@ SEVERITY_WEIGHTS = {
     "suspicious": 0.3
 }
 
-def detect_bad_words(text: str) -> List[Dict]:
+# Compiled once at import time and swapped for a new snapshot when the file
+# changes; single-script texts (nearly all of them) only scan their script's terms
+lexicon_store = LexiconStore(str(LEXICON_FILE), SEVERITY_WEIGHTS)
+
+def detect_bad_words(text: str, script: str = None, lexicon: LexiconSnapshot = None) -> List[Dict]:
     """
     Analyze text for bad words and return detailed analysis.
     Supports both English and Arabic languages.
     Returns list of detected words with their levels.
+    `script` is detect_script(text), if the caller already has it;
+    `lexicon` is the snapshot to use (default: the current one).
     """
-    text_lower = text.lower()
-    detected_words = []
-    
-    # Check main database (English + Arabic mixed)
-    for level, words in BAD_WORDS_DATABASE.items():
-        for word in words:
-            # Use word boundary matching for better accuracy
-            pattern = r'\b' + re.escape(word) + r'\b'
-            matches = re.findall(pattern, text_lower, re.IGNORECASE)
-            if matches:
-                for match in matches:
-                    detected_words.append({
-                        "word": match,
-                        "level": level,
-                        "weight": SEVERITY_WEIGHTS[level],
-                        "language": "mixed"
-                    })
-    
-    # Check Arabic-specific database (no word boundaries needed for Arabic)
-    for level, words in ARABIC_BAD_WORDS.items():
-        for word in words:
-            if word in text:
-                detected_words.append({
-                    "word": word,
-                    "level": level,
-                    "weight": SEVERITY_WEIGHTS[level],
-                    "language": "arabic"
-                })
-    
-    # Remove duplicates based on word
-    seen = set()
-    unique_words = []
-    for w in detected_words:
-        if w["word"] not in seen:
-            seen.add(w["word"])
-            unique_words.append(w)
-    
-    return unique_words
+    return (lexicon or lexicon_store.current).detect(text, script)
+
+def find_bad_word_matches(text: str) -> List[Dict]:
+    """
+    Return every bad word occurrence with its start/end offsets
+    (offsets refer to the lowercased text).
+    """
+    return lexicon_store.current.matcher.find_matches(text)
 
 def calculate_danger_score(detected_words: List[Dict], text: str) -> float:
     """
@@ -159,7 +87,23 @@ def calculate_danger_score(detected_words: List[Dict], text: str) -> float:
     critical_count = sum(1 for w in detected_words if w["level"] == "critical")
     warning_count = sum(1 for w in detected_words if w["level"] == "warning")
     suspicious_count = sum(1 for w in detected_words if w["level"] == "suspicious")
-    total_bad_words = len(detected_words)
+    
+    # Text density factor (ratio of bad words to total words)
+    text_word_count = max(len(text.split()), 1)
+    density_ratio = len(detected_words) / text_word_count
+    
+    return score_severity_counts(critical_count, warning_count, suspicious_count, density_ratio)
+
+def score_severity_counts(critical_count: float, warning_count: float, suspicious_count: float,
+                          density_ratio: float) -> float:
+    """
+    The weighting behind calculate_danger_score, from counts per severity
+    level and the share of flagged words. Counts may be fractional (the
+    decayed per-session counts).
+    """
+    total_bad_words = critical_count + warning_count + suspicious_count
+    if total_bad_words <= 0:
+        return 0.0
     
     # Base severity score with weighted importance
     # Critical words are exponentially more dangerous
@@ -170,10 +114,6 @@ def calculate_danger_score(detected_words: List[Dict], text: str) -> float:
     # Weighted combination (critical has highest priority)
     base_score = critical_score + (warning_score * 0.7) + (suspicious_score * 0.5)
     
-    # Text density factor (ratio of bad words to total words)
-    text_word_count = max(len(text.split()), 1)
-    density_ratio = total_bad_words / text_word_count
-    
     # Density multiplier: higher concentration = more dangerous
     # Short aggressive messages (e.g., "I'll kill you") should score high
     if density_ratio > 0.5:
@@ -208,7 +148,7 @@ def calculate_danger_score(detected_words: List[Dict], text: str) -> float:
     # Apply minimum thresholds based on severity found
     if critical_count >= 2:
         danger_score = max(danger_score, 0.85)  # Multiple critical = very dangerous
-    elif critical_count == 1:
+    elif critical_count >= 1:
         danger_score = max(danger_score, 0.6)   # Single critical = dangerous
     elif warning_count >= 3:
         danger_score = max(danger_score, 0.55)  # Multiple warnings = concerning
@@ -220,6 +160,15 @@ def calculate_danger_score(detected_words: List[Dict], text: str) -> float:
     # Cap at 1.0 and round
     return round(min(danger_score, 1.0), 3)
 
+def combine_scores(keyword_danger_score: float, sentiment_result: Dict) -> float:
+    """Fold the MARBERT result into the keyword danger score."""
+    # If MARBERT detects hate speech, boost the danger score
+    sentiment_boost = 0.3 if sentiment_result["is_hate"] else 0.0
+    combined_danger_score = min(1.0, keyword_danger_score + (sentiment_boost * sentiment_result["confidence"]))
+    
+    # Use the higher of the two scores
+    return max(keyword_danger_score, combined_danger_score)
+
 def get_risk_level(danger_score: float) -> str:
     """Convert danger score to risk level string."""
     if danger_score >= 0.7:
@@ -270,34 +219,116 @@ image = (
         "fastapi==0.115.0",
         "python-multipart==0.0.9",
         "sentencepiece==0.2.0",  # Required for MARBERT
+        "faster-whisper==1.0.3",  # CPU int8 ASR backend (ASR_BACKEND=faster-whisper)
+        "httpx==0.24.1",  # ESP32-CAM trigger dispatch
     )
     .env({"HF_HUB_CACHE": MODEL_DIR})
+    .add_local_file(Path(__file__).parent / "test.ogg", "/root/test.ogg")  # warmup clip
+    .add_local_file(LEXICON_FILE, "/root/lexicon.json")
+    .add_local_python_source("app_utils")
 )
 
 model_cache = modal.Volume.from_name("whisper-model-cache", create_if_missing=True)
 
+# Lexicon updates without a redeploy: `modal volume put eveguard-lexicon lexicon.json`
+# with LEXICON_PATH=/lexicon/lexicon.json
+LEXICON_VOLUME_DIR = "/lexicon"
+lexicon_volume = modal.Volume.from_name("eveguard-lexicon", create_if_missing=True)
+
 # Deploy the FastAPI app
 @app.function(
     image=image,
     gpu="A10G",
-    volumes={MODEL_DIR: model_cache},
+    volumes={MODEL_DIR: model_cache, LEXICON_VOLUME_DIR: lexicon_volume},
     cpu=2,
     memory=16384,
     timeout=600,
 )
 @modal.asgi_app()
 def fastapi_app():
-    from fastapi import FastAPI, File, UploadFile, HTTPException, Header
+    from fastapi import FastAPI, HTTPException, Header, Request, WebSocket
     from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse, Response, StreamingResponse
     from pydantic import BaseModel
-    import tempfile
+    import asyncio
+    import json
     import os
     import base64
-    import torch
-    from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
+    import threading
+    import time
+    from contextlib import asynccontextmanager
+    from app_utils.audio import (
+        TARGET_SAMPLE_RATE, decode_audio, decode_audio_file, load_warmup_clip, pcm16_to_float32,
+    )
+    from app_utils.vad import detect_speech, plan_chunks, vad_report
+    from app_utils.video import (
+        VideoDecodeError, analyze_frames, create_frame_analyzer, iter_audio_windows,
+    )
+    
+    log = setup_logging()
+    lifecycle = ModelLifecycle()
+    
+    # Per-stage timings, payload sizes and queue depths for GET /metrics
+    metrics = MetricsRegistry()
+    stage_seconds = metrics.histogram(
+        "eveguard_stage_seconds", "Time spent in each pipeline stage", ["stage"])
+    upload_bytes = metrics.histogram(
+        "eveguard_upload_bytes", "Size of uploaded audio files", buckets=SIZE_BUCKETS)
+    text_chars = metrics.histogram(
+        "eveguard_text_chars", "Length of analyzed texts in characters",
+        buckets=(16, 64, 256, 1024, 4096, 16384, 65536))
+    analyses_total = metrics.counter(
+        "eveguard_analyses_total", "Analyses by risk level and cascade exit", ["risk", "cascade_exit"])
+    
+    @asynccontextmanager
+    async def lifespan(app):
+        # Optional background preload + warmup; /ready stays 503 until done
+        if os.environ.get("PRELOAD_MODELS", "0") == "1":
+            lifecycle.start_preload([
+                ("preload_asr", lambda: models.load("asr")),
+                ("preload_classifier", lambda: models.load("classifier")),
+                ("warmup", warmup_models),
+            ])
+        # Background job workers; jobs cut off by a shutdown are re-queued on the next start
+        job_tasks = [asyncio.create_task(run_jobs()) for _ in range(job_workers)]
+        # Lexicon edits are picked up without a restart
+        if lexicon_reload_seconds > 0:
+            job_tasks.append(asyncio.create_task(watch_lexicon()))
+        yield
+        for task in job_tasks:
+            task.cancel()
+        await camera_dispatcher.aclose()
+        await asyncio.to_thread(heart_store.close)
+    
+    api = FastAPI(title="EVE-Guard API", version="2.0", lifespan=lifespan)
     
-    api = FastAPI(title="EVE-Guard API", version="2.0")
+    # Uploads are read in chunks: held in memory up to UPLOAD_SPOOL_BYTES,
+    # then spooled to disk, and refused past MAX_UPLOAD_BYTES (0 = no limit)
+    max_upload_bytes = int(os.environ.get("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+    upload_spool_bytes = int(os.environ.get("UPLOAD_SPOOL_BYTES", str(4 * 1024 * 1024)))
+    upload_spool_dir = os.environ.get("UPLOAD_SPOOL_DIR") or None
+    max_video_upload_bytes = int(os.environ.get("MAX_VIDEO_UPLOAD_BYTES", str(1024 * 1024 * 1024)))
     
+    # Oversized bodies get a 413 before they are received (slack for the multipart framing)
+    upload_limits = {("/transcribe", "/jobs"): max_upload_bytes, ("/analyze-video",): max_video_upload_bytes}
+    for paths, limit in upload_limits.items():
+        api.add_middleware(UploadLimitMiddleware, max_bytes=limit + 64 * 1024 if limit else 0, paths=paths)
+    
+    # Tokens are checked, and each parent held to its own rate and
+    # concurrency limits, before a request reaches its handler - so before
+    # its upload is read or any model runs
+    authenticator = Authenticator.from_env()
+    rate_limiter = RateLimiter(
+        rate_per_minute=float(os.environ.get("RATE_LIMIT_PER_MINUTE", "60")),
+        burst=int(os.environ.get("RATE_LIMIT_BURST", "20")),
+        max_concurrent=int(os.environ.get("RATE_LIMIT_CONCURRENCY", "4")),
+    )
+    api.add_middleware(
+        AuthMiddleware,
+        authenticator=authenticator,
+        limiter=rate_limiter,
+        limited_paths=("/transcribe", "/jobs", "/analyze-text", "/analyze-video", "/ws/transcribe"),
+    )
     # Add CORS middleware for Flutter app
     api.add_middleware(
         CORSMiddleware,
@@ -306,63 +337,221 @@ def fastapi_app():
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    api.add_middleware(
+        RequestMetricsMiddleware,
+        latency=metrics.histogram(
+            "eveguard_request_seconds", "HTTP request latency by route", ["method", "route", "status"]),
+        response_bytes=metrics.histogram(
+            "eveguard_response_bytes", "HTTP response body size by route", ["route"], buckets=SIZE_BUCKETS),
+    )
+    
+    @api.exception_handler(OverloadedError)
+    async def overloaded_handler(request: Request, exc: OverloadedError):
+        log.warning("Rejected request: %s", exc)
+        return JSONResponse(
+            status_code=503,
+            content={"detail": str(exc)},
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+    
+    @api.exception_handler(UploadError)
+    async def upload_error_handler(request: Request, exc: UploadError):
+        log.warning("Rejected upload: %s", exc)
+        return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
+    
+    async def read_upload(request: Request, sniff=sniff_audio_format, max_bytes: int = None,
+                          check=None) -> SpooledUpload:
+        """Spool the `file` part as it arrives (checked, sniffed and hashed on the way); raises UploadError."""
+        max_bytes = max_upload_bytes if max_bytes is None else max_bytes
+        with stage_seconds.time(stage="upload_read"):
+            upload = await spool_upload(request, "file", max_bytes, upload_spool_bytes, upload_spool_dir, sniff,
+                                        check)
+        upload_bytes.observe(upload.size)
+        return upload
     
     class TextAnalysisRequest(BaseModel):
         text: str
     
-    class ModelCache:
-        def __init__(self):
-            self.pipeline = None
-            self.sentiment_classifier = None
-        
-        def get_pipeline(self):
-            if self.pipeline is None:
-                print("Loading Whisper Medium model (GPU)...")
-                processor = AutoProcessor.from_pretrained(MODEL_NAME)
-                model = AutoModelForSpeechSeq2Seq.from_pretrained(
-                    MODEL_NAME,
-                    torch_dtype=torch.float16,
-                    low_cpu_mem_usage=True,
-                    use_safetensors=True,
-                ).to("cuda")
-                
-                self.pipeline = pipeline(
-                    "automatic-speech-recognition",
-                    model=model,
-                    tokenizer=processor.tokenizer,
-                    feature_extractor=processor.feature_extractor,
-                    torch_dtype=torch.float16,
-                    device="cuda",
-                )
-                print("Model loaded successfully!")
-            return self.pipeline
-        
-        def get_sentiment_classifier(self):
-            if self.sentiment_classifier is None:
-                print("Loading MARBERT hate speech classifier...")
-                self.sentiment_classifier = pipeline(
-                    "text-classification",
-                    model=MARBERT_MODEL,
-                    device="cuda"
-                )
-                print("MARBERT classifier loaded successfully!")
-            return self.sentiment_classifier
+    def load_asr_backend():
+        log.info("Loading Whisper Medium model...")
+        backend = lifecycle.timed("asr_load", create_asr_backend, MODEL_NAME, "medium")
+        log.info("Model loaded successfully! %s", backend.info)
+        return backend
+    
+    def load_text_classifier():
+        log.info("Loading MARBERT hate speech classifier...")
+        classifier = lifecycle.timed("classifier_load", create_classifier_backend, MARBERT_MODEL)
+        log.info("MARBERT classifier loaded successfully! %s", classifier.info)
+        return classifier
+    
+    # Backends are loaded on first use (device and precision picked at
+    # startup, see app_utils.backends) and unloaded again when over
+    # MODEL_MEMORY_BUDGET_MB or idle for MODEL_IDLE_SECONDS
+    models = ModelManager(
+        budget_mb=float(os.environ.get("MODEL_MEMORY_BUDGET_MB", "0")),
+        idle_seconds=float(os.environ.get("MODEL_IDLE_SECONDS", "0")),
+    )
+    models.register("asr", load_asr_backend)
+    models.register("classifier", load_text_classifier)
+    
+    def warmup_models():
+        """One real inference per model so the first request skips CUDA/ORT init."""
+        clip = load_warmup_clip(os.environ.get("WARMUP_AUDIO", os.path.join(os.path.dirname(__file__), "test.ogg")))
+        with models.use("asr") as asr_backend:
+            asr_backend.transcribe(clip)
+        with models.use("classifier") as classifier:
+            classifier.classify(["warmup"])
     
-    model_cache_instance = ModelCache()
+    # Uploaded recordings, addressed by SHA-256, served back by /audio/{id}
+    audio_store = AudioStore(os.environ.get("AUDIO_STORE_DIR", "/tmp/eveguard-audio"))
+    
+    # Results keyed by content hash + model, so retries and re-opened
+    # recordings skip Whisper/MARBERT; bump RESULT_CACHE_VERSION to invalidate
+    result_cache_version = os.environ.get("RESULT_CACHE_VERSION", "1")
+    transcription_cache = cache_from_env("transcriptions")
+    sentiment_cache = cache_from_env("sentiments")
+    backend_profiles = {"asr": asr_backend_profile(), "classifier": classifier_backend_profile()}
+    
+    def result_backend_tag(name: str) -> str:
+        """Backend and precision of model `name` for cache keys, without loading it."""
+        backend = models.loaded(name)
+        return backend_cache_tag(backend.info if backend is not None else backend_profiles[name])
+    
+    # Whisper runs here, off the event loop; excess requests get a fast 503
+    inference_pool = InferenceExecutor(
+        max_workers=int(os.environ.get("INFERENCE_WORKERS", "1")),
+        max_queue=int(os.environ.get("INFERENCE_QUEUE_SIZE", "8")),
+        name="whisper",
+    )
     
-    def transcribe_audio_file(audio_path: str) -> str:
-        pipe = model_cache_instance.get_pipeline()
-        result = pipe(audio_path)
-        return result["text"]
+    # The bundled lexicon.json unless LEXICON_PATH points elsewhere (e.g. at the
+    # eveguard-lexicon Volume); checked for changes every LEXICON_RELOAD_SECONDS
+    lexicon_path = os.environ.get("LEXICON_PATH")
+    lexicon_reload_seconds = float(os.environ.get("LEXICON_RELOAD_SECONDS", "30"))
+    if lexicon_path and lexicon_path != lexicon_store.path:
+        on_volume = lexicon_path.startswith(LEXICON_VOLUME_DIR + "/")
+        lexicon_store.watch(lexicon_path, refresh=lexicon_volume.reload if on_volume else None)
     
-    def analyze_sentiment(text: str) -> dict:
+    async def watch_lexicon():
+        while True:
+            await asyncio.sleep(lexicon_reload_seconds)
+            await asyncio.to_thread(lexicon_store.reload)
+    
+    # Requests routed by script and language, for /stats/routing
+    routing_stats = {
+        "scripts": {"arabic": 0, "latin": 0, "mixed": 0, "none": 0},
+        "marbert_skipped_not_arabic": 0,
+        "asr_language_hinted": 0,
+        "asr_language_detected": 0,
+    }
+    
+    def count_asr_language(language: str):
+        routing_stats["asr_language_hinted" if language else "asr_language_detected"] += 1
+    
+    def transcribe_audio_file(audio, language: str = None) -> str:
+        """`audio` is a file path or a 16 kHz mono float32 array."""
+        count_asr_language(language)
+        with models.use("asr") as backend:
+            return backend.transcribe(audio, language=language)
+    
+    # Energy VAD in front of Whisper: silence never reaches the GPU
+    vad_enabled = os.environ.get("VAD_ENABLED", "1") == "1"
+    
+    # Recordings longer than this are cut into chunks at silences and
+    # transcribed in batches; each chunk is scored on its own
+    long_audio_seconds = float(os.environ.get("LONG_AUDIO_MIN_SECONDS", "60"))
+    long_chunk_seconds = float(os.environ.get("LONG_AUDIO_CHUNK_SECONDS", "30"))
+    long_batch_size = int(os.environ.get("LONG_AUDIO_BATCH_SIZE", "16"))
+    
+    def transcribe_speech(audio, language: str = None) -> dict:
         """
-        Analyze text using MARBERT for hate speech detection.
-        Returns: label (HATE/NOT_HATE), score, is_hate boolean
+        Transcribe only the speech spans of a decoded array, batched, keeping
+        their original timestamps. No speech means no ASR call at all.
+        Long recordings are split into chunks of at most
+        LONG_AUDIO_CHUNK_SECONDS at silence boundaries (with or without VAD)
+        and returned with `long` set, so /transcribe builds a timeline.
+        With a `language` hint Whisper skips its own language detection.
+        """
+        long_mode = len(audio) > long_audio_seconds * TARGET_SAMPLE_RATE
+        if not vad_enabled and not long_mode:
+            with stage_seconds.time(stage="asr"):
+                return {"text": transcribe_audio_file(audio, language), "segments": None, "vad": None}
+        
+        if vad_enabled:
+            with stage_seconds.time(stage="vad"):
+                spans = detect_speech(audio, TARGET_SAMPLE_RATE)
+            vad = vad_report(spans, len(audio), TARGET_SAMPLE_RATE)
+            if not spans:
+                return {"text": "", "segments": [], "vad": vad, "long": long_mode}
+        else:
+            spans, vad = [(0, len(audio))], None
+        
+        batch_size = 8
+        if long_mode:
+            with stage_seconds.time(stage="chunking"):
+                spans = plan_chunks(audio, spans, TARGET_SAMPLE_RATE, long_chunk_seconds)
+            batch_size = long_batch_size
+        
+        count_asr_language(language)
+        with models.use("asr") as backend, stage_seconds.time(stage="asr"):
+            texts = backend.transcribe_batch([audio[start:end] for start, end in spans], batch_size=batch_size,
+                                             language=language)
+        segments = [
+            {
+                "start": round(start / TARGET_SAMPLE_RATE, 3),
+                "end": round(end / TARGET_SAMPLE_RATE, 3),
+                "text": text.strip(),
+            }
+            for (start, end), text in zip(spans, texts)
+        ]
+        text = " ".join(seg["text"] for seg in segments if seg["text"])
+        return {"text": text, "segments": segments, "vad": vad, "long": long_mode}
+    
+    def transcribe_pcm(pcm: bytes, language: str = None) -> str:
+        """Transcribe raw 16 kHz mono PCM s16le audio without touching disk."""
+        return transcribe_speech(pcm16_to_float32(pcm), language)["text"]
+    
+    def transcribe_upload(upload: SpooledUpload, language: str = None) -> dict:
+        """
+        Decode the upload (in memory, or from its spool file) and transcribe
+        its speech; only formats that cannot be decoded that way are handed
+        to the model as a file (no VAD).
         """
-        classifier = model_cache_instance.get_sentiment_classifier()
-        result = classifier(text)[0]
+        with stage_seconds.time(stage="decode"):
+            if upload.in_memory:
+                audio = decode_audio(upload.getvalue(), upload.suffix)
+            else:
+                audio = decode_audio_file(upload.path, upload.suffix)
+        if audio is not None:
+            return transcribe_speech(audio, language)
         
+        path = upload.ensure_file()
+        log.info("Decode failed, passing the file to the model: %s", path)
+        with stage_seconds.time(stage="asr"):
+            return {"text": transcribe_audio_file(path, language), "segments": None, "vad": None}
+    
+    # MARBERT time per text, to estimate what skipping non-Arabic text saves
+    marbert_usage = {"texts": 0, "seconds": 0.0}
+    
+    def classify_batch(texts: List[str]) -> List[dict]:
+        """Run MARBERT once over a padded batch of texts."""
+        with models.use("classifier") as classifier, stage_seconds.time(stage="marbert_batch"):
+            start = time.perf_counter()
+            results = classifier.classify(texts)
+        marbert_usage["seconds"] += time.perf_counter() - start
+        marbert_usage["texts"] += len(texts)
+        return results
+    
+    # Concurrent /analyze-text and /transcribe calls share MARBERT forward passes
+    sentiment_batcher = MicroBatcher(
+        classify_batch,
+        max_batch_size=int(os.environ.get("MARBERT_MAX_BATCH_SIZE", "16")),
+        max_wait_ms=float(os.environ.get("MARBERT_MAX_WAIT_MS", "10")),
+        max_queue=int(os.environ.get("MARBERT_MAX_QUEUE", "256")),
+        name="marbert-batcher",
+    )
+    
+    def sentiment_from_result(result: dict) -> dict:
         label = result["label"]
         score = result["score"]
         is_hate = label.upper() in ["HATE", "OFFENSIVE", "ABUSIVE", "1", "LABEL_1"]
@@ -374,8 +563,186 @@ def fastapi_app():
             "confidence": score if is_hate else 1 - score
         }
     
-    def verify_token(token: str) -> bool:
-        return bool(token)
+    def skipped_sentiment() -> dict:
+        """Neutral sentiment result for text that was not sent to MARBERT."""
+        return {"label": "SKIPPED", "score": 0.0, "is_hate": False, "confidence": 0.0}
+    
+    async def analyze_sentiment(text: str) -> dict:
+        """
+        Analyze text using MARBERT for hate speech detection.
+        Returns: label (HATE/NOT_HATE), score, is_hate boolean
+        """
+        key = cache_key("marbert", MARBERT_MODEL, result_backend_tag("classifier"), result_cache_version,
+                        normalize_text(text))
+        cached = await sentiment_cache.aget(key)
+        if cached is not None:
+            return cached
+        
+        # Includes the wait for a batch, which is where MARBERT's p99 comes from
+        with stage_seconds.time(stage="marbert"):
+            result = await asyncio.wrap_future(sentiment_batcher.submit(text))
+        sentiment = sentiment_from_result(result)
+        await sentiment_cache.aset(key, sentiment)
+        return sentiment
+    
+    def build_analysis(text: str, detected_words: List[Dict], sentiment_result: dict,
+                       cascade_exit: str = None, routing: dict = None, lexicon_version: str = None) -> dict:
+        """
+        Combine keyword detection and MARBERT output into the analysis
+        returned by /transcribe, /analyze-text and /analyze-text/batch.
+        """
+        with stage_seconds.time(stage="scoring"):
+            keyword_danger_score = calculate_danger_score(detected_words, text)
+            danger_score = combine_scores(keyword_danger_score, sentiment_result)
+            
+            risk_level = get_risk_level(danger_score)
+            risk_message = get_risk_message(risk_level, detected_words, danger_score)
+        analyses_total.inc(risk=risk_level, cascade_exit=cascade_exit or "none")
+        
+        return {
+            "danger_score": danger_score,
+            "risk": risk_level,
+            "message": risk_message,
+            "detected_words": detected_words,
+            "word_count": len(detected_words),
+            "critical_count": sum(1 for w in detected_words if w["level"] == "critical"),
+            "warning_count": sum(1 for w in detected_words if w["level"] == "warning"),
+            "suspicious_count": sum(1 for w in detected_words if w["level"] == "suspicious"),
+            "sentiment_analysis": {
+                "model": "MARBERT (Egyptian Hate Speech)",
+                "label": sentiment_result["label"],
+                "score": sentiment_result["score"],
+                "is_hate": sentiment_result["is_hate"],
+                "confidence": sentiment_result["confidence"]
+            },
+            "stages": ["keywords", "scoring"] if cascade_exit else ["keywords", "marbert", "scoring"],
+            "cascade_exit": cascade_exit,
+            "routing": routing,
+            "lexicon_version": lexicon_version
+        }
+    
+    # Cheap stages first; MARBERT only when the keyword score is not decisive
+    cascade = CascadePolicy.from_env()
+    
+    # ESP32-CAM to open when an analysis reaches the danger level: ESP_URL
+    # for everyone, or per parent via ESP_DEVICES ({"parent_id": url})
+    esp_default_url = os.environ.get("ESP_URL")
+    esp_devices = json.loads(os.environ.get("ESP_DEVICES") or "{}")
+    camera_dispatcher = CameraDispatcher(
+        api_key=os.environ.get("ESP_API_KEY", ""),
+        coalesce_seconds=float(os.environ.get("ESP_COALESCE_SECONDS", "30")),
+        retries=int(os.environ.get("ESP_RETRIES", "3")),
+        timeout=float(os.environ.get("ESP_TIMEOUT_SECONDS", "5")),
+    )
+    
+    def trigger_camera(risk: str, parent_id: str, source: str) -> bool:
+        """Schedule an open_camera command for danger-level results; never waits on the ESP."""
+        if risk != "danger":
+            return False
+        url = esp_devices.get(parent_id) or esp_default_url
+        if not url:
+            return False
+        return camera_dispatcher.trigger(url, {"source": source, "parent_id": parent_id})
+    
+    # Threat escalation across a conversation, keyed by the authenticated
+    # parent and X-Session-Id (else the parent alone); repeated low-level
+    # messages add up, old ones decay
+    sessions = SessionTracker(
+        score_severity_counts,
+        half_life_seconds=float(os.environ.get("SESSION_HALF_LIFE_SECONDS", "900")),
+        idle_seconds=float(os.environ.get("SESSION_IDLE_SECONDS", "3600")),
+        max_sessions=int(os.environ.get("SESSION_MAX", "100000")),
+        escalation_ratio=float(os.environ.get("SESSION_ESCALATION_RATIO", "5")),
+    )
+    
+    def track_session(parent_id: str, session_id: str, text: str, analysis: dict):
+        """
+        Add the analysis of `text` to the parent's session (X-Session-Id, else
+        the parent itself) and return the session-level risk (None without one).
+        """
+        session_id = session_id or parent_id
+        if not session_id:
+            return None
+        session = sessions.update(session_id, analysis["detected_words"], parent_id=parent_id,
+                                  word_count=len(text.split()), message_score=analysis["danger_score"])
+        session["risk"] = get_risk_level(session["danger_score"])
+        return session
+    
+    async def analyze_content(text: str, lexicon: LexiconSnapshot = None) -> dict:
+        """
+        Run the analysis cascade on one text and build its analysis. The
+        text's script picks the lexicon partition, and MARBERT (an Arabic
+        model) only sees text with Arabic in it. `lexicon` pins the lexicon
+        snapshot (default: the current one).
+        """
+        lexicon = lexicon or lexicon_store.current
+        text_chars.observe(len(text))
+        with stage_seconds.time(stage="keywords"):
+            script = detect_script(text)
+            detected_words = detect_bad_words(text, script, lexicon)
+            keyword_danger_score = calculate_danger_score(detected_words, text)
+        routing_stats["scripts"][script] += 1
+        cascade_exit = cascade.exit_reason(text, keyword_danger_score, script)
+        if cascade_exit:
+            sentiment_result = skipped_sentiment()
+            if cascade_exit == "not_arabic":
+                routing_stats["marbert_skipped_not_arabic"] += 1
+        else:
+            sentiment_result = await analyze_sentiment(text)
+        partition, matcher = lexicon.for_script(script)
+        routing = {"script": script, "lexicon": partition, "lexicon_terms": len(matcher)}
+        return build_analysis(text, detected_words, sentiment_result, cascade_exit, routing, lexicon.version)
+    
+    def keyword_analysis(text: str, lexicon: LexiconSnapshot = None) -> dict:
+        lexicon = lexicon or lexicon_store.current
+        with stage_seconds.time(stage="keywords"):
+            detected_words = detect_bad_words(text, detect_script(text), lexicon)
+            danger_score = calculate_danger_score(detected_words, text)
+        risk_level = get_risk_level(danger_score)
+        return {
+            "detected_words": detected_words,
+            "danger_score": danger_score,
+            "risk": risk_level,
+            "message": get_risk_message(risk_level, detected_words, danger_score),
+            "lexicon_version": lexicon.version,
+        }
+    
+    def threat_timeline(segments: List[Dict], lexicon: LexiconSnapshot = None) -> dict:
+        """
+        Keyword-score each chunk of a long recording on its own, so a threat
+        inside a long benign conversation is not diluted by the word count of
+        the whole transcript. Returns the timeline and its peak chunk.
+        """
+        timeline = []
+        for seg in segments:
+            if not seg["text"]:
+                continue
+            result = keyword_analysis(seg["text"], lexicon)
+            timeline.append({
+                "start": seg["start"],
+                "end": seg["end"],
+                "text": seg["text"],
+                "detected_words": result["detected_words"],
+                "danger_score": result["danger_score"],
+                "risk": result["risk"],
+            })
+        peak = max(timeline, key=lambda seg: seg["danger_score"], default=None)
+        if peak is not None:
+            peak = {key: peak[key] for key in ("start", "end", "danger_score", "risk")}
+        return {"timeline": timeline, "peak": peak}
+    
+    def raise_to_peak(analysis: dict, peak: dict) -> dict:
+        """The recording is at least as dangerous as its worst chunk."""
+        if peak is None or peak["danger_score"] <= analysis["danger_score"]:
+            return analysis
+        danger_score = peak["danger_score"]
+        risk_level = get_risk_level(danger_score)
+        return {
+            **analysis,
+            "danger_score": danger_score,
+            "risk": risk_level,
+            "message": get_risk_message(risk_level, analysis["detected_words"], danger_score),
+        }
     
     @api.get("/")
     async def root():
@@ -384,173 +751,957 @@ def fastapi_app():
             "version": "2.0",
             "endpoints": [
                 "/transcribe - Speech to text with threat analysis",
+                "/audio/{audio_id} - Stored recording (ETag + Range)",
+                "/jobs - Queue a recording for background transcription (poll or SSE for the result)",
+                "/ws/transcribe - Live speech to text with rolling threat analysis (WebSocket)",
                 "/analyze-text - Text threat analysis",
-                "/analyze-video - Video analysis (placeholder)"
+                "/analyze-text/batch - Bulk text threat analysis (NDJSON out)",
+                "/analyze-video - Video analysis: audio-track threats plus sampled-frame analysis",
+                "/heart-alert - Heart-rate readings and alerts from ESP32 wearables",
+                "/heart-rate/{device_id} - Recent readings of a device",
+                "/heart-rate/{device_id}/summary - Windowed heart-rate aggregates",
+                "/health - Liveness and model load timings",
+                "/ready - Readiness (after preload/warmup)",
+                "/stats/batching - MARBERT micro-batching stats",
+                "/stats/inference - Whisper worker pool stats",
+                "/stats/cache - Result cache hit/miss counters",
+                "/stats/models - Loaded models and the memory budget",
+                "/stats/sessions - Conversation escalation sessions",
+                "/stats/routing - Script/language routing and the MARBERT time it saved",
+                "/stats/lexicon - Lexicon version, term counts and reloads",
+                "/stats/jobs - Background job queue stats",
+                "/stats/auth - Token cache and per-parent rate limiting",
+                "/stats/heart - Heart-rate ingestion queue and write stats",
+                "/stats/esp - ESP32-CAM trigger dispatch stats",
+                "/metrics - Prometheus metrics (stage latencies, queues, payload sizes)"
             ]
         }
     
+    @api.get("/health")
+    async def health():
+        """Liveness plus model load/warmup timings and the selected backends."""
+        return {
+            **lifecycle.health(),
+            "models": {
+                "asr": models.loaded("asr").info if models.loaded("asr") else None,
+                "classifier": models.loaded("classifier").info if models.loaded("classifier") else None,
+            },
+        }
+    
+    @api.get("/ready")
+    async def ready():
+        """503 until preload and warmup have finished (when PRELOAD_MODELS=1)."""
+        if not lifecycle.ready:
+            return JSONResponse(status_code=503, content={"ready": False, "errors": lifecycle.errors})
+        return {"ready": True}
+    
+    @api.get("/stats/cache")
+    async def cache_stats():
+        """Hit/miss counters of the transcription and sentiment result caches."""
+        return {
+            "transcriptions": transcription_cache.stats(),
+            "sentiments": sentiment_cache.stats(),
+        }
+    
+    @api.get("/stats/inference")
+    async def inference_stats():
+        """Queue depth, rejections and wait times of the Whisper worker pool."""
+        return inference_pool.stats()
+    
+    @api.get("/stats/batching")
+    async def batching_stats():
+        """Batch-size distribution and queue wait of the MARBERT batcher."""
+        return sentiment_batcher.stats()
+    
+    @api.get("/stats/esp")
+    async def esp_stats():
+        """Camera triggers sent, coalesced, retried and failed."""
+        return camera_dispatcher.stats()
+    
+    @api.get("/stats/models")
+    async def model_stats():
+        """Resident models, their measured sizes, use counts and evictions against the memory budget."""
+        return models.stats()
+    
+    @api.get("/stats/sessions")
+    async def session_stats():
+        """Tracked conversation sessions, updates and idle evictions."""
+        return sessions.stats()
+    
+    @api.get("/stats/auth")
+    async def auth_stats():
+        """Token verification cache and per-parent rate/concurrency limit counters."""
+        return {"auth": authenticator.stats(), "rate_limit": rate_limiter.stats()}
+    
+    @api.get("/stats/routing")
+    async def routing_stats_endpoint():
+        """
+        Texts by detected script, MARBERT calls skipped because a text had
+        no Arabic (and the MARBERT time that saved, at the measured mean per
+        text), and transcriptions with and without a language hint.
+        """
+        texts, seconds = marbert_usage["texts"], marbert_usage["seconds"]
+        per_text = seconds / texts if texts else 0.0
+        skipped = routing_stats["marbert_skipped_not_arabic"]
+        return {
+            **routing_stats,
+            "scripts": dict(routing_stats["scripts"]),
+            "marbert_seconds_per_text": round(per_text, 6),
+            "marbert_seconds_saved": round(skipped * per_text, 3),
+            "arabic_only": cascade.arabic_only,
+            "default_asr_language": asr_language(),
+        }
+    
+    @api.get("/stats/lexicon")
+    async def lexicon_stats():
+        """The lexicon snapshot in use (version, hash, terms per partition) and reload counters."""
+        return {**lexicon_store.stats(), "reload_seconds": lexicon_reload_seconds}
+    
+    # Read from the components' own stats at scrape time
+    metrics.gauge("eveguard_model_load_seconds", "Duration of each model load and warmup step", ["step"],
+                  callback=lambda: dict(lifecycle.timings))
+    metrics.gauge("eveguard_queue_depth", "Work waiting for a worker or batch", ["queue"],
+                  callback=lambda: {"whisper": inference_pool.stats()["queue_depth"],
+                                    "marbert": sentiment_batcher.stats()["queue_depth"]})
+    metrics.gauge("eveguard_inference_running", "Transcriptions running on the worker pool",
+                  callback=lambda: inference_pool.stats()["running"])
+    metrics.counter("eveguard_rejected_total", "Requests rejected by admission control", ["queue"],
+                    callback=lambda: {"whisper": inference_pool.stats()["rejected"],
+                                      "marbert": sentiment_batcher.stats()["rejected"]})
+    metrics.counter("eveguard_cache_lookups_total", "Result cache lookups", ["cache", "result"],
+                    callback=lambda: {
+                        (cache.name, result): cache.stats()[result]
+                        for cache in (transcription_cache, sentiment_cache)
+                        for result in ("memory_hits", "disk_hits", "misses")
+                    })
+    metrics.counter("eveguard_camera_triggers_total", "ESP32-CAM open_camera triggers by outcome", ["outcome"],
+                    callback=lambda: {k: v for k, v in camera_dispatcher.stats().items()
+                                      if k in ("triggered", "coalesced", "sent", "failed", "retried")})
+    metrics.gauge("eveguard_model_resident_mb", "Measured size of each loaded model in MiB (0 when unloaded)",
+                  ["model"], callback=lambda: {name: m["size_mb"] if m["loaded"] else 0
+                                               for name, m in models.stats()["models"].items()})
+    metrics.counter("eveguard_model_evictions_total", "Models unloaded for the memory budget or idleness",
+                    ["model"], callback=lambda: {name: m["evictions"] for name, m in models.stats()["models"].items()})
+    metrics.gauge("eveguard_sessions", "Conversation sessions tracked for escalation",
+                  callback=lambda: len(sessions))
+    metrics.counter("eveguard_auth_rejected_total", "Requests rejected for an invalid token",
+                    callback=lambda: authenticator.stats()["rejected"])
+    metrics.counter("eveguard_rate_limited_total", "Requests rejected by per-parent limits", ["limit"],
+                    callback=lambda: {"rate": rate_limiter.stats()["rate_limited"],
+                                      "concurrency": rate_limiter.stats()["concurrency_limited"]})
+    metrics.counter("eveguard_lexicon_reloads_total", "Lexicon file reloads by outcome", ["result"],
+                    callback=lambda: {"loaded": lexicon_store.reloads, "failed": lexicon_store.failures})
+    metrics.counter("eveguard_texts_by_script_total", "Analyzed texts by detected script", ["script"],
+                    callback=lambda: dict(routing_stats["scripts"]))
+    metrics.counter("eveguard_log_records_dropped_total", "Log records dropped because the log queue was full",
+                    callback=dropped_log_records)
+    
+    @api.get("/metrics")
+    async def prometheus_metrics():
+        """Stage latencies, request latencies, payload sizes and queue depths (Prometheus format)."""
+        return Response(metrics.render(), media_type=CONTENT_TYPE)
+    
     # ============================================
     # ENDPOINT 1: Speech to Text + Threat Analysis
     # ============================================
-    @api.post("/transcribe")
+    def store_upload(upload: SpooledUpload) -> str:
+        with upload.open() as f:
+            return audio_store.put_stream(f, upload.suffix, upload.audio_id)
+    
+    async def process_recording(upload: SpooledUpload, parent_id: str, source: str,
+                                session_id: str = None, on_stage=None, language: str = None) -> dict:
+        """
+        Transcribe, analyze and store one recording; the result body of
+        /transcribe and of finished jobs. `on_stage`, if given, is awaited
+        with the name of each step as it starts. `language` is the Whisper
+        language hint (None lets Whisper detect it).
+        """
+        audio_id = upload.audio_id
+        asr_key = cache_key("asr", MODEL_NAME, result_backend_tag("asr"), result_cache_version,
+                            f"vad={vad_enabled}", f"long={long_audio_seconds}/{long_chunk_seconds}",
+                            f"lang={language}", audio_id)
+        transcription = await transcription_cache.aget(asr_key)
+        if transcription is None:
+            # Transcribe audio (decoded in memory on the worker pool)
+            if on_stage:
+                await on_stage("transcribing")
+            transcription = await inference_pool.run(transcribe_upload, upload, language)
+            await transcription_cache.aset(asr_key, transcription)
+        else:
+            log.debug("Transcription cache hit: %s", audio_id)
+        text = transcription["text"]
+        # Transcripts only at DEBUG: they are private and can be long
+        log.info("Transcribed %s: %d bytes -> %d chars", audio_id[:12], upload.size, len(text))
+        log.debug("Transcription result: %s", text)
+        if transcription["vad"]:
+            log.debug("VAD skipped %ss of %ss", transcription["vad"]["skipped_seconds"],
+                      transcription["vad"]["audio_seconds"])
+        
+        # Analyze for threats: keyword detection, then MARBERT if still needed
+        # (an empty transcript never reaches MARBERT)
+        if on_stage:
+            await on_stage("analyzing")
+        # One lexicon snapshot for the transcript and its timeline, even across a reload
+        lexicon = lexicon_store.current
+        analysis = await analyze_content(text, lexicon)
+        timeline = None
+        if transcription.get("long"):
+            timeline = threat_timeline(transcription["segments"], lexicon)
+            analysis = raise_to_peak(analysis, timeline["peak"])
+        
+        with stage_seconds.time(stage="store"):
+            await asyncio.to_thread(store_upload, upload)
+        
+        response = {
+            "transcription": text,
+            "audio_id": audio_id,
+            "audio_url": f"/audio/{audio_id}",
+            "audio_format": upload.suffix.replace(".", ""),
+            "speech_segments": transcription["segments"],
+            "vad": transcription["vad"],
+            "asr_language": language,
+            "analysis": analysis,
+            "camera_triggered": trigger_camera(analysis["risk"], parent_id, source),
+            "session": track_session(parent_id, session_id, text, analysis)
+        }
+        if timeline is not None:
+            response["timeline"] = timeline["timeline"]
+            response["peak"] = timeline["peak"]
+        return response
+    
+    def language_hint(language: str = None) -> str:
+        """The request's Whisper language (else ASR_LANGUAGE); 400 if unsupported."""
+        try:
+            return asr_language(language)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    @api.post("/transcribe", openapi_extra=UPLOAD_OPENAPI)
     async def transcribe(
-        file: UploadFile = File(...),
-        authorization: str = Header(None)
+        request: Request,
+        x_parent_id: str = Header(None),
+        x_session_id: str = Header(None),
+        include_audio: bool = False,
+        language: str = None
     ):
         """
         Transcribe audio and analyze for threats.
         Returns: transcription, detected words, danger score (0-1), risk level
+        The audio is kept in the audio store and referenced by `audio_id`;
+        pass `?include_audio=true` to also get it back as base64.
+        Recordings longer than LONG_AUDIO_MIN_SECONDS also get a `timeline`
+        of per-chunk keyword scores and its `peak`. `?language=ar` (or en)
+        skips Whisper's language detection.
+        """
+        language = language_hint(language)
+        
+        # Reject before spooling the upload if the pool is already full
+        inference_pool.ensure_capacity()
+        
+        with await read_upload(request, check=audio_part_check()) as upload:
+            log.debug("Received file: %s (content_type=%s)", upload.filename, upload.content_type)
+            response = await process_recording(upload, x_parent_id, "transcribe", x_session_id,
+                                               language=language)
+            if include_audio:
+                # Opt-in echo for older clients; the only whole-file copy in memory
+                audio_bytes = await asyncio.to_thread(upload.getvalue)
+                response["audio_base64"] = base64.b64encode(audio_bytes).decode('utf-8')
+        with stage_seconds.time(stage="serialize"):
+            return JSONResponse(response)
+    
+    # ============================================
+    # Stored audio (ETag + HTTP Range)
+    # ============================================
+    @api.get("/audio/{audio_id}")
+    async def get_audio(
+        audio_id: str,
+        range_header: str = Header(None, alias="Range"),
+        if_none_match: str = Header(None)
+    ):
+        """Serve a stored recording with ETag and byte-range support for seeking."""
+        
+        path = audio_store.find(audio_id)
+        if path is None:
+            raise HTTPException(status_code=404, detail="Audio not found")
+        
+        etag = f'"{audio_id}"'
+        headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "private, max-age=31536000, immutable"}
+        if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+        
+        size = os.path.getsize(path)
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        
+        if byte_range is None:
+            start, end, status_code = 0, size - 1, 200
+        else:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        
+        return StreamingResponse(
+            iter_file_range(path, start, end),
+            status_code=status_code,
+            media_type=media_type_for(path),
+            headers=headers,
+        )
+    
+    # ============================================
+    # ENDPOINT 1c: Background Jobs (durable queue)
+    # ============================================
+    # Heavy uploads return a job ID at once; workers take jobs from SQLite
+    # by priority, so queued work and results survive restarts
+    job_queue = JobQueue(
+        os.environ.get("JOB_DB", "/tmp/eveguard-jobs.db"),
+        max_queued=int(os.environ.get("JOB_MAX_QUEUED", "1000")),
+        max_attempts=int(os.environ.get("JOB_MAX_ATTEMPTS", "3")),
+        retention_days=float(os.environ.get("JOB_RETENTION_DAYS", "7")),
+    )
+    job_workers = int(os.environ.get("JOB_WORKERS", "1"))
+    job_poll_seconds = float(os.environ.get("JOB_POLL_SECONDS", "1"))
+    job_submitted = asyncio.Event()
+    
+    metrics.gauge("eveguard_jobs", "Background jobs by status", ["status"],
+                  callback=lambda: {status: count for status, count in job_queue.stats().items()
+                                    if status in ("queued", "running", "done", "failed")})
+    
+    async def run_job(job: dict):
+        params = job["params"]
+        
+        async def on_stage(stage: str):
+            await asyncio.to_thread(job_queue.progress, job["job_id"], stage)
+        
+        path = audio_store.find(params["audio_id"])
+        if path is None:
+            await asyncio.to_thread(job_queue.fail, job["job_id"], "Audio is no longer stored")
+            return
+        upload = await asyncio.to_thread(SpooledUpload.from_file, path, params["audio_id"])
+        result = await process_recording(upload, params["parent_id"], "jobs",
+                                         session_id=params.get("session_id"), on_stage=on_stage,
+                                         language=params.get("language"))
+        await asyncio.to_thread(job_queue.complete, job["job_id"], result)
+        log.info("Job %s done (%s)", job["job_id"], result["analysis"]["risk"])
+    
+    async def run_jobs():
+        """Worker loop: claim the most urgent queued job, run it, repeat."""
+        while True:
+            job_submitted.clear()
+            job = await asyncio.to_thread(job_queue.claim)
+            if job is None:
+                try:
+                    await asyncio.wait_for(job_submitted.wait(), timeout=job_poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await run_job(job)
+            except OverloadedError as e:
+                # The pool is busy with live requests; try again shortly
+                await asyncio.to_thread(job_queue.release, job["job_id"])
+                await asyncio.sleep(e.retry_after)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.exception("Job %s failed", job["job_id"])
+                await asyncio.to_thread(job_queue.fail, job["job_id"], repr(e))
+    
+    @api.post("/jobs", status_code=202, openapi_extra=UPLOAD_OPENAPI)
+    async def submit_job(
+        request: Request,
+        x_parent_id: str = Header(None),
+        x_session_id: str = Header(None),
+        priority: str = "normal",
+        language: str = None
+    ):
+        """
+        Queue a recording for transcription and analysis and return its job
+        ID right away. `priority` is one of sos, high, normal or low; sos
+        recordings run before everything else. `language` is the Whisper
+        language hint, as for /transcribe. Follow the job with
+        GET /jobs/{job_id} or the events stream at /jobs/{job_id}/events.
         """
-        print(f"[LOG] Received file: {file.filename} (content_type={file.content_type})")
+        if priority not in PRIORITIES:
+            raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(PRIORITIES)}")
+        language = language_hint(language)
         
-        if authorization and not verify_token(authorization.replace("Bearer ", "")):
-            print("[LOG] Invalid token")
-            raise HTTPException(status_code=401, detail="Invalid token")
+        # The audio store is the durable copy the worker reads back
+        with await read_upload(request, check=audio_part_check()) as upload:
+            with stage_seconds.time(stage="store"):
+                audio_id = await asyncio.to_thread(store_upload, upload)
+            suffix = upload.suffix
+        job = await asyncio.to_thread(
+            job_queue.submit, "transcribe",
+            {"audio_id": audio_id, "suffix": suffix, "parent_id": x_parent_id, "session_id": x_session_id,
+             "language": language},
+            PRIORITIES[priority],
+        )
+        job_submitted.set()
+        return {
+            **job,
+            "status_url": f"/jobs/{job['job_id']}",
+            "events_url": f"/jobs/{job['job_id']}/events",
+        }
+    
+    @api.get("/jobs/{job_id}")
+    async def get_job(job_id: str):
+        """Status, current stage and, once done, the /transcribe result of a job."""
+        job = await asyncio.to_thread(job_queue.get, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+    
+    @api.get("/jobs/{job_id}/events")
+    async def job_events(job_id: str):
+        """
+        Server-Sent Events for one job: a `progress` event whenever its
+        status or stage changes, then one `done` or `failed` event with the
+        full job, after which the stream ends.
+        """
+        job = await asyncio.to_thread(job_queue.get, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
         
-        allowed_extensions = ('.ogg', '.mp3', '.wav', '.m4a', '.flac')
-        if not file.content_type.startswith("audio/") and not file.filename.lower().endswith(allowed_extensions):
-            print(f"[LOG] Rejected non-audio file upload: {file.content_type} {file.filename}")
-            raise HTTPException(status_code=400, detail="File must be audio")
+        async def events():
+            nonlocal job
+            last_state, last_sent = None, time.monotonic()
+            while True:
+                state = (job["status"], job["stage"])
+                if state != last_state:
+                    last_state, last_sent = state, time.monotonic()
+                    event = job["status"] if job["status"] in TERMINAL else "progress"
+                    yield f"event: {event}\ndata: {json.dumps(job)}\n\n"
+                    if job["status"] in TERMINAL:
+                        return
+                elif time.monotonic() - last_sent > 15:
+                    # Keeps proxies from closing an idle stream
+                    last_sent = time.monotonic()
+                    yield ": keep-alive\n\n"
+                await asyncio.sleep(job_poll_seconds / 2)
+                job = await asyncio.to_thread(job_queue.get, job_id)
         
-        audio_bytes = await file.read()
-        suffix = os.path.splitext(file.filename)[1] or ".wav"
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    
+    @api.get("/stats/jobs")
+    async def job_stats():
+        """Queued/running/finished jobs, the age of the oldest queued one and rejections."""
+        return {**await asyncio.to_thread(job_queue.stats), "workers": job_workers}
+    
+    # ============================================
+    # ENDPOINT 1b: Live Transcription (WebSocket)
+    # ============================================
+    stream_window_seconds = float(os.environ.get("STREAM_WINDOW_SECONDS", "8"))
+    stream_step_seconds = float(os.environ.get("STREAM_STEP_SECONDS", "3"))
+    stream_max_pending = int(os.environ.get("STREAM_MAX_PENDING_WINDOWS", "4"))
+    
+    @api.websocket("/ws/transcribe")
+    async def transcribe_stream(websocket: WebSocket):
+        """
+        Live transcription with a rolling danger score.
+        Send 16 kHz mono PCM s16le audio as binary frames while recording,
+        then the text message "end". Every STREAM_STEP_SECONDS of audio the
+        last STREAM_WINDOW_SECONDS are transcribed and a "partial" message is
+        pushed with the new text and keyword analysis of that window; "alert"
+        is true as soon as a window reaches the danger level. After "end" a
+        "final" message scores the whole stitched transcript. The `language`
+        query parameter is the Whisper language hint, as for /transcribe.
+        """
+        # AuthMiddleware checked ?token= and set X-Parent-Id from it (absent without a parent)
+        parent_id = websocket.headers.get("x-parent-id")
+        try:
+            language = asr_language(websocket.query_params.get("language"))
+        except ValueError:
+            await websocket.close(code=1008)
+            return
+        await websocket.accept()
+        log.info("Live transcription session started")
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as f:
-            f.write(audio_bytes)
-            temp_path = f.name
+        windower = AudioWindower(
+            sample_rate=16000,
+            window_seconds=stream_window_seconds,
+            step_seconds=stream_step_seconds,
+        )
+        stitcher = TranscriptStitcher()
+        # Bounded, so a client sending audio faster than it is transcribed
+        # cannot grow memory; the oldest waiting window gives way to the newest
+        pending = asyncio.Queue(maxsize=max(1, stream_max_pending))
+        dropped_windows = 0
+        peak_danger_score = 0.0
         
-        print(f"[LOG] Saved file to: {temp_path}")
+        def enqueue(window):
+            nonlocal dropped_windows
+            if pending.full():
+                pending.get_nowait()
+                dropped_windows += 1
+            pending.put_nowait(window)
         
+        async def process_windows():
+            nonlocal peak_danger_score
+            while True:
+                window = await pending.get()
+                if window is None:
+                    return
+                start, end, pcm = window
+                try:
+                    window_text = await inference_pool.run(transcribe_pcm, pcm, language)
+                except OverloadedError as e:
+                    await websocket.send_json({
+                        "type": "error",
+                        "detail": str(e),
+                        "retry_after": e.retry_after,
+                        "window": {"start": start, "end": end},
+                    })
+                    continue
+                new_text = stitcher.add(window_text)
+                analysis = keyword_analysis(window_text)
+                peak_danger_score = max(peak_danger_score, analysis["danger_score"])
+                await websocket.send_json({
+                    "type": "partial",
+                    "window": {"start": start, "end": end},
+                    "text": new_text,
+                    "window_text": window_text,
+                    "transcript": stitcher.text,
+                    "analysis": analysis,
+                    "peak_danger_score": peak_danger_score,
+                    "alert": analysis["risk"] == "danger",
+                    "camera_triggered": trigger_camera(analysis["risk"], parent_id, "live"),
+                    "lag_seconds": round(windower.seconds_received - end, 3),
+                    "dropped_windows": dropped_windows,
+                })
+        
+        worker = asyncio.create_task(process_windows())
         try:
-            # Transcribe audio
-            print(f"[LOG] Starting transcription")
-            text = transcribe_audio_file(temp_path)
-            print(f"[LOG] Transcription result: {text}")
-            
-            # Analyze for threats using keyword detection
-            detected_words = detect_bad_words(text)
-            keyword_danger_score = calculate_danger_score(detected_words, text)
-            
-            # Analyze sentiment using MARBERT model
-            sentiment_result = analyze_sentiment(text)
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    worker.cancel()
+                    log.info("Live transcription client disconnected")
+                    return
+                if message.get("bytes"):
+                    for window in windower.feed(message["bytes"]):
+                        enqueue(window)
+                elif (message.get("text") or "").strip().lower() == "end":
+                    break
             
-            # Combine scores
-            sentiment_boost = 0.3 if sentiment_result["is_hate"] else 0.0
-            combined_danger_score = min(1.0, keyword_danger_score + (sentiment_boost * sentiment_result["confidence"]))
-            danger_score = max(keyword_danger_score, combined_danger_score)
+            final_window = windower.flush()
+            if final_window:
+                enqueue(final_window)
+            await pending.put(None)
+            await worker
             
-            risk_level = get_risk_level(danger_score)
-            risk_message = get_risk_message(risk_level, detected_words, danger_score)
-            
-            # Encode audio as base64 for returning to client
-            audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
-            
-            return {
-                "transcription": text,
-                "audio_base64": audio_base64,
-                "audio_format": suffix.replace(".", ""),
-                "analysis": {
-                    "detected_words": detected_words,
-                    "danger_score": danger_score,
-                    "risk": risk_level,
-                    "message": risk_message,
-                    "word_count": len(detected_words),
-                    "critical_count": sum(1 for w in detected_words if w["level"] == "critical"),
-                    "warning_count": sum(1 for w in detected_words if w["level"] == "warning"),
-                    "suspicious_count": sum(1 for w in detected_words if w["level"] == "suspicious"),
-                    "sentiment_analysis": {
-                        "model": "MARBERT (Egyptian Hate Speech)",
-                        "label": sentiment_result["label"],
-                        "score": sentiment_result["score"],
-                        "is_hate": sentiment_result["is_hate"],
-                        "confidence": sentiment_result["confidence"]
-                    }
-                }
-            }
-        finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-                print(f"[LOG] Cleaned up temp file")
+            transcript = stitcher.text
+            await websocket.send_json({
+                "type": "final",
+                "transcript": transcript,
+                "duration_seconds": round(windower.seconds_received, 3),
+                "analysis": keyword_analysis(transcript),
+                "peak_danger_score": peak_danger_score,
+                "dropped_windows": dropped_windows,
+            })
+            await websocket.close()
+            log.info("Live transcription session finished")
+        except Exception:
+            worker.cancel()
+            raise
     
     # ============================================
     # ENDPOINT 2: Text Analysis Only
     # ============================================
     @api.post("/analyze-text")
-    async def analyze_text(request: TextAnalysisRequest):
+    async def analyze_text(
+        request: TextAnalysisRequest,
+        x_parent_id: str = Header(None),
+        x_session_id: str = Header(None)
+    ):
         """
         Analyze text for threats without audio.
         Uses MARBERT for sentiment analysis + keyword detection.
-        Returns: danger score (0-1), risk level, detected words, sentiment
+        Returns: danger score (0-1), risk level, detected words, sentiment,
+        and with an X-Session-Id or X-Parent-Id header the session-level risk
         """
         text = request.text
-        print(f"[LOG] Analyzing text: {text[:100]}...")
+        log.debug("Analyzing text: %s...", text[:100])
         
         if not text or not text.strip():
             raise HTTPException(status_code=400, detail="Text cannot be empty")
         
-        # Analyze for threats using keyword detection
-        detected_words = detect_bad_words(text)
-        keyword_danger_score = calculate_danger_score(detected_words, text)
-        
-        # Analyze sentiment using MARBERT model
-        sentiment_result = analyze_sentiment(text)
+        # Analyze for threats: keyword detection, then MARBERT if still needed
+        analysis = await analyze_content(text)
+        response = {"text": text, **analysis, "session": track_session(x_parent_id, x_session_id, text, analysis)}
+        with stage_seconds.time(stage="serialize"):
+            return JSONResponse(response)
+    
+    # ============================================
+    # ENDPOINT 2b: Bulk Text Analysis (NDJSON)
+    # ============================================
+    # Texts per MARBERT round trip; results of a chunk are streamed before
+    # the next chunk is read, so memory stays bounded for huge batches
+    batch_chunk_size = int(os.environ.get("ANALYZE_BATCH_CHUNK_SIZE", "64"))
+    
+    async def iter_ndjson_texts(request: Request):
+        """
+        Yield texts from newline-delimited JSON streamed in the body, one
+        string or `{"text": ...}` object per line. Unparseable lines yield None.
+        """
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield parse_batch_line(line)
+        if buffer.strip():
+            yield parse_batch_line(buffer)
+    
+    async def iter_list(items: list):
+        for item in items:
+            yield item
+    
+    def parse_batch_line(line: bytes):
+        try:
+            item = json.loads(line)
+        except ValueError:
+            return None
+        if isinstance(item, dict):
+            item = item.get("text")
+        return item if isinstance(item, str) else None
+    
+    async def read_batch_json(request: Request) -> list:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be JSON or NDJSON")
+        texts = body.get("texts") if isinstance(body, dict) else body
+        if not isinstance(texts, list):
+            raise HTTPException(status_code=400, detail="Expected a list of texts")
+        return [t.get("text") if isinstance(t, dict) else t for t in texts]
+    
+    async def analyze_text_chunk(texts: list) -> List[dict]:
+        """
+        Cascade per text; the texts that still need MARBERT are submitted
+        together, so they share batched forward passes.
+        """
+        valid = [t for t in texts if isinstance(t, str) and t.strip()]
+        lexicon = lexicon_store.current
+        analyses = await asyncio.gather(*[analyze_content(t, lexicon) for t in valid])
+        analysis_by_position = iter(analyses)
         
-        # Combine scores: keyword-based + sentiment-based
-        # If MARBERT detects hate speech, boost the danger score
-        sentiment_boost = 0.3 if sentiment_result["is_hate"] else 0.0
-        combined_danger_score = min(1.0, keyword_danger_score + (sentiment_boost * sentiment_result["confidence"]))
+        results = []
+        for text in texts:
+            if not isinstance(text, str):
+                results.append({"detail": "Invalid item: expected a string or {\"text\": ...}"})
+            elif not text.strip():
+                results.append({"detail": "Text cannot be empty"})
+            else:
+                results.append({"text": text, **next(analysis_by_position)})
+        return results
+    
+    class BodyStreamingResponse(StreamingResponse):
+        """
+        StreamingResponse that does not listen for client disconnects while
+        streaming. Starlette's listener calls receive(), which would swallow
+        the NDJSON request body the generator is still reading.
+        """
+        async def __call__(self, scope, receive, send):
+            await self.stream_response(send)
+            if self.background is not None:
+                await self.background()
+    
+    @api.post("/analyze-text/batch")
+    async def analyze_text_batch(request: Request):
+        """
+        Analyze many texts in one call.
+        Body: `{"texts": [...]}`, a JSON list, or NDJSON
+        (Content-Type: application/x-ndjson) streamed one text per line.
+        Results stream back as NDJSON in input order; each line has the same
+        shape as the /analyze-text response (or a `detail` error for that item).
+        """
+        content_type = request.headers.get("content-type", "")
+        if "ndjson" in content_type or "jsonl" in content_type:
+            source = iter_ndjson_texts(request)
+        else:
+            # Validate plain JSON bodies before the response starts streaming
+            source = iter_list(await read_batch_json(request))
         
-        # Use the higher of the two scores
-        danger_score = max(keyword_danger_score, combined_danger_score)
+        async def generate():
+            chunk = []
+            try:
+                async for text in source:
+                    chunk.append(text)
+                    if len(chunk) >= batch_chunk_size:
+                        for result in await analyze_text_chunk(chunk):
+                            yield json.dumps(result, ensure_ascii=False) + "\n"
+                        chunk = []
+                if chunk:
+                    for result in await analyze_text_chunk(chunk):
+                        yield json.dumps(result, ensure_ascii=False) + "\n"
+            except OverloadedError as e:
+                # Headers are already sent; tell the client where the stream stopped
+                yield json.dumps({"detail": str(e), "retry_after": e.retry_after}) + "\n"
         
-        risk_level = get_risk_level(danger_score)
-        risk_message = get_risk_message(risk_level, detected_words, danger_score)
+        return BodyStreamingResponse(generate(), media_type="application/x-ndjson")
+    
+    # ============================================
+    # ENDPOINT 3: Video Analysis
+    # ============================================
+    # Frames are sampled (VIDEO_SAMPLE_FPS, or keyframes only) and letterboxed
+    # to VIDEO_FRAME_SIZE; the audio track is read VIDEO_AUDIO_WINDOW_SECONDS
+    # at a time, so memory does not grow with the video's length
+    video_fps = float(os.environ.get("VIDEO_SAMPLE_FPS", "1"))
+    video_keyframes = os.environ.get("VIDEO_KEYFRAMES_ONLY", "0") == "1"
+    video_width, video_height = (int(n) for n in os.environ.get("VIDEO_FRAME_SIZE", "320x240").lower().split("x"))
+    video_frame_queue = int(os.environ.get("VIDEO_FRAME_QUEUE", "8"))
+    video_audio_window = float(os.environ.get("VIDEO_AUDIO_WINDOW_SECONDS", "120"))
+    models.register("frames", create_frame_analyzer)
+    
+    async def analyze_video_audio(path: str, language: str = None) -> dict:
+        """
+        Transcribe a video's audio track window by window, each window
+        admitted to the Whisper pool on its own, then score the transcript
+        and its timeline like a long recording.
+        """
+        windows = iter_audio_windows(path, video_audio_window)
+        segments = []
+        try:
+            while True:
+                item = await asyncio.to_thread(next, windows, None)
+                if item is None:
+                    break
+                offset, audio = item
+                with stage_seconds.time(stage="video_audio"):
+                    result = await inference_pool.run(transcribe_speech, audio, language)
+                window_segments = result["segments"]
+                if window_segments is None:
+                    window_segments = [{"start": 0.0, "end": round(len(audio) / TARGET_SAMPLE_RATE, 3),
+                                        "text": result["text"].strip()}]
+                start = offset / TARGET_SAMPLE_RATE
+                for seg in window_segments:
+                    segments.append({**seg, "start": round(seg["start"] + start, 3),
+                                     "end": round(seg["end"] + start, 3)})
+        finally:
+            windows.close()
         
+        text = " ".join(seg["text"] for seg in segments if seg["text"])
+        lexicon = lexicon_store.current
+        analysis = await analyze_content(text, lexicon)
+        timeline = threat_timeline(segments, lexicon)
         return {
             "text": text,
-            "danger_score": danger_score,
-            "risk": risk_level,
-            "message": risk_message,
-            "detected_words": detected_words,
-            "word_count": len(detected_words),
-            "critical_count": sum(1 for w in detected_words if w["level"] == "critical"),
-            "warning_count": sum(1 for w in detected_words if w["level"] == "warning"),
-            "suspicious_count": sum(1 for w in detected_words if w["level"] == "suspicious"),
-            "sentiment_analysis": {
-                "model": "MARBERT (Egyptian Hate Speech)",
-                "label": sentiment_result["label"],
-                "score": sentiment_result["score"],
-                "is_hate": sentiment_result["is_hate"],
-                "confidence": sentiment_result["confidence"]
+            "segments": segments,
+            "analysis": raise_to_peak(analysis, timeline["peak"]),
+            "timeline": timeline["timeline"],
+            "peak": timeline["peak"],
+        }
+    
+    def analyze_video_frames(path: str) -> dict:
+        with models.use("frames") as analyzer, stage_seconds.time(stage="video_frames"):
+            result = analyze_frames(path, analyzer, video_fps, video_keyframes, video_width, video_height,
+                                    video_frame_queue)
+        result["analyzer"] = analyzer.info
+        return result
+    
+    def merge_timelines(audio_timeline: List[Dict], video_events: List[Dict]) -> List[Dict]:
+        """Audio chunks and video frame events in one list, ordered by start time."""
+        merged = [{"source": "audio", **seg} for seg in audio_timeline]
+        merged += [
+            {
+                "source": "video",
+                "start": event["time"],
+                "end": event["time"],
+                "labels": event["labels"],
+                "danger_score": event["danger_score"],
+                "risk": get_risk_level(event["danger_score"]),
             }
+            for event in video_events
+        ]
+        return sorted(merged, key=lambda entry: entry["start"])
+    
+    @api.post("/analyze-video", openapi_extra=UPLOAD_OPENAPI)
+    async def analyze_video(
+        request: Request,
+        x_parent_id: str = Header(None),
+        x_session_id: str = Header(None),
+        language: str = None
+    ):
+        """
+        Analyze a video: its audio track goes through the /transcribe
+        pipeline (VAD, Whisper, keywords, MARBERT) while sampled frames go
+        through the frame analyzer (VIDEO_ANALYZER), both at once. Returns
+        the audio analysis raised to the worst moment of either track and
+        one `timeline` of audio chunks and flagged frames.
+        """
+        language = language_hint(language)
+        
+        # Reject before spooling the upload if the pool is already full
+        inference_pool.ensure_capacity()
+        
+        with await read_upload(request, sniff_video_format, max_video_upload_bytes) as upload:
+            # Both ffmpeg readers need a seekable file (MP4 indexes can sit at the end)
+            path = await asyncio.to_thread(upload.ensure_file)
+            log.info("Video analysis requested: %s (%d bytes)", upload.audio_id[:12], upload.size)
+            try:
+                audio, video = await asyncio.gather(
+                    analyze_video_audio(path, language),
+                    asyncio.to_thread(analyze_video_frames, path),
+                )
+            except VideoDecodeError as e:
+                log.warning("Could not decode video %s: %s", upload.audio_id[:12], e)
+                raise HTTPException(status_code=422, detail=f"Could not decode video: {e}")
+        
+        video_peak = video["peak"]
+        if video_peak is not None:
+            video_peak = {"start": video_peak["time"], "end": video_peak["time"],
+                          "danger_score": video_peak["danger_score"],
+                          "risk": get_risk_level(video_peak["danger_score"])}
+        analysis = raise_to_peak(audio["analysis"], video_peak)
+        peaks = [peak for peak in (audio["peak"], video_peak) if peak is not None]
+        
+        response = {
+            "video_id": upload.audio_id,
+            "video_format": upload.suffix.replace(".", ""),
+            "transcription": audio["text"],
+            "speech_segments": audio["segments"],
+            "asr_language": language,
+            "analysis": analysis,
+            "video": {key: video[key] for key in ("analyzer", "frames_analyzed", "sampling", "frame_size")},
+            "timeline": merge_timelines(audio["timeline"], video["events"]),
+            "peak": max(peaks, key=lambda peak: peak["danger_score"], default=None),
+            "camera_triggered": trigger_camera(analysis["risk"], x_parent_id, "video"),
+            "session": track_session(x_parent_id, x_session_id, audio["text"], analysis),
         }
+        with stage_seconds.time(stage="serialize"):
+            return JSONResponse(response)
     
     # ============================================
-    # ENDPOINT 3: Video Analysis (Placeholder)
+    # ENDPOINT 4: Heart-rate alerts (ESP32 wearables)
     # ============================================
-    @api.post("/analyze-video")
-    async def analyze_video(
-        file: UploadFile = File(...),
-        authorization: str = Header(None)
+    # Readings are acknowledged once queued; a writer thread commits them to
+    # SQLite in batches and keeps per-minute rollups for the summary queries
+    heart_store = HeartRateStore(
+        os.environ.get("HEART_DB", "/tmp/eveguard-heart.db"),
+        flush_interval=float(os.environ.get("HEART_FLUSH_INTERVAL_MS", "500")) / 1000,
+        max_queue=int(os.environ.get("HEART_WRITE_QUEUE", "50000")),
+        retention_days=float(os.environ.get("HEART_RETENTION_DAYS", "30")),
+    )
+    heart_buffers = DeviceBuffers(size=int(os.environ.get("HEART_RING_SIZE", "256")))
+    heart_alerts = AlertDeduper(float(os.environ.get("HEART_ALERT_COOLDOWN_SECONDS", "10")))
+    heart_max_batch = int(os.environ.get("HEART_MAX_BATCH", "1000"))
+    
+    heart_readings_total = metrics.counter(
+        "eveguard_heart_readings_total", "Heart-rate readings by outcome", ["outcome"])
+    metrics.gauge("eveguard_heart_write_queue_depth", "Heart-rate readings waiting for the SQLite writer",
+                  callback=lambda: heart_store.stats()["queue_depth"])
+    
+    @api.post("/heart-alert")
+    async def heart_alert(
+        request: Request,
+        x_parent_id: str = Header(None)
     ):
         """
-        Placeholder for future video analysis feature.
-        Will analyze video for threatening behavior, weapons, etc.
+        Ingest heart-rate readings from the wearables.
+        Body: one reading `{"device_id", "heart_rate", "alert_type"?,
+        "parent_id"?, "timestamp"?}`, a list of them, or `{"readings": [...]}`.
+        Readings belong to the authenticated parent; one naming another
+        parent is rejected.
+        Alerts repeated within HEART_ALERT_COOLDOWN_SECONDS for the same
+        device and alert type are acknowledged but flagged as duplicates.
         """
-        print(f"[LOG] Video analysis requested: {file.filename}")
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be JSON")
+        items = body.get("readings") if isinstance(body, dict) and "readings" in body else body
+        if isinstance(items, dict):
+            items = [items]
+        if not isinstance(items, list) or not items:
+            raise HTTPException(status_code=400, detail="Expected a reading or a list of readings")
+        if len(items) > heart_max_batch:
+            raise HTTPException(status_code=413, detail=f"At most {heart_max_batch} readings per request")
+        
+        readings, rejected = [], []
+        for index, item in enumerate(items):
+            try:
+                readings.append(parse_reading(item, x_parent_id))
+            except ValueError as e:
+                rejected.append({"index": index, "detail": str(e)})
+        resolve_timestamps(readings, time.time())
+        readings.sort(key=lambda r: r["ts"])
+        
+        # Reject before touching dedupe state so a retried batch is not flagged
+        heart_store.ensure_capacity(len(readings))
+        alerts = []
+        duplicates = 0
+        for r in readings:
+            if r["alert_type"]:
+                if heart_alerts.accept(r["device_id"], r["alert_type"], r["ts"], r["parent_id"]):
+                    alerts.append({key: r[key] for key in ("device_id", "parent_id", "alert_type", "heart_rate", "ts")})
+                else:
+                    r["duplicate"] = True
+                    duplicates += 1
+            heart_buffers.add(r)
+        heart_store.add(readings)
+        
+        heart_readings_total.inc(len(readings), outcome="accepted")
+        heart_readings_total.inc(len(rejected), outcome="rejected")
+        for alert in alerts:
+            log.warning("Heart-rate alert %s from %s: %s BPM", alert["alert_type"], alert["device_id"], alert["heart_rate"])
         
-        # Placeholder response
         return {
-            "status": "placeholder",
-            "message": "Video analysis feature coming soon",
-            "filename": file.filename,
-            "planned_features": [
-                "Object detection (weapons, suspicious items)",
-                "Behavior analysis",
-                "Face recognition for known threats",
-                "Crowd density monitoring",
-                "Audio extraction and analysis"
-            ]
+            "accepted": len(readings),
+            "rejected": rejected,
+            "alerts": alerts,
+            "duplicate_alerts": duplicates,
         }
     
+    @api.get("/heart-rate/{device_id}")
+    async def heart_rate_recent(device_id: str, limit: int = 60, x_parent_id: str = Header(None)):
+        """The device's most recent readings sent for the authenticated parent, from memory."""
+        recent = heart_buffers.recent(device_id, max(1, min(limit, heart_buffers.size)), x_parent_id)
+        if not recent:
+            raise HTTPException(status_code=404, detail="No readings for this device")
+        return {"device_id": device_id, "latest": recent[-1], "readings": recent}
+    
+    @api.get("/heart-rate/{device_id}/summary")
+    async def heart_rate_summary(
+        device_id: str,
+        window_seconds: int = 3600,
+        bucket_seconds: int = 300,
+        x_parent_id: str = Header(None)
+    ):
+        """
+        Count, mean, min, max and alert count per bucket over the last
+        `window_seconds` of the readings sent for the authenticated parent,
+        read from the per-minute rollups (readings from the
+        last HEART_FLUSH_INTERVAL_MS may not be included yet).
+        """
+        if bucket_seconds < ROLLUP_SECONDS or bucket_seconds % ROLLUP_SECONDS:
+            raise HTTPException(status_code=400, detail=f"bucket_seconds must be a multiple of {ROLLUP_SECONDS}")
+        if not 0 < window_seconds <= 90 * 86400:
+            raise HTTPException(status_code=400, detail="window_seconds must be between 1 and 90 days")
+        
+        now = time.time()
+        buckets = await asyncio.to_thread(heart_store.summary, device_id, now - window_seconds, now, bucket_seconds,
+                                          x_parent_id)
+        count = sum(b["count"] for b in buckets)
+        return {
+            "device_id": device_id,
+            "window_seconds": window_seconds,
+            "bucket_seconds": bucket_seconds,
+            "count": count,
+            "mean_bpm": round(sum(b["mean_bpm"] * b["count"] for b in buckets) / count, 1) if count else None,
+            "min_bpm": min((b["min_bpm"] for b in buckets), default=None),
+            "max_bpm": max((b["max_bpm"] for b in buckets), default=None),
+            "alerts": sum(b["alerts"] for b in buckets),
+            "buckets": buckets,
+        }
+    
+    @api.get("/stats/heart")
+    async def heart_stats():
+        """Write queue depth, batch sizes and tracked devices of the heart-rate ingestion."""
+        return {**heart_store.stats(), "devices": len(heart_buffers)}
+    
     return api
\ No newline at end of file
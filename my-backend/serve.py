@@ -0,0 +1,127 @@
+"""
+Serve the API from several worker processes that share one copy of the
+model weights.
+
+Whisper and MARBERT are loaded here, once, before the workers are forked,
+so every worker uses the same memory pages (copy-on-write) instead of
+loading its own copy, and a CPU node fits more workers. Only PyTorch
+(`transformers`) backends on CPU can be loaded up front: CTranslate2
+(faster-whisper) and ONNX Runtime start native thread pools as soon as a
+model loads and CUDA contexts do not survive a fork either, so those models
+are still loaded by each worker on first use.
+
+    ASR_BACKEND=transformers CLASSIFIER_BACKEND=transformers \\
+        INFERENCE_THREADS=2 python serve.py --workers 4 --port 8000
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+
+from app_utils import models
+from app_utils.backends import (
+    asr_backend_choice, classifier_backend_choice, create_asr_backend, create_classifier_backend,
+    detect_device, inference_threads,
+)
+from app_utils.logs import setup_logging
+from modal_app import MARBERT_MODEL, MODEL_NAME
+
+FORK_SAFE_BACKENDS = {"transformers"}
+
+log = setup_logging()
+
+
+def preload_shared():
+    """Load the fork-safe backends into models.SHARED."""
+    if detect_device() != "cpu":
+        log.info("Models are loaded per worker on GPU (CUDA does not survive fork)")
+        return
+
+    candidates = {
+        "asr": (asr_backend_choice(), lambda: create_asr_backend(MODEL_NAME, "medium")),
+        "classifier": (classifier_backend_choice(), lambda: create_classifier_backend(MARBERT_MODEL)),
+    }
+    # One thread while loading, so no OpenMP team exists in the parent when it forks
+    threads = os.environ.get("INFERENCE_THREADS")
+    os.environ["INFERENCE_THREADS"] = "1"
+    try:
+        for name, (backend_name, loader) in candidates.items():
+            if backend_name not in FORK_SAFE_BACKENDS:
+                log.info("%s: %s is loaded by each worker (not fork-safe)", name, backend_name)
+                continue
+            before = models.memory_mb()
+            backend = loader()
+            models.SHARED[name] = (backend, round(models.memory_mb() - before, 1))
+            log.info("%s: loaded once for all workers (%s MiB)", name, models.SHARED[name][1])
+    finally:
+        if threads is None:
+            os.environ.pop("INFERENCE_THREADS", None)
+        else:
+            os.environ["INFERENCE_THREADS"] = threads
+
+    # Objects that survive until now live as long as the workers; freezing
+    # them keeps the collector from writing to (and so copying) their pages
+    gc.collect()
+    gc.freeze()
+
+
+def run_worker(sock: socket.socket, log_level: str):
+    import uvicorn
+    import modal_app
+
+    threads = inference_threads()
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+    for backend, _ in models.SHARED.values():
+        backend.info["threads"] = threads
+
+    server = uvicorn.Server(uvicorn.Config(modal_app.fastapi_app.local(), log_level=log_level))
+    server.run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    preload_shared()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    children = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(sock, args.log_level)
+            finally:
+                os._exit(0)
+        children.append(pid)
+    log.info("%d workers on %s:%d (pids %s)", args.workers, args.host, args.port, ", ".join(map(str, children)))
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for pid in children:
+        os.waitpid(pid, 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+# conftest.py
+# Run from my-backend (python -m pytest tests); makes app_utils and modal_app importable
+
+import os
+import sys
+import warnings
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """
+    Build modal_app's FastAPI app locally with its stores under tmp_path,
+    no preloading and no auth configured; keyword arguments are extra
+    environment variables. Patch modal_app's model factories before calling.
+    """
+    def make(**env):
+        import modal_app
+
+        defaults = {"AUDIO_STORE_DIR": str(tmp_path / "audio"), "JOB_DB": str(tmp_path / "jobs.db"),
+                    "HEART_DB": str(tmp_path / "heart.db"), "PRELOAD_MODELS": "0", "VAD_ENABLED": "0"}
+        for name in ("PARENT_TOKENS", "AUTH_JWT_SECRET", "ALLOW_ANONYMOUS", "ESP_DEVICES"):
+            monkeypatch.delenv(name, raising=False)
+        for name, value in {**defaults, **env}.items():
+            monkeypatch.setenv(name, value)
+        with warnings.catch_warnings():
+            # Running the Modal function locally warns about volumes it does not use
+            warnings.simplefilter("ignore")
+            return modal_app.fastapi_app.local()
+
+    return make
@@ -0,0 +1,87 @@
+# test_auth.py
+# AuthMiddleware: who a request acts for, and what its rate limit is keyed on
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app_utils.auth import AuthMiddleware, Authenticator, parse_parent_tokens
+from app_utils.metrics import MetricsRegistry, RequestMetricsMiddleware
+from app_utils.ratelimit import RateLimiter
+
+
+class RecordingLimiter(RateLimiter):
+    def __init__(self):
+        super().__init__(rate_per_minute=0, burst=0, max_concurrent=0)
+        self.keys = []
+
+    def acquire(self, key, now=None):
+        self.keys.append(key)
+        super().acquire(key, now)
+
+
+def client_for(authenticator: Authenticator):
+    app = FastAPI()
+
+    @app.post("/transcribe")
+    async def transcribe(request: Request):
+        return {"parent_id": request.headers.get("x-parent-id")}
+
+    @app.get("/stats/auth")
+    async def stats():
+        return authenticator.stats()
+
+    limiter = RecordingLimiter()
+    app.add_middleware(AuthMiddleware, authenticator=authenticator, limiter=limiter, limited_paths=("/transcribe",))
+    return TestClient(app), limiter
+
+
+@pytest.mark.parametrize("authenticator, headers", [
+    (Authenticator(parent_tokens=parse_parent_tokens("p1:tok1"), allow_anonymous=True), {}),
+    (Authenticator(), {"Authorization": "Bearer anything"}),
+])
+def test_forged_parent_id_is_dropped_without_an_authenticated_parent(authenticator, headers):
+    client, limiter = client_for(authenticator)
+    response = client.post("/transcribe", headers={**headers, "X-Parent-Id": "victim"})
+
+    assert response.status_code == 200
+    assert response.json() == {"parent_id": None}
+    assert limiter.keys == ["client:testclient"]
+
+
+def test_authenticated_parent_replaces_the_header():
+    client, limiter = client_for(Authenticator(parent_tokens=parse_parent_tokens("p1:tok1")))
+    response = client.post("/transcribe", headers={"Authorization": "Bearer tok1", "X-Parent-Id": "p2"})
+
+    assert response.json() == {"parent_id": "p1"}
+    assert limiter.keys == ["p1"]
+
+
+def test_stats_need_a_token_once_auth_is_configured():
+    client, _ = client_for(Authenticator(parent_tokens=parse_parent_tokens("p1:tok1")))
+
+    assert client.get("/stats/auth").status_code == 401
+    assert client.get("/stats/auth", headers={"X-Api-Key": "tok1"}).status_code == 200
+
+
+def test_authenticated_requests_keep_their_route_label():
+    metrics = MetricsRegistry()
+    app = FastAPI()
+
+    @app.post("/transcribe/{job}")
+    async def transcribe(job: str):
+        return {}
+
+    app.add_middleware(AuthMiddleware, authenticator=Authenticator(parent_tokens=parse_parent_tokens("p1:tok1")),
+                       limiter=RecordingLimiter(), limited_paths=("/transcribe",))
+    app.add_middleware(
+        RequestMetricsMiddleware,
+        latency=metrics.histogram("request_seconds", "Request latency", ["method", "route", "status"]),
+        response_bytes=metrics.histogram("response_bytes", "Response size", ["route"]),
+    )
+    client = TestClient(app)
+
+    assert client.post("/transcribe/42", headers={"Authorization": "Bearer tok1"}).status_code == 200
+    rendered = metrics.render()
+    assert 'route="/transcribe/{job}"' in rendered
+    assert 'route="unmatched"' not in rendered
@@ -0,0 +1,44 @@
+# test_batching.py
+# MicroBatcher when the caller awaiting a result goes away
+
+import asyncio
+import threading
+
+from app_utils.batching import MicroBatcher
+
+
+def test_cancelled_waiters_do_not_stop_the_batcher():
+    release = threading.Event()
+
+    def process(items):
+        release.wait(5)
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(process, max_batch_size=1, max_wait_ms=0)
+
+    async def scenario():
+        # Cancelled while its batch runs, then while it is still queued
+        running = asyncio.ensure_future(asyncio.wrap_future(batcher.submit(1)))
+        queued = asyncio.ensure_future(asyncio.wrap_future(batcher.submit(2)))
+        await asyncio.sleep(0.05)
+        running.cancel()
+        queued.cancel()
+        await asyncio.gather(running, queued, return_exceptions=True)
+        release.set()
+        return await asyncio.wait_for(asyncio.wrap_future(batcher.submit(3)), timeout=5)
+
+    assert asyncio.run(scenario()) == 6
+    assert batcher._thread.is_alive()
+    stats = batcher.stats()
+    assert stats["cancelled"] == 1 and stats["items"] == 2
+
+
+def test_batch_failure_reaches_every_waiter():
+    def process(items):
+        raise ValueError("model failed")
+
+    batcher = MicroBatcher(process, max_batch_size=4, max_wait_ms=20)
+    futures = [batcher.submit(i) for i in range(3)]
+    for future in futures:
+        assert isinstance(future.exception(timeout=5), ValueError)
+    assert batcher.submit(4).exception(timeout=5) is not None
@@ -0,0 +1,177 @@
+# test_esp.py
+# CameraDispatcher against a local stand-in for the ESP32-CAM /command endpoint
+
+import asyncio
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from app_utils import esp
+from app_utils.esp import OPEN_CAMERA, CameraDispatcher
+
+
+class StubESP:
+    """
+    HTTP/1.1 keep-alive server answering POST /command like the sketch.
+    `statuses` are returned in order (200 once they run out) after `delay`
+    seconds; every request is recorded with the client port it came from.
+    """
+
+    def __init__(self, statuses=(), delay: float = 0.0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.requests = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("content-length", 0)))
+                with stub._lock:
+                    stub.requests.append({"path": self.path, "port": self.client_address[1],
+                                          "body": json.loads(body), "api_key": self.headers.get("x-api-key")})
+                    status = stub.statuses.pop(0) if stub.statuses else 200
+                time.sleep(stub.delay)
+                payload = b'{"status":"ok"}'
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, path: str = "/command") -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}{path}"
+
+    def wait_for(self, count: int, timeout: float = 5.0):
+        deadline = time.monotonic() + timeout
+        while len(self.requests) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.requests
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_triggers_are_coalesced():
+    with StubESP() as stub:
+        async def scenario():
+            dispatcher = CameraDispatcher(api_key="secret", coalesce_seconds=30)
+            results = [dispatcher.trigger(stub.url(), {"source": "test"}) for _ in range(5)]
+            await dispatcher.aclose()
+            return results, dispatcher.stats()
+
+        results, stats = run(scenario())
+
+    assert results == [True, False, False, False, False]
+    assert len(stub.requests) == 1
+    assert stub.requests[0]["body"] == OPEN_CAMERA
+    assert stub.requests[0]["api_key"] == "secret"
+    assert stats["triggered"] == 1 and stats["coalesced"] == 4 and stats["sent"] == 1
+
+
+def test_503_is_retried_with_jittered_backoff(monkeypatch):
+    jitter = []
+
+    def uniform(low, high):
+        jitter.append((low, high))
+        return 0.0
+
+    monkeypatch.setattr(esp.random, "uniform", uniform)
+    with StubESP(statuses=[503, 503]) as stub:
+        async def scenario():
+            dispatcher = CameraDispatcher(retries=3, backoff_base=0.25, backoff_max=8)
+            dispatcher.trigger(stub.url())
+            await dispatcher.aclose()
+            return dispatcher.stats()
+
+        stats = run(scenario())
+
+    assert len(stub.requests) == 3
+    # Full jitter: a uniform draw up to the doubling cap
+    assert jitter == [(0, 0.25), (0, 0.5)]
+    assert stats["retried"] == 2 and stats["sent"] == 1 and stats["failed"] == 0
+
+
+def test_devices_share_one_pooled_connection():
+    with StubESP() as stub:
+        async def scenario():
+            dispatcher = CameraDispatcher(coalesce_seconds=0)
+            clients = set()
+            for device in range(4):
+                dispatcher.trigger(stub.url(f"/command?device={device}"))
+                await asyncio.gather(*dispatcher._tasks)
+                clients.add(id(dispatcher._client))
+            await dispatcher.aclose()
+            return clients, dispatcher.stats()
+
+        clients, stats = run(scenario())
+
+    assert len(clients) == 1
+    assert stats["sent"] == 4
+    # Every request arrived over the same keep-alive connection
+    assert len({r["port"] for r in stub.requests}) == 1
+
+
+def test_transcribe_does_not_wait_for_the_camera(make_app, monkeypatch):
+    import soundfile as sf
+    from fastapi.testclient import TestClient
+
+    import modal_app
+
+    class ThreatASR:
+        info = {"backend": "stub", "precision": "none"}
+
+        def transcribe(self, audio, language=None):
+            return "I will kill you, murder you, stab you with a knife"
+
+        def transcribe_batch(self, arrays, batch_size=8, language=None):
+            return [self.transcribe(a) for a in arrays]
+
+    class HateClassifier:
+        info = {"backend": "stub", "precision": "none"}
+
+        def classify(self, texts):
+            return [{"label": "LABEL_1", "score": 0.99} for _ in texts]
+
+    with StubESP(delay=1.5) as stub:
+        monkeypatch.setattr(modal_app, "create_asr_backend", lambda *a, **k: ThreatASR())
+        monkeypatch.setattr(modal_app, "create_classifier_backend", lambda *a, **k: HateClassifier())
+        api = make_app(ESP_URL=stub.url())
+
+        audio = io.BytesIO()
+        sf.write(audio, np.sin(np.arange(16000) / 5).astype("float32") * 0.3, 16000, format="WAV")
+        with TestClient(api) as client:
+            started = time.monotonic()
+            response = client.post("/transcribe", files={"file": ("threat.wav", audio.getvalue(), "audio/wav")})
+            elapsed = time.monotonic() - started
+            # Shutdown waits for the dispatch still in flight
+        requests = stub.wait_for(1)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["analysis"]["risk"] == "danger"
+    assert body["camera_triggered"] is True
+    assert elapsed < stub.delay
+    assert len(requests) == 1 and requests[0]["body"] == OPEN_CAMERA
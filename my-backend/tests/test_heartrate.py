@@ -0,0 +1,46 @@
+# test_heartrate.py
+# Heart-rate readings belong to the parent the request authenticates as
+
+import time
+
+from fastapi.testclient import TestClient
+
+from app_utils.heartrate import parse_reading
+
+P1 = {"Authorization": "Bearer tok1"}
+P2 = {"Authorization": "Bearer tok2"}
+
+
+def test_body_parent_id_never_overrides_the_authenticated_parent():
+    reading = {"device_id": "watch-1", "heart_rate": 80}
+    assert parse_reading(reading, "p1")["parent_id"] == "p1"
+    assert parse_reading({**reading, "parent_id": "p1"}, "p1")["parent_id"] == "p1"
+    # Without an authenticated parent the claim is ignored, not trusted
+    assert parse_reading({**reading, "parent_id": "someone-else"})["parent_id"] is None
+
+
+def test_readings_are_stored_and_served_per_parent(make_app):
+    api = make_app(PARENT_TOKENS="p1:tok1,p2:tok2", HEART_FLUSH_INTERVAL_MS="20")
+    with TestClient(api) as client:
+        response = client.post("/heart-alert", headers=P1, json=[
+            {"device_id": "watch-1", "heart_rate": 150, "alert_type": "high_hr"},
+            {"device_id": "watch-1", "heart_rate": 90, "parent_id": "someone-else"},
+        ])
+        body = response.json()
+        assert body["accepted"] == 1
+        assert body["rejected"] == [{"index": 1, "detail": "parent_id does not match the authenticated parent"}]
+        assert body["alerts"][0]["parent_id"] == "p1"
+
+        assert client.get("/heart-rate/watch-1", headers=P1).json()["latest"]["heart_rate"] == 150
+        assert client.get("/heart-rate/watch-1", headers=P2).status_code == 404
+
+        # Another parent's alert on the same device ID is its own, not a duplicate
+        response = client.post("/heart-alert", headers=P2,
+                               json={"device_id": "watch-1", "heart_rate": 40, "alert_type": "high_hr"})
+        assert response.json()["duplicate_alerts"] == 0
+
+        time.sleep(0.3)
+        summary = {name: client.get("/heart-rate/watch-1/summary", headers=headers).json()
+                   for name, headers in (("p1", P1), ("p2", P2))}
+        assert (summary["p1"]["count"], summary["p1"]["max_bpm"]) == (1, 150)
+        assert (summary["p2"]["count"], summary["p2"]["max_bpm"]) == (1, 40)
@@ -0,0 +1,60 @@
+# test_lexicon.py
+# Doubled and single letters in lexicon terms, plain and elongated, against the shipped lexicon.json
+
+import os
+
+import pytest
+
+from app_utils.lexicon import load_lexicon, normalize_for_matching
+
+LEXICON_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lexicon.json")
+WEIGHTS = {"critical": 1.0, "warning": 0.6, "suspicious": 0.3}
+
+
+@pytest.fixture(scope="module")
+def lexicon():
+    return load_lexicon(LEXICON_PATH, WEIGHTS)
+
+
+@pytest.mark.parametrize("term, written", [
+    ("هنيكك", "هنيكك"),
+    ("هنيكك", "هنيككك"),
+    ("هنيكك", "هنيكككك"),
+    ("مهدد", "مهدد"),
+    ("مهدد", "مهددد"),
+    ("مهدد", "مُهَدَّد"),
+    ("بيهددني", "بيهددني"),
+    ("بيهددني", "بيهدددددني"),
+    ("حاسس بخطر", "حاسس بخطر"),
+    ("حاسس بخطر", "حاسسسس بخطر"),
+    # Single letters still match when elongated, in bounded and plain sections
+    ("اقتلك", "اقتلكككك"),
+    ("هقتلك", "هقتلكككك"),
+])
+def test_doubled_letter_terms_match_with_and_without_elongation(lexicon, term, written):
+    text = f"يا ماما {written} دلوقتي"
+    for matcher in (lexicon.matcher, lexicon.partitions["arabic"]):
+        matches = matcher.find_matches(text)
+        found = [m for m in matches if m["word"] == term]
+        assert len(found) == 1, matches
+        # Offsets cover the term as written, collapsed letters and marks included
+        assert text[found[0]["start"]:found[0]["end"]] == written
+
+
+@pytest.mark.parametrize("text, term", [
+    ("نام في مهد الطفل", "مهدد"),  # "the child's cradle" is not "threatened"
+    ("هنيك", "هنيكك"),
+    ("حاس بخطر", "حاسس بخطر"),
+    # A doubled letter is not an elongated single one either
+    ("اقتلكك", "اقتلك"),
+])
+def test_single_letters_do_not_match_doubled_terms(lexicon, text, term):
+    assert term not in [m["word"] for m in lexicon.matcher.find_matches(text)]
+
+
+def test_text_folding_keeps_doubled_letters():
+    assert normalize_for_matching("مهد") == "مهد"
+    assert normalize_for_matching("مهدد") == "مهدد"
+    assert normalize_for_matching("مهددددد") == normalize_for_matching("مهددد") == "مهددد"
+    # Latin letters are left alone
+    assert normalize_for_matching("Kill") == "kill" and normalize_for_matching("alll") == "alll"
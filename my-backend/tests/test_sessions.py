@@ -0,0 +1,72 @@
+# test_sessions.py
+# Session escalation: whole steps only, one-message sessions, per-parent keys
+
+import pytest
+from fastapi.testclient import TestClient
+
+import modal_app
+from app_utils.sessions import SessionTracker
+
+
+def tracker(**kwargs):
+    return SessionTracker(modal_app.score_severity_counts, **kwargs)
+
+
+def words(level, count):
+    return [{"level": level}] * count
+
+
+def test_counts_below_the_ratio_do_not_escalate():
+    sessions = tracker()
+    state = sessions.update("s", words("warning", 3), now=0, word_count=4)
+    # Three warnings are not five, so no critical word is added
+    assert state["danger_score"] == modal_app.score_severity_counts(0, 3, 0, 3 / 4)
+
+
+def test_repeated_suspicious_messages_escalate_despite_decay():
+    sessions = tracker(half_life_seconds=900)
+    scores = [sessions.update("s", words("suspicious", 1), now=10 * i, word_count=3)["danger_score"]
+              for i in range(5)]
+    # The fifth word, decayed but within the tolerance, counts as one warning as well
+    assert scores[4] > scores[3]
+    assert scores[4] == pytest.approx(modal_app.score_severity_counts(0, 1, 4.9, 1 / 3), abs=0.02)
+
+
+def test_sessions_are_kept_apart_per_parent():
+    sessions = tracker()
+    sessions.update("shared", words("critical", 2), now=0, parent_id="p1", word_count=2)
+    state = sessions.update("shared", words("suspicious", 1), now=1, parent_id="p2", word_count=5)
+    assert state["counts"] == {"critical": 0, "warning": 0, "suspicious": 1}
+    assert len(sessions) == 2
+
+
+@pytest.fixture
+def client(make_app, monkeypatch):
+    class Classifier:
+        info = {"backend": "stub", "precision": "none"}
+
+        def classify(self, texts):
+            return [{"label": "LABEL_0", "score": 0.9} for _ in texts]
+
+    monkeypatch.setattr(modal_app, "create_classifier_backend", lambda *a, **k: Classifier())
+    with TestClient(make_app(PARENT_TOKENS="p1:tok1,p2:tok2")) as client:
+        yield client
+
+
+@pytest.mark.parametrize("text", ["you stupid idiot loser", "I am scared and worried and afraid"])
+def test_one_message_session_never_scores_above_its_message(client, text):
+    body = client.post("/analyze-text", json={"text": text},
+                       headers={"Authorization": "Bearer tok1", "X-Session-Id": text}).json()
+    assert body["danger_score"] > 0
+    assert body["session"]["danger_score"] <= body["danger_score"]
+    assert body["session"]["risk"] == body["risk"]
+
+
+def test_a_guessed_session_id_does_not_reach_another_parent(client):
+    for _ in range(3):
+        client.post("/analyze-text", json={"text": "I will kill you"},
+                    headers={"Authorization": "Bearer tok1", "X-Session-Id": "chat-1"})
+    body = client.post("/analyze-text", json={"text": "hello there"},
+                       headers={"Authorization": "Bearer tok2", "X-Session-Id": "chat-1"}).json()
+    assert body["session"]["messages"] == 1
+    assert body["session"]["danger_score"] == 0
@@ -0,0 +1,79 @@
+# test_uploads.py
+# spool_upload reading multipart bodies straight from the request stream
+
+import asyncio
+import io
+import wave
+
+import pytest
+
+from app_utils.uploads import UnsupportedFormatError, UploadError, UploadTooLargeError, audio_part_check, spool_upload
+
+BOUNDARY = "eveguard-test-boundary"
+
+
+class StreamingRequest:
+    """The parts of a Starlette Request that spool_upload uses; records how many chunks were pulled."""
+
+    def __init__(self, body: bytes, chunk_size: int = 1024, content_type: str = None):
+        self.headers = {"content-type": content_type or f"multipart/form-data; boundary={BOUNDARY}"}
+        self.chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+        self.pulled = 0
+
+    async def stream(self):
+        for chunk in self.chunks:
+            self.pulled += 1
+            yield chunk
+        yield b""
+
+
+def multipart_body(*parts) -> bytes:
+    body = b""
+    for name, filename, content_type, data in parts:
+        body += (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"{name}\"; filename=\"{filename}\"\r\n"
+                 f"Content-Type: {content_type}\r\n\r\n").encode() + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def wav_bytes(seconds: float = 1.0) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes(b"\x01\x00" * int(16000 * seconds))
+    return buffer.getvalue()
+
+
+def test_file_part_is_spooled_from_the_stream():
+    import hashlib
+
+    audio = wav_bytes()
+    request = StreamingRequest(multipart_body(("note", "n.txt", "text/plain", b"hello"),
+                                              ("file", "clip.wav", "audio/wav", audio)))
+    upload = asyncio.run(spool_upload(request, spool_bytes=4096, check=audio_part_check()))
+    with upload:
+        assert upload.filename == "clip.wav" and upload.content_type == "audio/wav"
+        assert upload.suffix == ".wav" and upload.size == len(audio)
+        assert upload.audio_id == hashlib.sha256(audio).hexdigest()
+        # Past spool_bytes the body went to disk
+        assert not upload.in_memory and upload.getvalue() == audio
+
+
+@pytest.mark.parametrize("part, error", [
+    (("file", "clip.wav", "audio/wav", b"MZ\x90\x00" + bytes(64 * 1024)), UnsupportedFormatError),
+    (("file", "notes.txt", "text/plain", wav_bytes()), UploadError),
+    (("file", "clip.wav", "audio/wav", wav_bytes(8)), UploadTooLargeError),
+])
+def test_rejected_uploads_stop_reading_early(part, error):
+    request = StreamingRequest(multipart_body(part))
+    with pytest.raises(error):
+        asyncio.run(spool_upload(request, max_bytes=64 * 1024, check=audio_part_check()))
+    assert request.pulled < len(request.chunks) // 2
+
+
+def test_missing_field_and_non_multipart_bodies_are_rejected():
+    with pytest.raises(UploadError, match="No `file` field"):
+        asyncio.run(spool_upload(StreamingRequest(multipart_body(("audio", "a.wav", "audio/wav", wav_bytes())))))
+    with pytest.raises(UploadError, match="multipart/form-data"):
+        asyncio.run(spool_upload(StreamingRequest(wav_bytes(), content_type="audio/wav")))
@@ -1,15 +1,46 @@
-from faster_whisper import WhisperModel
+import logging
+
+from app_utils.backends import SAMPLE_RATE, asr_backend_profile, asr_language, backend_cache_tag, create_asr_backend
+from app_utils.logs import LOGGER_NAME
+
+log = logging.getLogger(LOGGER_NAME)
+
+MODEL_SIZE = "medium"
 
 _model = None
+_profile = None
 
 def get_whisper_model():
     global _model
     if _model is None:
-        print("Loading Whisper Medium model (GPU)...")
-        _model = WhisperModel("medium", device="cuda", compute_type="float16")
+        # faster-whisper: float16 on CUDA, int8 on CPU-only boxes
+        log.info("Loading Whisper Medium model...")
+        _model = create_asr_backend("openai/whisper-" + MODEL_SIZE, MODEL_SIZE, cuda_backend="faster-whisper")
+        log.info("Model loaded: %s", _model.info)
     return _model
 
-def transcribe_audio_file(audio_path: str) -> str:
+def whisper_cache_tag() -> str:
+    """Backend and precision for result cache keys, without loading the model."""
+    global _profile
+    if _model is not None:
+        return backend_cache_tag(_model.info)
+    if _profile is None:
+        _profile = asr_backend_profile(cuda_backend="faster-whisper")
+    return backend_cache_tag(_profile)
+
+def transcribe_audio_file(audio, speech_spans=None) -> str:
+    """
+    `audio` is a file path or a 16 kHz mono float32 array.
+    `speech_spans` ((start, end) sample pairs, e.g. from VAD) limits
+    decoding to those spans of the array.
+    """
     model = get_whisper_model()
-    segments, _ = model.transcribe(audio_path, beam_size=5)
-    return " ".join(seg.text for seg in segments)
+    # ASR_LANGUAGE, if set, skips Whisper's language detection
+    language = asr_language()
+    if not speech_spans:
+        return model.transcribe(audio, language=language)
+    if model.name == "faster-whisper":
+        clips = [t / SAMPLE_RATE for span in speech_spans for t in span]
+        return model.transcribe(audio, language=language, clip_timestamps=clips)
+    texts = model.transcribe_batch([audio[start:end] for start, end in speech_spans], language=language)
+    return " ".join(t.strip() for t in texts if t.strip())